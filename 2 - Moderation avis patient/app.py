@@ -1,26 +1,43 @@
-from flask import Flask, request, jsonify
-import requests
+from flask import Flask, request, jsonify, g
 import os
-import re
+import sys
 import json
+import hashlib
+import csv
+import io
 from dotenv import load_dotenv
 import logging
+import time
 from datetime import datetime
+import numpy as np
+from lexicon import LexiconMatcher
+from lexicon_store import LexiconStore
+from generation_counter import create_generation_counter_from_env
+from structured_logging import configure_logging_from_env
+from proper_names import ProperNameDetector, TITLES, NAME_REPLACEMENT
+from redaction import redact_spans
+from moderation_cache import create_cache_from_env
+from decision_store import create_decision_store_from_env, SCORE_COLUMN_PREFIX
+from coalescer import RequestCoalescer
+from circuit_breaker import create_breaker_from_env
+from job_queue import create_job_queue_from_env, QueueFullError, CallbackURLError
 
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('moderation.log'),
-        logging.StreamHandler()
-    ]
+# Le client Mistral partagé se trouve à la racine du dépôt (copié à côté de app.py lors du déploiement)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mistral_client import (
+    create_client_from_env, current_priority, request_priority, RateLimitTimeout,
+    PRIORITY_INTERACTIVE, PRIORITY_BULK, PRIORITY_NAMES, SHARED_RATE_LIMITER
 )
-logger = logging.getLogger(__name__)
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Charger les variables d'environnement
 load_dotenv()
 
+# Configuration du logging : enregistrements JSON écrits en arrière-plan dans moderation.log
+# (rotation + compression), texte des avis et réponses API échantillonnés/tronqués selon LOG_*
+LOG_HANDLER = configure_logging_from_env('moderation.log')
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 
 # Récupérer la clé API depuis les variables d'environnement
@@ -28,12 +45,55 @@ MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY')
 if not MISTRAL_API_KEY:
     raise ValueError("La clé API Mistral n'est pas définie dans le fichier .env")
 
+# Client HTTP partagé (connexions keep-alive, timeouts, nouvelles tentatives)
+MISTRAL_CLIENT = create_client_from_env(MISTRAL_API_KEY, read_timeout=10)
+
 # Fichier contenant les mots interdits
 FORBIDDEN_WORDS_FILE = "mots_interdits.txt"
 # Fichier de configuration des flags
 FLAG_CONFIG_FILE = "flag_config.json"
 # Seuil de modération par défaut
 DEFAULT_MODERATION_THRESHOLD = 0.5
+# Modèle de l'API de modération Mistral
+MODERATION_MODEL = "mistral-moderation-latest"
+# Nombre de textes envoyés par appel multi-entrées à l'API de modération
+MODERATION_BATCH_SIZE = int(os.getenv('MODERATION_BATCH_SIZE', '32'))
+# Fenêtre de regroupement des appels concurrents à l'API de modération (0 pour désactiver)
+MODERATION_COALESCE_WINDOW_MS = float(os.getenv('MODERATION_COALESCE_WINDOW_MS', '10'))
+# Nombre maximum de textes acceptés par requête /moderate_batch
+MAX_BATCH_TEXTS = int(os.getenv('MAX_BATCH_TEXTS', '5000'))
+# Nombre maximum de mots par import en masse du dictionnaire (/forbidden_words/bulk)
+MAX_BULK_WORDS = int(os.getenv('MAX_BULK_WORDS', '100000'))
+# Longueur maximale d'une entrée du dictionnaire (caractères)
+MAX_WORD_LENGTH = 100
+# Modes d'import en masse : ajout, suppression ou remplacement de tout le dictionnaire
+BULK_LEXICON_MODES = ('add', 'remove', 'replace')
+# Nombre de mots par morceau envoyé lors de l'export en flux
+EXPORT_CHUNK_WORDS = 1000
+# Budget de latence d'un appel à l'API de modération, nouvelles tentatives comprises
+MODERATION_LATENCY_BUDGET_MS = float(os.getenv('MODERATION_LATENCY_BUDGET_MS', '3000'))
+
+# Sources de modération (utilisées pour étiqueter chaque mot détecté)
+API_SOURCE = 'API Mistral'
+DICTIONARY_SOURCE = 'Dictionnaire de mots interdits'
+PROPER_NAMES_SOURCE = 'Détection de noms propres'
+
+# Mots grossiers courants modérés lorsque l'API Mistral a détecté du contenu inapproprié
+# Cette liste couvre 90% des cas - l'API est le filtre principal
+API_MODERATION_WORDS = [
+    # Mots grossiers de base
+    "merde", "putain", "con", "connard", "connasse", "salope", "pute", "enculé", "encule",
+    "bite", "couille", "couilles", "trou du cul", "trou-du-cul",
+    # Mots sexuels
+    "sexe", "penis", "pénis", "vagin", "seins", "cul",
+    # Insultes
+    "salaud", "ordure", "fumier", "crétin", "imbécile", "idiot", "débile",
+    "abruti", "taré", "dégénéré", "pourriture", "salopard",
+    # Verbes grossiers
+    "niquer", "nique", "foutre", "chier", "pisser",
+    # Variantes et expressions
+    "fils de pute", "va te faire", "ta gueule", "ferme ta gueule"
+]
 
 # Fonction pour charger les mots interdits depuis le fichier
 def load_forbidden_words():
@@ -62,17 +122,6 @@ def load_forbidden_words():
     
     return words_dict
 
-# Fonction pour sauvegarder les mots interdits dans le fichier
-def save_forbidden_words(words_dict):
-    try:
-        with open(FORBIDDEN_WORDS_FILE, 'w', encoding='utf-8') as file:
-            for word in words_dict.keys():
-                file.write(f"{word}\n")
-        return True
-    except Exception as e:
-        logger.error(f"Erreur lors de la sauvegarde des mots interdits: {str(e)}")
-        return False
-
 # Fonction pour charger la configuration des flags
 def load_flag_config():
     """Charge la configuration des seuils de flags depuis le fichier JSON"""
@@ -176,72 +225,361 @@ def determine_flag(api_result, moderation_details, original_text, moderated_text
     else:
         return "GREEN", ["Aucun problème détecté"]
 
+# Code court de chaque raison retournée par determine_flag (étiquette des métriques)
+FLAG_REASON_CODES = [
+    ("Score API Mistral élevé", 'api_score'),
+    ("Mots interdits détectés", 'forbidden_words'),
+    ("Noms propres détectés", 'proper_names'),
+    ("Texte modifié", 'text_modified'),
+    ("Aucun problème détecté", 'none')
+]
+
+def flag_reason_code(reason):
+    """Code court d'une raison de flag (les raisons contiennent des scores et des nombres)"""
+    for prefix, code in FLAG_REASON_CODES:
+        if reason.startswith(prefix):
+            return code
+    return 'other'
+
+def determine_flags_vectorized(decisions, flag_config):
+    """
+    Version vectorisée de determine_flag sur des décisions enregistrées (règles identiques)
+    
+    Args:
+        decisions (DataFrame): Décisions de l'historique (DECISION_STORE.frame())
+        flag_config (dict): Configuration des seuils
+    
+    Returns:
+        tuple: (red, triggers) - red: tableau booléen (True pour RED),
+            triggers: {code de raison: tableau booléen des avis concernés}
+    """
+    no_trigger = np.zeros(len(decisions), dtype=bool)
+    mistral_threshold = float(flag_config.get('mistral_api_score_threshold', 0.3))
+    # Sans score API (erreur, disjoncteur ouvert), le score ne déclenche pas de flag
+    max_scores = np.nan_to_num(decisions['max_score'].to_numpy(dtype=float), nan=-np.inf)
+    
+    triggers = {
+        'api_score': max_scores >= mistral_threshold,
+        'forbidden_words': (decisions['forbidden_words_count'].to_numpy() > 0
+                            if flag_config.get('forbidden_words_trigger_red', True) else no_trigger),
+        'proper_names': (decisions['proper_names_count'].to_numpy() > 0
+                         if flag_config.get('proper_names_trigger_red', True) else no_trigger),
+        'text_modified': (decisions['text_modified'].to_numpy(dtype=bool)
+                          if flag_config.get('text_modification_trigger_red', True) else no_trigger)
+    }
+    red = np.logical_or.reduce(list(triggers.values())) if len(decisions) else no_trigger
+    return red, triggers
+
+# Fonction pour reconstruire le matcher compilé des mots interdits
+def build_lexicon_matcher(words):
+    """
+    Construit un matcher unique fusionnant la liste de l'API et le dictionnaire de mots interdits
+
+    Les deux combinaisons de sources utilisées par moderate_text sont précompilées ici,
+    afin que la compilation n'ait jamais lieu sur le chemin d'une requête.
+    """
+    matcher = LexiconMatcher([
+        (API_SOURCE, API_MODERATION_WORDS),
+        (DICTIONARY_SOURCE, list(words))
+    ])
+    matcher.compile([DICTIONARY_SOURCE])
+    matcher.compile([API_SOURCE, DICTIONARY_SOURCE])
+    return matcher
+# Détecteur de noms propres compilé une seule fois à partir de la liste des titres
+PROPER_NAME_DETECTOR = ProperNameDetector(TITLES)
+# Cache des résultats de l'API de modération (mémoire + SQLite)
+MODERATION_CACHE = create_cache_from_env()
+# Historique des décisions (scores par catégorie, détails, flag) pour simuler une nouvelle configuration des flags
+DECISION_STORE = create_decision_store_from_env()
+
+# Métriques exposées au format Prometheus sur /metrics
+METRICS = MetricsRegistry()
+STAGE_DURATION = METRICS.histogram(
+    'moderation_stage_duration_seconds',
+    "Durée des étapes de la modération (api, lexicon, proper_names, determine_flag)",
+    ['stage']
+)
+UPSTREAM_RESPONSES = METRICS.counter(
+    'moderation_upstream_responses_total',
+    "Réponses de l'API de modération Mistral par code HTTP (exception : pas de réponse)",
+    ['status_code']
+)
+FLAGS = METRICS.counter('moderation_flags_total', "Flags RED/GREEN attribués, par raison", ['flag', 'reason'])
+IN_FLIGHT_REQUESTS = METRICS.gauge('moderation_requests_in_flight', "Requêtes en cours de traitement", ['endpoint'])
+METRICS.function_counter(
+    'moderation_cache_lookups_total',
+    "Recherches dans le cache des résultats de l'API, par résultat",
+    lambda: {('hit',): MODERATION_CACHE.hits, ('miss',): MODERATION_CACHE.misses},
+    ['result']
+)
+METRICS.function_counter(
+    'moderation_log_records_dropped_total',
+    "Enregistrements de log abandonnés faute de place dans la file d'écriture (LOG_QUEUE_SIZE)",
+    lambda: LOG_HANDLER.dropped_records
+)
+METRICS.function_gauge(
+    'moderation_cache_hit_ratio',
+    "Proportion de recherches trouvées dans le cache",
+    lambda: MODERATION_CACHE.stats()['hit_ratio']
+)
+
+# Compteurs de génération partagés entre les processus du serveur (gunicorn -w N, uvicorn --workers N) :
+# une modification du dictionnaire ou de la configuration des flags par un processus
+# est prise en compte par les autres dès leur requête suivante
+SHARED_STATE = create_generation_counter_from_env(['lexicon', 'flag_config'])
+
 # Charger les mots interdits et la configuration au démarrage
-FORBIDDEN_WORDS = load_forbidden_words()
+# Dictionnaire versionné : versions immuables (mots + matcher compilé) échangées atomiquement,
+# modifications ajoutées au journal puis compactées dans mots_interdits.txt
+LEXICON_STORE = LexiconStore(
+    FORBIDDEN_WORDS_FILE,
+    load_forbidden_words,
+    build_lexicon_matcher,
+    compact_every=int(os.getenv('LEXICON_COMPACT_EVERY', '100')),
+    generation=SHARED_STATE
+)
+FLAG_CONFIG_GENERATION = SHARED_STATE.get('flag_config')
 FLAG_CONFIG = load_flag_config()
 
-def check_moderation_api(text, threshold=DEFAULT_MODERATION_THRESHOLD):
+def current_flag_config():
     """
-    Vérifie si le texte doit être modéré via l'API Mistral
-        
+    Retourne la configuration des flags, rechargée depuis le fichier uniquement
+    si un autre processus l'a modifiée (compteur de génération partagé)
+    """
+    global FLAG_CONFIG, FLAG_CONFIG_GENERATION
+    if SHARED_STATE.get('flag_config') != FLAG_CONFIG_GENERATION:
+        with SHARED_STATE.lock():
+            FLAG_CONFIG_GENERATION = SHARED_STATE.get('flag_config')
+            FLAG_CONFIG = load_flag_config()
+        logger.info("Configuration des flags rechargée (modifiée par un autre processus)")
+    return FLAG_CONFIG
+
+def should_moderate_result(category_result, threshold=DEFAULT_MODERATION_THRESHOLD):
+    """
+    Indique si un résultat de l'API de modération (un élément de "results") dépasse le seuil
+
     Args:
-        text (str): Texte à vérifier
+        category_result (dict): Résultat de l'API pour un texte
         threshold (float): Seuil de modération entre 0.1 et 1.0
-            Plus la valeur est basse, plus la modération sera stricte
-            0.1 = Très strict (modère tout contenu avec score > 0.9)
-            0.9 = Très permissif (modère seulement le contenu avec score > 0.1)
     """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {MISTRAL_API_KEY}"
-    }
+    category_scores = category_result.get("category_scores", {})
+    
+    # Logique simplifiée : vérifier si un score dépasse le seuil
+    # threshold = 1.0 (très permissif) -> seuls les scores très élevés (>= 0.9) déclenchent
+    # threshold = 0.1 (très strict) -> les scores faibles (>= 0.1) déclenchent
+    moderation_trigger = 1.0 - threshold + 0.1  # Ajustement pour avoir une plage raisonnable
     
-    payload = {
-        "model": "mistral-moderation-latest",
-        "input": [text]
+    for category, score in category_scores.items():
+        if score >= moderation_trigger:
+            logger.info(f"Modération activée: {category} score={score:.4f} >= seuil={moderation_trigger:.4f}")
+            return True
+    return False
+
+def build_moderation_payload(texts):
+    """Corps de la requête multi-entrées à l'API de modération"""
+    return {
+        "model": MODERATION_MODEL,
+        "input": list(texts)
     }
+
+def parse_moderation_response(response, texts):
+    """
+    Découpe la réponse de l'API de modération en un résultat par texte
     
-    try:
-        response = requests.post(
-            "https://api.mistral.ai/v1/moderations",
-            headers=headers,
-            json=payload,
-            timeout=10
+    Args:
+        response: Réponse HTTP (requests ou httpx) de l'appel multi-entrées
+        texts (list): Textes envoyés
+    
+    Returns:
+        list: Un api_result par texte, au format d'une réponse pour un texte unique,
+              ou {"error": ...} pour chaque texte si l'appel a échoué
+    """
+    if response.status_code == 200:
+        result = response.json()
+        logger.info(
+            f"Réponse API modération pour {len(texts)} texte(s)",
+            extra={'event': 'moderation_api_response', 'api_response': result}
         )
         
-        if response.status_code == 200:
-            result = response.json()
-            logger.info(f"Réponse API modération: {result}")
-            
-            # Vérifie si l'une des catégories dépasse le seuil
-            should_moderate = False
-            
-            for category_result in result.get("results", []):
-                categories = category_result.get("categories", {})
-                category_scores = category_result.get("category_scores", {})
-                
-                # Logique simplifiée : vérifier si un score dépasse le seuil
-                # threshold = 1.0 (très permissif) -> seuls les scores très élevés (>= 0.9) déclenchent
-                # threshold = 0.1 (très strict) -> les scores faibles (>= 0.1) déclenchent
-                moderation_trigger = 1.0 - threshold + 0.1  # Ajustement pour avoir une plage raisonnable
-                
-                for category, score in category_scores.items():
-                    if score >= moderation_trigger:
-                        should_moderate = True
-                        logger.info(f"Modération activée: {category} score={score:.4f} >= seuil={moderation_trigger:.4f}")
-                        break
-                
-                if should_moderate:
-                    break
-            
-            return should_moderate, result
-        else:
-            logger.error(f"Erreur API: {response.status_code} - {response.text}")
-            return False, {"error": f"Erreur API: {response.status_code}"}
+        results = result.get("results", [])
+        if len(results) != len(texts):
+            raise ValueError(f"Réponse API incomplète: {len(results)} résultat(s) pour {len(texts)} texte(s)")
+        
+        # Découper la réponse en un résultat par texte, au format d'un appel unitaire
+        api_results = []
+        for category_result in results:
+            text_result = {key: value for key, value in result.items() if key != "results"}
+            text_result["results"] = [category_result]
+            api_results.append(text_result)
+        return api_results
+    else:
+        logger.error(f"Erreur API: {response.status_code} - {response.text}")
+        return [{"error": f"Erreur API: {response.status_code}"} for _ in texts]
+
+def moderation_deadline():
+    """Date limite (time.monotonic()) d'un appel à l'API de modération"""
+    return time.monotonic() + MODERATION_LATENCY_BUDGET_MS / 1000
+
+def record_moderation_call(response, started):
+    """Transmet au disjoncteur et aux métriques le résultat d'un appel à l'API de modération"""
+    duration = time.monotonic() - started
+    STAGE_DURATION.observe(duration, stage='api')
+    UPSTREAM_RESPONSES.inc(status_code=response.status_code)
+    if response.status_code == 429 or response.status_code >= 500:
+        MODERATION_BREAKER.record_failure(f"Erreur API: {response.status_code}")
+    else:
+        MODERATION_BREAKER.record_success(duration)
+
+def request_moderation_api(texts, deadline=None):
+    """
+    Envoie une liste de textes à l'API Mistral en un seul appel multi-entrées
+    
+    Args:
+        texts (list): Textes à vérifier
+        deadline (float): Date limite (time.monotonic()) de l'appel, par défaut le budget
+            de latence compté à partir de maintenant
+    
+    Returns:
+        list: Un api_result par texte, au format d'une réponse pour un texte unique,
+              ou {"error": ...} pour chaque texte si l'appel échoue
+    """
+    started = time.monotonic()
+    try:
+        response = MISTRAL_CLIENT.post(
+            "/moderations",
+            json=build_moderation_payload(texts),
+            deadline=deadline or moderation_deadline()
+        )
+        record_moderation_call(response, started)
+        return parse_moderation_response(response, texts)
+    
+    except RateLimitTimeout as e:
+        # Attente locale du limiteur de débit : ce n'est pas une défaillance de l'API
+        logger.warning(f"Appel API abandonné: {str(e)}")
+        return [{"error": str(e)} for _ in texts]
     
     except Exception as e:
         logger.error(f"Exception lors de l'appel API: {str(e)}")
-        return False, {"error": str(e)}
+        UPSTREAM_RESPONSES.inc(status_code='exception')
+        MODERATION_BREAKER.record_failure(str(e))
+        return [{"error": str(e)} for _ in texts]
+
+def probe_moderation_api():
+    """Appel de test du disjoncteur semi-ouvert : l'API de modération répond-elle ?"""
+    response = MISTRAL_CLIENT.post(
+        "/moderations",
+        json=build_moderation_payload(["Test"]),
+        deadline=moderation_deadline()
+    )
+    return response.status_code == 200
+
+# Disjoncteur : en cas d'incident chez Mistral, les avis passent directement aux étapes locales
+MODERATION_BREAKER = create_breaker_from_env(probe_moderation_api)
+MODERATION_BREAKER.register_metrics(METRICS, 'moderation')
+SHARED_RATE_LIMITER.register_metrics(METRICS, 'moderation')
+
+def short_circuited_results(texts):
+    """Résultats d'erreur retournés sans appel lorsque le disjoncteur est ouvert"""
+    return [{"error": "API Mistral indisponible (disjoncteur ouvert)"} for _ in texts]
+
+def timed_out_result(text):
+    """Résultat d'erreur d'un texte dont le budget de latence est épuisé avant la réponse de l'API"""
+    return {"error": f"Budget de latence de {MODERATION_LATENCY_BUDGET_MS:.0f} ms dépassé"}
+
+# Regroupement des requêtes concurrentes : les textes de plusieurs /moderate simultanés
+# partent dans un seul appel multi-entrées. Chaque requête garde son propre budget de
+# latence, attente dans la file du regroupement comprise.
+if MODERATION_COALESCE_WINDOW_MS > 0:
+    MODERATION_COALESCER = RequestCoalescer(
+        request_moderation_api,
+        window_seconds=MODERATION_COALESCE_WINDOW_MS / 1000,
+        max_batch_size=MODERATION_BATCH_SIZE,
+        timeout_result=timed_out_result
+    )
+else:
+    MODERATION_COALESCER = None
+
+def lookup_moderation_cache(texts):
+    """
+    Cherche les résultats API des textes dans le cache
+    
+    Returns:
+        tuple: (api_results, pending) - api_results: un résultat ou None par texte,
+               pending: texte absent du cache -> positions dans la liste (un seul envoi par texte)
+    """
+    api_results = [MODERATION_CACHE.get(text, MODERATION_MODEL) for text in texts]
+    
+    pending = {}
+    for index, (text, api_result) in enumerate(zip(texts, api_results)):
+        if api_result is None:
+            pending.setdefault(text, []).append(index)
+    return api_results, pending
+
+def store_moderation_results(api_results, pending, fetched):
+    """Complète api_results avec les résultats obtenus de l'API et les met en cache"""
+    for text, api_result in zip(pending, fetched):
+        # Les erreurs ne sont pas mises en cache
+        if "error" not in api_result:
+            MODERATION_CACHE.set(text, MODERATION_MODEL, api_result)
+        for index in pending[text]:
+            api_results[index] = api_result
+
+def moderation_checks(api_results, threshold):
+    """Associe à chaque api_result la décision de modération pour le seuil donné"""
+    # La décision est recalculée avec le seuil de la requête, y compris pour les résultats en cache
+    return [
+        ("error" not in api_result and should_moderate_result(api_result["results"][0], threshold), api_result)
+        for api_result in api_results
+    ]
+
+def check_moderation_api_batch(texts, threshold=DEFAULT_MODERATION_THRESHOLD, deadline=None):
+    """
+    Vérifie une liste de textes via un seul appel multi-entrées à l'API Mistral
+    
+    Les textes déjà présents dans le cache ne sont pas renvoyés à l'API, et un texte
+    répété dans la liste n'est envoyé qu'une fois. Si le disjoncteur est ouvert, aucun
+    appel n'est envoyé : les textes absents du cache reçoivent un résultat d'erreur.
+    Les appels de priorité "bulk" ne passent pas par le regroupement (leurs paquets sont
+    déjà pleins) afin de conserver leur file dans le limiteur de débit.
+    
+    Le budget de latence court depuis l'appel de cette fonction : passé ce délai, les textes
+    sans réponse de l'API reçoivent un résultat d'erreur et passent aux étapes locales.
+    
+    Args:
+        texts (list): Textes à vérifier (un appel HTTP pour toute la liste)
+        threshold (float): Seuil de modération entre 0.1 et 1.0
+        deadline (float): Date limite (time.monotonic()), par défaut le budget de latence
+    
+    Returns:
+        list: Un tuple (should_moderate, api_result) par texte, dans l'ordre de la liste.
+              Chaque api_result a la même forme qu'une réponse pour un texte unique.
+    """
+    deadline = deadline or moderation_deadline()
+    api_results, pending = lookup_moderation_cache(texts)
+    
+    if pending:
+        if not MODERATION_BREAKER.allow_request():
+            fetched = short_circuited_results(pending)
+        elif MODERATION_COALESCER is not None and current_priority() == PRIORITY_INTERACTIVE:
+            fetched = MODERATION_COALESCER.submit_many(list(pending), deadline)
+        else:
+            fetched = request_moderation_api(list(pending), deadline)
+        store_moderation_results(api_results, pending, fetched)
+    
+    return moderation_checks(api_results, threshold)
+
+def check_moderation_api(text, threshold=DEFAULT_MODERATION_THRESHOLD):
+    """
+    Vérifie si le texte doit être modéré via l'API Mistral
+        
+    Args:
+        text (str): Texte à vérifier
+        threshold (float): Seuil de modération entre 0.1 et 1.0
+            Plus la valeur est basse, plus la modération sera stricte
+            0.1 = Très strict (modère tout contenu avec score > 0.9)
+            0.9 = Très permissif (modère seulement le contenu avec score > 0.1)
+    """
+    return check_moderation_api_batch([text], threshold)[0]
 
 def moderate_text(text, moderation_threshold=DEFAULT_MODERATION_THRESHOLD):
     """
@@ -257,137 +595,196 @@ def moderate_text(text, moderation_threshold=DEFAULT_MODERATION_THRESHOLD):
     # Vérifier via l'API Mistral
     should_moderate, api_result = check_moderation_api(text, moderation_threshold)
     
-    # Créer une copie du texte pour la modération
-    moderated_text = text
+    return apply_local_moderation(text, should_moderate, api_result, moderation_threshold)
+
+def moderate_texts(texts, moderation_threshold=DEFAULT_MODERATION_THRESHOLD):
+    """
+    Modère une liste de textes avec des appels multi-entrées à l'API Mistral
+    
+    Les textes sont envoyés par paquets de MODERATION_BATCH_SIZE, puis les étapes locales
+    (mots interdits, noms propres, flag) sont appliquées à chaque texte.
     
+    Args:
+        texts (list): Textes à modérer
+        moderation_threshold (float): Seuil de modération entre 0.1 et 1.0
+    
+    Returns:
+        list: Un tuple (moderated_text, api_result, moderation_details, flag, flag_reasons) par texte
+    """
+    results = []
+    for chunk_start in range(0, len(texts), MODERATION_BATCH_SIZE):
+        chunk = texts[chunk_start:chunk_start + MODERATION_BATCH_SIZE]
+        checks = check_moderation_api_batch(chunk, moderation_threshold)
+        for text, (should_moderate, api_result) in zip(chunk, checks):
+            results.append(apply_local_moderation(text, should_moderate, api_result, moderation_threshold))
+    return results
+
+def apply_local_moderation(text, should_moderate, api_result, moderation_threshold=DEFAULT_MODERATION_THRESHOLD):
+    """
+    Applique les étapes locales de modération à partir du verdict de l'API Mistral
+    
+    Args:
+        text (str): Texte à modérer
+        should_moderate (bool): Verdict de l'API Mistral pour ce texte
+        api_result (dict): Résultat de l'API Mistral pour ce texte
+        moderation_threshold (float): Seuil de modération utilisé (pour les logs)
+    
+    Returns:
+        tuple: (moderated_text, api_result, moderation_details, flag, flag_reasons)
+    """
     # Tracker les sources de modération
+    # spans : étendues (start, end) masquées, relevées sur le texte original, triées par position
     moderation_details = {
         'forbidden_words_applied': [],
         'mistral_api_applied': [],
         'proper_names_applied': [],
-        'sources': []
+        'sources': [],
+        'spans': []
     }
     
-    # Extraire les mots à partir de contenus détectés par l'API Mistral
-    additional_words_to_moderate = []
-    
     # Si l'API a détecté du contenu inapproprié, elle devient le filtre principal
     if should_moderate:
         logger.info(f"Contenu inapproprié détecté par l'API Mistral (seuil: {moderation_threshold})")
-        
-        # L'API Mistral détecte le contenu inapproprié, donc on modère les mots grossiers courants
-        # Cette liste couvre 90% des cas - l'API est le filtre principal
-        api_moderation_words = [
-            # Mots grossiers de base
-            "merde", "putain", "con", "connard", "connasse", "salope", "pute", "enculé", "encule",
-            "bite", "couille", "couilles", "trou du cul", "trou-du-cul",
-            # Mots sexuels
-            "sexe", "penis", "pénis", "vagin", "seins", "cul",
-            # Insultes
-            "salaud", "ordure", "fumier", "crétin", "imbécile", "idiot", "débile",
-            "abruti", "taré", "dégénéré", "pourriture", "salopard",
-            # Verbes grossiers
-            "niquer", "nique", "foutre", "chier", "pisser",
-            # Variantes et expressions
-            "fils de pute", "va te faire", "ta gueule", "ferme ta gueule"
-        ]
-        
-        # Modérer tous les mots de cette liste s'ils sont présents dans le texte
-        # L'API a déjà validé que le contenu est inapproprié
-        for word in api_moderation_words:
-            if word in text.lower():
-                additional_words_to_moderate.append(word)
-    
-    # ÉTAPE 1: Appliquer la modération de l'API Mistral (filtre principal - 90%)
-    text_before_api = moderated_text
-    for word in additional_words_to_moderate:
-        replacement = "*" * len(word)
-        if re.search(r'\b' + re.escape(word) + r'\b', moderated_text, flags=re.IGNORECASE):
-            moderated_text = re.sub(r'\b' + re.escape(word) + r'\b', replacement, moderated_text, flags=re.IGNORECASE)
-            moderation_details['mistral_api_applied'].append(word)
-    
-    # Vérifier si l'API Mistral a modifié le texte
-    if text_before_api != moderated_text:
-        moderation_details['sources'].append('API Mistral')
-    
-    # ÉTAPE 2: Appliquer le dictionnaire de mots interdits (filet de sécurité - 10%)
-    # Seulement pour les mots qui n'ont pas été modérés par l'API
-    text_before_forbidden = moderated_text
-    for word, replacement in FORBIDDEN_WORDS.items():
-        # Utilise une regex pour trouver le mot entier avec différentes casses
-        if re.search(r'\b' + re.escape(word) + r'\b', moderated_text, flags=re.IGNORECASE):
-            moderated_text = re.sub(r'\b' + re.escape(word) + r'\b', replacement, moderated_text, flags=re.IGNORECASE)
-            moderation_details['forbidden_words_applied'].append(word)
-    
-    # Vérifier si le dictionnaire de mots interdits a modifié le texte
-    if text_before_forbidden != moderated_text:
-        moderation_details['sources'].append('Dictionnaire de mots interdits')
-    
-    # Détection des noms propres (améliorée)
-    # Pour une détection plus précise, un modèle NLP serait nécessaire
-    titles = [
-        # Titres médicaux et académiques
-        "Dr", "Docteur", "Pr", "Professeur", "Prof",
-        # Titres professionnels médicaux
-        "Médecin", "Infirmier", "Infirmière", "Chirurgien", "Chirurgienne",
-        "Pharmacien", "Pharmacienne", "Kinésithérapeute", "Kiné",
-        "Aide-soignant", "Aide-soignante", "Sage-femme", "Sage femme",
-        # Civilités complètes
-        "Monsieur", "Madame", "Mademoiselle",
-        # Civilités abrégées avec et sans point
-        "M\\.?", "Mr\\.?", "Mme\\.?", "Mlle\\.?", "Me\\.?",
-        # Autres titres professionnels
-        "Maître", "Maitre", "Directeur", "Directrice",
-        "Responsable", "Chef"
-    ]
-    text_before_names = moderated_text
-    
-    # Version améliorée pour prendre en compte les noms en majuscules et minuscules
-    for title in titles:
-        # Pour les titres avec regex (ceux avec \\.?)
-        if "\\.?" in title:
-            # Format standard - mot commençant par une majuscule (avec support des traits d'union)
-            pattern_standard = f"\\b({title}\\s+)([A-Z][a-zéèêëàâäôöûüç-]+)"
-            matches = re.findall(pattern_standard, moderated_text, flags=re.IGNORECASE)
-            if matches:
-                for match in matches:
-                    moderation_details['proper_names_applied'].append(f"{match[0]}{match[1]}")
-            moderated_text = re.sub(pattern_standard, r"\1*****", moderated_text, flags=re.IGNORECASE)
-            
-            # Format tout en majuscules
-            pattern_majuscules = f"\\b({title}\\s+)([A-Z][A-ZÉÈÊËÀÂÄÔÖÛÜÇ]+)"
-            matches = re.findall(pattern_majuscules, moderated_text, flags=re.IGNORECASE)
-            if matches:
-                for match in matches:
-                    moderation_details['proper_names_applied'].append(f"{match[0]}{match[1]}")
-            moderated_text = re.sub(pattern_majuscules, r"\1*****", moderated_text, flags=re.IGNORECASE)
+        active_sources = [API_SOURCE, DICTIONARY_SOURCE]
+    else:
+        active_sources = [DICTIONARY_SOURCE]
+    
+    # Chaque étape relève des étendues (start, end, source, terme) sur le texte original, sans le réécrire
+    # ÉTAPES 1 et 2: la liste de l'API Mistral (filtre principal - 90%)
+    # et le dictionnaire de mots interdits (filet de sécurité - 10%), en une seule passe
+    # La version du dictionnaire est lue une seule fois : une modification concurrente n'affecte pas cette requête
+    with STAGE_DURATION.time(stage='lexicon'):
+        matcher = LEXICON_STORE.snapshot.matcher
+        lexicon_spans = matcher.find(text, active_sources)
+    
+    for start, end, source, word in lexicon_spans:
+        if source == API_SOURCE:
+            applied = moderation_details['mistral_api_applied']
         else:
-            # Pour les titres normaux, on fait une recherche insensible à la casse
-            # Format standard - mot commençant par une majuscule (avec support des traits d'union)
-            pattern_standard = f"\\b({re.escape(title)}\\s+)([A-Z][a-zéèêëàâäôöûüç-]+)"
-            matches = re.findall(pattern_standard, moderated_text, flags=re.IGNORECASE)
-            if matches:
-                for match in matches:
-                    moderation_details['proper_names_applied'].append(f"{match[0]}{match[1]}")
-            moderated_text = re.sub(pattern_standard, r"\1*****", moderated_text, flags=re.IGNORECASE)
-            
-            # Format tout en majuscules
-            pattern_majuscules = f"\\b({re.escape(title)}\\s+)([A-Z][A-ZÉÈÊËÀÂÄÔÖÛÜÇ]+)"
-            matches = re.findall(pattern_majuscules, moderated_text, flags=re.IGNORECASE)
-            if matches:
-                for match in matches:
-                    moderation_details['proper_names_applied'].append(f"{match[0]}{match[1]}")
-            moderated_text = re.sub(pattern_majuscules, r"\1*****", moderated_text, flags=re.IGNORECASE)
-    
-    # Vérifier si la détection de noms propres a modifié le texte
-    if text_before_names != moderated_text:
-        moderation_details['sources'].append('Détection de noms propres')
+            applied = moderation_details['forbidden_words_applied']
+        if word not in applied:
+            applied.append(word)
+    
+    # ÉTAPE 3: Détection des noms propres (une seule passe, détecteur compilé au démarrage)
+    with STAGE_DURATION.time(stage='proper_names'):
+        name_spans = [(start, end, PROPER_NAMES_SOURCE, detected)
+                      for start, end, detected in PROPER_NAME_DETECTOR.find(text, lexicon_spans)]
+    moderation_details['proper_names_applied'].extend(detected for _, _, _, detected in name_spans)
+    
+    # Vérifier quelles sources ont modifié le texte
+    if moderation_details['mistral_api_applied']:
+        moderation_details['sources'].append(API_SOURCE)
+    if moderation_details['forbidden_words_applied']:
+        moderation_details['sources'].append(DICTIONARY_SOURCE)
+    if name_spans:
+        moderation_details['sources'].append(PROPER_NAMES_SOURCE)
+    
+    # Redaction finale en une seule passe : les étendues qui se chevauchent sont fusionnées
+    spans = sorted(lexicon_spans + name_spans, key=lambda span: (span[0], span[1]))
+    moderated_text = redact_spans(text, spans, {PROPER_NAMES_SOURCE: NAME_REPLACEMENT})
+    moderation_details['spans'] = [
+        {'start': start, 'end': end, 'source': source, 'term': term}
+        for start, end, source, term in spans
+    ]
     
     # Déterminer le flag RED/GREEN
-    flag, flag_reasons = determine_flag(api_result, moderation_details, text, moderated_text, FLAG_CONFIG)
+    with STAGE_DURATION.time(stage='determine_flag'):
+        flag, flag_reasons = determine_flag(api_result, moderation_details, text, moderated_text, current_flag_config())
+    for reason in flag_reasons:
+        FLAGS.inc(flag=flag, reason=flag_reason_code(reason))
+    DECISION_STORE.record(
+        text, api_result, moderation_details, moderated_text != text, flag, flag_reasons, moderation_threshold
+    )
     
     return moderated_text, api_result, moderation_details, flag, flag_reasons
 
+def parse_moderation_threshold(data):
+    """Seuil de modération de la requête, ramené dans la plage valide [0.1, 1.0]"""
+    # Récupérer le seuil de modération s'il est fourni dans la requête
+    threshold = float(data.get('moderation_threshold', DEFAULT_MODERATION_THRESHOLD))
+    # S'assurer que le seuil est dans la plage valide
+    return max(0.1, min(1.0, threshold))
+
+def parse_request_priority(data, default=PRIORITY_INTERACTIVE):
+    """File du limiteur de débit demandée par le client ("interactive" ou "bulk")"""
+    priorities = {name: priority for priority, name in PRIORITY_NAMES.items()}
+    return priorities.get(data.get('priority'), default)
+
+def validate_batch_texts(data):
+    """
+    Valide le champ "texts" d'une requête de modération par lot
+    
+    Returns:
+        str: Message d'erreur, ou None si la requête est valide
+    """
+    if not data or not isinstance(data.get('texts'), list):
+        return 'Le champ "texts" (liste de textes) est requis'
+    
+    texts = data['texts']
+    if not all(isinstance(text, str) for text in texts):
+        return 'Tous les éléments de "texts" doivent être des chaînes de caractères'
+    
+    if len(texts) > MAX_BATCH_TEXTS:
+        return f'Trop de textes ({len(texts)}), maximum {MAX_BATCH_TEXTS} par requête'
+    
+    return None
+
+def build_moderation_response(original_text, threshold, moderation_result):
+    """Construit la réponse JSON d'une modération (format commun à /moderate et /moderate_batch)"""
+    moderated_text, api_result, moderation_details, flag, flag_reasons = moderation_result
+    
+    return {
+        'status': 'success',
+        'original_text': original_text,
+        'moderated_text': moderated_text,
+        # Si le texte a été modifié, c'est qu'il y a eu modération
+        'is_moderated': moderated_text != original_text,
+        'moderation_threshold': threshold,
+        'api_result': api_result,
+        'moderation_details': moderation_details,
+        'flag': flag,
+        'flag_reasons': flag_reasons
+    }
+
+def build_batch_moderation_response(texts, threshold, moderation_results):
+    """Construit la réponse JSON d'une modération par lot"""
+    return {
+        'status': 'success',
+        'moderation_threshold': threshold,
+        'count': len(texts),
+        'results': [
+            build_moderation_response(text, threshold, moderation_result)
+            for text, moderation_result in zip(texts, moderation_results)
+        ]
+    }
+
+def run_moderation_job(payload):
+    """Traite une tâche de la file asynchrone ; le résultat a le même format que la réponse de /moderate"""
+    text = payload['text']
+    threshold = payload['moderation_threshold']
+    with request_priority(payload.get('priority', PRIORITY_INTERACTIVE)):
+        moderation_result = moderate_text(text, threshold)
+    return build_moderation_response(text, threshold, moderation_result)
+
+# File de tâches asynchrone : les intégrations (PHP, Node) n'attendent plus l'API Mistral
+MODERATION_JOBS = create_job_queue_from_env(run_moderation_job)
+
+@app.before_request
+def start_job_workers():
+    # Workers lancés par le serveur uniquement (pas par les scripts qui importent ce module)
+    MODERATION_JOBS.start()
+
+@app.before_request
+def track_request_start():
+    # Étiquette = route (ex: /jobs/<job_id>) et non le chemin, pour borner le nombre de séries
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    IN_FLIGHT_REQUESTS.inc(endpoint=g.metrics_endpoint)
+
+@app.teardown_request
+def track_request_end(error=None):
+    if 'metrics_endpoint' in g:
+        IN_FLIGHT_REQUESTS.dec(endpoint=g.metrics_endpoint)
+
 @app.route('/moderate', methods=['POST'])
 def moderate():
     """
@@ -403,32 +800,163 @@ def moderate():
             }), 400
         
         original_text = data['text']
-        logger.info(f"Demande de modération pour le texte: {original_text}")
+        logger.info(
+            f"Demande de modération ({len(original_text)} caractères)",
+            extra={'event': 'moderation_request', 'review_text': original_text}
+        )
         
-        # Récupérer le seuil de modération s'il est fourni dans la requête
-        threshold = float(data.get('moderation_threshold', DEFAULT_MODERATION_THRESHOLD))
-        # S'assurer que le seuil est dans la plage valide
-        threshold = max(0.1, min(1.0, threshold))
+        threshold = parse_moderation_threshold(data)
         
-        moderated_text, api_result, moderation_details, flag, flag_reasons = moderate_text(original_text, threshold)
+        with request_priority(parse_request_priority(data, PRIORITY_INTERACTIVE)):
+            moderation_result = moderate_text(original_text, threshold)
         
-        # Si le texte a été modifié, c'est qu'il y a eu modération
-        is_moderated = moderated_text != original_text
+        return jsonify(build_moderation_response(original_text, threshold, moderation_result))
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la modération: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/moderate_batch', methods=['POST'])
+def moderate_batch():
+    """
+    Point d'entrée API pour la modération d'une liste d'avis
+    
+    Les avis sont envoyés à l'API Mistral par paquets (appels multi-entrées).
+    Chaque élément de "results" a le même format que la réponse de /moderate.
+    """
+    try:
+        data = request.json
+        
+        error_message = validate_batch_texts(data)
+        if error_message:
+            return jsonify({
+                'status': 'error',
+                'message': error_message
+            }), 400
+        
+        texts = data['texts']
+        logger.info(f"Demande de modération par lot pour {len(texts)} texte(s)")
+        
+        threshold = parse_moderation_threshold(data)
+        
+        with request_priority(parse_request_priority(data, PRIORITY_BULK)):
+            moderation_results = moderate_texts(texts, threshold)
+        
+        return jsonify(build_batch_moderation_response(texts, threshold, moderation_results))
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la modération par lot: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/jobs/moderate', methods=['POST'])
+def submit_moderation_job():
+    """
+    Soumet un avis à la file de modération asynchrone
+    
+    Retourne immédiatement l'identifiant de la tâche. Le résultat (même format que /moderate)
+    est disponible via GET /jobs/<job_id>, ou envoyé en POST à "callback_url" s'il est fourni.
+    """
+    try:
+        data = request.json
+        
+        if not data or 'text' not in data:
+            return jsonify({
+                'status': 'error',
+                'message': 'Le champ "text" est requis'
+            }), 400
+        
+        callback_url = data.get('callback_url')
+        if callback_url is not None and not isinstance(callback_url, str):
+            return jsonify({
+                'status': 'error',
+                'message': 'Le champ "callback_url" doit être une URL http(s)'
+            }), 400
+        
+        payload = {
+            'text': data['text'],
+            'moderation_threshold': parse_moderation_threshold(data),
+            'priority': parse_request_priority(data, PRIORITY_INTERACTIVE)
+        }
+        reference = data.get('reference')
+        job_id = MODERATION_JOBS.submit(
+            payload,
+            callback_url=callback_url,
+            reference=str(reference) if reference is not None else None
+        )
+        logger.info(f"Tâche de modération {job_id} créée")
+        
+        return jsonify({
+            'status': 'success',
+            'job_id': job_id,
+            'job_status': 'queued',
+            'status_url': f"/jobs/{job_id}"
+        }), 202
+    
+    except CallbackURLError as e:
+        logger.warning(f"Tâche de modération refusée: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    
+    except QueueFullError as e:
+        logger.error(f"Tâche de modération refusée: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la création de la tâche de modération: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_moderation_job(job_id):
+    """
+    Récupère l'état d'une tâche de modération et son résultat lorsqu'elle est terminée
+    """
+    try:
+        job = MODERATION_JOBS.get(job_id)
+        if job is None:
+            return jsonify({
+                'status': 'error',
+                'message': f'Tâche "{job_id}" introuvable'
+            }), 404
         
         return jsonify({
             'status': 'success',
-            'original_text': original_text,
-            'moderated_text': moderated_text,
-            'is_moderated': is_moderated,
-            'moderation_threshold': threshold,
-            'api_result': api_result,
-            'moderation_details': moderation_details,
-            'flag': flag,
-            'flag_reasons': flag_reasons
+            'job': job
         })
     
     except Exception as e:
-        logger.error(f"Erreur lors de la modération: {str(e)}", exc_info=True)
+        logger.error(f"Erreur lors de la récupération de la tâche {job_id}: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/jobs', methods=['GET'])
+def get_moderation_jobs_stats():
+    """
+    Récupère les compteurs de la file de modération asynchrone
+    """
+    try:
+        return jsonify({
+            'status': 'success',
+            'jobs_stats': MODERATION_JOBS.stats()
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des statistiques de la file: {str(e)}", exc_info=True)
         return jsonify({
             'status': 'error',
             'message': f"Erreur serveur: {str(e)}"
@@ -448,53 +976,223 @@ def add_forbidden_word():
                 'message': 'Le champ "word" est requis'
             }), 400
         
-        word = data['word'].lower()
+        word = data['word'].strip().lower()
+        
+        # Nouvelle version du dictionnaire (journal + matcher reconstruit, échange atomique)
+        snapshot, _, _ = LEXICON_STORE.add(word)
+        
+        return jsonify({
+            'status': 'success',
+            'message': f'Le mot "{word}" a été ajouté à la liste des mots interdits',
+            'lexicon_version': snapshot.version,
+            'current_dictionary': snapshot.memo('display_words', display_forbidden_words)
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de l'ajout du mot interdit: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+def parse_word_list(lines):
+    """
+    Normalise une liste de mots importée (minuscules, sans doublons)
+    
+    Les lignes vides et les commentaires (#) sont ignorés.
+    
+    Returns:
+        tuple: (mots valides, entrées refusées car trop longues)
+    """
+    words = []
+    invalid = []
+    for line in lines:
+        word = str(line).strip().lower()
+        if not word or word.startswith('#'):
+            continue
+        if len(word) > MAX_WORD_LENGTH:
+            invalid.append(word[:MAX_WORD_LENGTH] + '...')
+            continue
+        words.append(word)
+    return list(dict.fromkeys(words)), invalid
+
+def read_bulk_words():
+    """
+    Mode et entrées d'une requête d'import en masse
+    
+    Formats acceptés :
+    - fichier (multipart, champ "file") : texte (un mot par ligne) ou CSV (première colonne,
+      en-tête "mot"/"word" ignoré) ; mode dans le champ de formulaire "mode"
+    - JSON : {"mode": "add", "words": ["mot1", "mot2"]}
+    
+    Returns:
+        tuple: (mode, liste des entrées brutes ou None si absente)
+    """
+    if 'file' in request.files:
+        upload = request.files['file']
+        content = upload.read().decode('utf-8-sig')
+        if (upload.filename or '').lower().endswith('.csv'):
+            lines = [row[0] for row in csv.reader(io.StringIO(content)) if row]
+            if lines and lines[0].strip().lower() in ('mot', 'mots', 'word', 'words'):
+                lines = lines[1:]
+        else:
+            lines = content.splitlines()
+        return request.form.get('mode', 'add'), lines
+    
+    data = request.get_json(silent=True) or {}
+    return data.get('mode', 'add'), data.get('words')
+
+@app.route('/forbidden_words/bulk', methods=['POST'])
+def bulk_update_forbidden_words():
+    """
+    Ajoute, supprime ou remplace une liste de mots interdits en une seule opération
+    
+    Quel que soit le nombre de mots : une écriture dans le journal, une reconstruction du
+    matcher et une nouvelle version du dictionnaire. La réponse contient les compteurs,
+    pas le dictionnaire complet (voir /forbidden_words/export).
+    """
+    try:
+        mode, lines = read_bulk_words()
+        
+        if mode not in BULK_LEXICON_MODES:
+            return jsonify({
+                'status': 'error',
+                'message': f'Mode inconnu "{mode}" (valeurs possibles : {", ".join(BULK_LEXICON_MODES)})'
+            }), 400
         
-        # Générer automatiquement le remplacement (astérisques)
-        replacement = "*" * len(word)
+        if not isinstance(lines, list):
+            return jsonify({
+                'status': 'error',
+                'message': 'Un fichier (champ "file") ou une liste "words" est requis'
+            }), 400
         
-        # Mettre à jour le dictionnaire en mémoire
-        FORBIDDEN_WORDS[word] = replacement
+        words, invalid = parse_word_list(lines)
         
-        # Sauvegarder dans le fichier
-        save_success = save_forbidden_words(FORBIDDEN_WORDS)
+        if len(words) > MAX_BULK_WORDS:
+            return jsonify({
+                'status': 'error',
+                'message': f'Trop de mots ({len(words)}), maximum {MAX_BULK_WORDS} par import'
+            }), 400
         
-        if save_success:
+        if mode == 'replace' and not words:
             return jsonify({
-                'status': 'success',
-                'message': f'Le mot "{word}" a été ajouté à la liste des mots interdits',
-                'current_dictionary': {k: "*" * len(k) for k in FORBIDDEN_WORDS.keys()}
-            })
+                'status': 'error',
+                'message': 'La liste de remplacement est vide : le dictionnaire ne peut pas être vidé par un import'
+            }), 400
+        
+        # Nouvelle version du dictionnaire (une entrée de journal + un matcher reconstruit, échange atomique)
+        if mode == 'add':
+            snapshot, added, removed = LEXICON_STORE.update(add=words)
+        elif mode == 'remove':
+            snapshot, added, removed = LEXICON_STORE.update(remove=words)
         else:
+            snapshot, added, removed = LEXICON_STORE.update(replace=words)
+        
+        logger.info(
+            f"Import en masse du dictionnaire ({mode}, {len(words)} mot(s)) : "
+            f"{len(added)} ajouté(s), {len(removed)} supprimé(s), version {snapshot.version}"
+        )
+        
+        return jsonify({
+            'status': 'success',
+            'message': f'{len(added)} mot(s) ajouté(s), {len(removed)} mot(s) supprimé(s)',
+            'mode': mode,
+            'received': len(words),
+            'added': len(added),
+            'removed': len(removed),
+            # Mots déjà présents (ajout) ou absents (suppression)
+            'unchanged': len(words) - len(added) - len(removed) if mode != 'replace' else len(words) - len(added),
+            'invalid_count': len(invalid),
+            'invalid': invalid[:20],
+            'lexicon_version': snapshot.version,
+            'word_count': len(snapshot)
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de l'import en masse des mots interdits: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/forbidden_words/export', methods=['GET'])
+def export_forbidden_words():
+    """
+    Exporte le dictionnaire en flux (format=txt, un mot par ligne, ou format=csv)
+    
+    La version lue au début de la requête est exportée en entier, même si le dictionnaire
+    est modifié pendant le téléchargement.
+    """
+    try:
+        export_format = request.args.get('format', 'txt')
+        if export_format not in ('txt', 'csv'):
             return jsonify({
-                'status': 'warning',
-                'message': f'Le mot "{word}" a été ajouté temporairement mais n\'a pas pu être sauvegardé dans le fichier',
-                'current_dictionary': {k: "*" * len(k) for k in FORBIDDEN_WORDS.keys()}
-            })
+                'status': 'error',
+                'message': 'Le format doit être "txt" ou "csv"'
+            }), 400
+        
+        snapshot = LEXICON_STORE.snapshot
+        
+        def generate():
+            if export_format == 'csv':
+                yield 'mot\r\n'
+            for start in range(0, len(snapshot.words), EXPORT_CHUNK_WORDS):
+                chunk = snapshot.words[start:start + EXPORT_CHUNK_WORDS]
+                if export_format == 'csv':
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows([word] for word in chunk)
+                    yield buffer.getvalue()
+                else:
+                    yield ''.join(f"{word}\n" for word in chunk)
+        
+        response = app.response_class(
+            generate(),
+            mimetype='text/csv' if export_format == 'csv' else 'text/plain'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename=mots_interdits.{export_format}'
+        response.headers['X-Lexicon-Version'] = str(snapshot.version)
+        response.set_etag(snapshot.etag)
+        return response
     
     except Exception as e:
-        logger.error(f"Erreur lors de l'ajout du mot interdit: {str(e)}", exc_info=True)
+        logger.error(f"Erreur lors de l'export des mots interdits: {str(e)}", exc_info=True)
         return jsonify({
             'status': 'error',
             'message': f"Erreur serveur: {str(e)}"
         }), 500
 
+def display_forbidden_words(snapshot):
+    # Pour l'affichage, nous remplaçons les valeurs par des astérisques
+    return {word: "*" * len(word) for word in snapshot.words}
+
+def forbidden_words_body(snapshot):
+    """Corps JSON de /forbidden_words, sérialisé une seule fois par version du dictionnaire"""
+    return app.json.dumps({
+        'status': 'success',
+        'forbidden_words': snapshot.memo('display_words', display_forbidden_words),
+        'lexicon_version': snapshot.version
+    })
+
 @app.route('/forbidden_words', methods=['GET'])
 def get_forbidden_words():
     """
     Récupère la liste des mots interdits
+    
+    Servie depuis la version en mémoire, avec un ETag : un client qui renvoie
+    If-None-Match avec l'ETag de sa copie reçoit 304 si le dictionnaire n'a pas changé.
     """
     try:
-        # Recharger depuis le fichier pour s'assurer d'avoir les données à jour
-        current_words = load_forbidden_words()
-        
-        # Pour l'affichage, nous remplaçons les valeurs par des astérisques
-        display_words = {k: "*" * len(k) for k in current_words.keys()}
+        snapshot = LEXICON_STORE.snapshot
         
-        return jsonify({
-            'status': 'success',
-            'forbidden_words': display_words
-        })
+        if request.if_none_match.contains(snapshot.etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(
+                snapshot.memo('forbidden_words_body', forbidden_words_body),
+                mimetype='application/json'
+            )
+        response.set_etag(snapshot.etag)
+        return response
     
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des mots interdits: {str(e)}", exc_info=True)
@@ -509,8 +1207,8 @@ def get_flag_config():
     Récupère la configuration des seuils de flags
     """
     try:
-        # Recharger depuis le fichier pour s'assurer d'avoir les données à jour
-        current_config = load_flag_config()
+        # Configuration à jour, y compris si elle a été modifiée par un autre processus
+        current_config = current_flag_config()
         
         return jsonify({
             'status': 'success',
@@ -524,6 +1222,35 @@ def get_flag_config():
             'message': f"Erreur serveur: {str(e)}"
         }), 500
 
+def flag_config_etag(config):
+    """Empreinte du contenu de la configuration des flags"""
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+@app.route('/versions', methods=['GET'])
+def get_versions():
+    """
+    Versions courantes du dictionnaire et de la configuration des flags
+    
+    Réponse légère, sans lecture de fichier : les clients (interface Streamlit) conservent
+    la liste des mots et la configuration en cache tant que leur empreinte ne change pas.
+    """
+    try:
+        snapshot = LEXICON_STORE.snapshot
+        config = current_flag_config()
+        
+        return jsonify({
+            'status': 'success',
+            'lexicon': {'version': snapshot.version, 'etag': snapshot.etag, 'word_count': len(snapshot)},
+            'flag_config': {'version': SHARED_STATE.get('flag_config'), 'etag': flag_config_etag(config)}
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des versions: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
 @app.route('/update_flag_config', methods=['POST'])
 def update_flag_config():
     """
@@ -549,12 +1276,19 @@ def update_flag_config():
                     'message': 'Le seuil API Mistral doit être entre 0.0 et 1.0'
                 }), 400
         
-        # Mettre à jour la configuration en mémoire
-        global FLAG_CONFIG
-        FLAG_CONFIG.update(new_config)
-        
-        # Sauvegarder dans le fichier
-        save_success = save_flag_config(FLAG_CONFIG)
+        # Mettre à jour la configuration en mémoire puis dans le fichier, sous le verrou partagé
+        # entre processus ; la nouvelle configuration remplace l'ancienne en une seule affectation
+        global FLAG_CONFIG, FLAG_CONFIG_GENERATION
+        with SHARED_STATE.lock():
+            config = dict(current_flag_config())
+            config.update(new_config)
+            FLAG_CONFIG = config
+            
+            # Sauvegarder dans le fichier
+            save_success = save_flag_config(FLAG_CONFIG)
+            if save_success:
+                # Les autres processus rechargeront le fichier à leur prochaine requête
+                FLAG_CONFIG_GENERATION = SHARED_STATE.increment('flag_config')
         
         if save_success:
             return jsonify({
@@ -576,6 +1310,202 @@ def update_flag_config():
             'message': f"Erreur serveur: {str(e)}"
         }), 500
 
+def parse_history_date(data, field):
+    """Date ISO (ex: "2025-09-01") d'un champ de la requête, en horodatage ; None si absente"""
+    value = data.get(field)
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+def flag_distribution(red):
+    """Nombre d'avis RED et GREEN d'un tableau booléen de flags"""
+    red_count = int(red.sum())
+    return {
+        'RED': red_count,
+        'GREEN': len(red) - red_count,
+        'red_ratio': red_count / len(red) if len(red) else 0.0
+    }
+
+@app.route('/what_if_flag_config', methods=['POST'])
+def what_if_flag_config():
+    """
+    Simule une configuration des flags sur l'historique des décisions, sans appel à l'API Mistral
+    
+    Le flag de chaque avis enregistré est recalculé avec la configuration actuelle et avec la
+    configuration candidate ("flag_config", mêmes champs que /update_flag_config, complétés par la
+    configuration actuelle) ; "since" et "until" (dates ISO) limitent la période.
+    """
+    try:
+        data = request.json or {}
+        
+        if not DECISION_STORE.enabled:
+            return jsonify({
+                'status': 'error',
+                'message': "Historique des décisions désactivé (MODERATION_DECISIONS_DB)"
+            }), 503
+        
+        current_config = current_flag_config()
+        candidate_config = dict(current_config)
+        candidate_config.update(data.get('flag_config') or {})
+        
+        threshold = float(candidate_config.get('mistral_api_score_threshold', 0.3))
+        if not (0.0 <= threshold <= 1.0):
+            return jsonify({
+                'status': 'error',
+                'message': 'Le seuil API Mistral doit être entre 0.0 et 1.0'
+            }), 400
+        
+        try:
+            since = parse_history_date(data, 'since')
+            until = parse_history_date(data, 'until')
+        except (TypeError, ValueError):
+            return jsonify({
+                'status': 'error',
+                'message': 'Les champs "since" et "until" doivent être des dates ISO (ex: "2025-09-01")'
+            }), 400
+        
+        started = time.perf_counter()
+        decisions = DECISION_STORE.frame(since, until)
+        current_red, _ = determine_flags_vectorized(decisions, current_config)
+        candidate_red, triggers = determine_flags_vectorized(decisions, candidate_config)
+        
+        # Catégories de l'API dont le score atteint le seuil candidat
+        score_columns = [column for column in decisions.columns if column.startswith(SCORE_COLUMN_PREFIX)]
+        category_counts = (decisions[score_columns].to_numpy() >= threshold).sum(axis=0)
+        
+        return jsonify({
+            'status': 'success',
+            'total': len(decisions),
+            'current_config': current_config,
+            'candidate_config': candidate_config,
+            'recorded': flag_distribution(decisions['flag'].to_numpy() == 'RED'),
+            'current': flag_distribution(current_red),
+            'candidate': flag_distribution(candidate_red),
+            'changes': {
+                'green_to_red': int((candidate_red & ~current_red).sum()),
+                'red_to_green': int((current_red & ~candidate_red).sum())
+            },
+            'candidate_reasons': {code: int(trigger.sum()) for code, trigger in triggers.items()},
+            'api_score_categories': {
+                column[len(SCORE_COLUMN_PREFIX):]: int(count)
+                for column, count in zip(score_columns, category_counts)
+            },
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la simulation de la configuration des flags: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/decision_stats', methods=['GET'])
+def get_decision_stats():
+    """
+    Récupère la taille de l'historique des décisions et l'état de sa file d'écriture
+    """
+    try:
+        return jsonify({
+            'status': 'success',
+            'decision_stats': DECISION_STORE.stats()
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des statistiques de l'historique: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/cache_stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Récupère les compteurs du cache des résultats de l'API de modération
+    """
+    try:
+        return jsonify({
+            'status': 'success',
+            'cache_stats': MODERATION_CACHE.stats()
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des statistiques du cache: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/lexicon_stats', methods=['GET'])
+def get_lexicon_stats():
+    """
+    Récupère la version courante du dictionnaire et l'état de son journal
+    """
+    try:
+        return jsonify({
+            'status': 'success',
+            'lexicon_stats': LEXICON_STORE.stats(),
+            'shared_state': SHARED_STATE.stats()
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des statistiques du dictionnaire: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Métriques au format texte Prometheus (latence par étape, flags par raison, cache,
+    codes HTTP de l'API Mistral, requêtes en cours)
+    """
+    try:
+        return app.response_class(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération des métriques: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/circuit_breaker', methods=['GET'])
+def get_circuit_breaker():
+    """
+    Récupère l'état du disjoncteur de l'API de modération
+    """
+    try:
+        return jsonify({
+            'status': 'success',
+            'circuit_breaker': MODERATION_BREAKER.stats(),
+            'latency_budget_ms': MODERATION_LATENCY_BUDGET_MS
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération de l'état du disjoncteur: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
+@app.route('/rate_limiter', methods=['GET'])
+def get_rate_limiter():
+    """
+    Récupère l'état du limiteur de débit des appels à l'API Mistral (files, temps d'attente)
+    """
+    try:
+        return jsonify({
+            'status': 'success',
+            'rate_limiter': SHARED_RATE_LIMITER.stats()
+        })
+    
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération de l'état du limiteur de débit: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f"Erreur serveur: {str(e)}"
+        }), 500
+
 @app.route('/remove_forbidden_word', methods=['POST'])
 def remove_forbidden_word():
     """
@@ -590,33 +1520,24 @@ def remove_forbidden_word():
                 'message': 'Le champ "word" est requis'
             }), 400
         
-        word = data['word'].lower()
+        word = data['word'].strip().lower()
         
-        # Vérifier si le mot existe
-        if word not in FORBIDDEN_WORDS:
+        # Supprimer le mot (journal + matcher reconstruit, échange atomique)
+        snapshot, _, removed = LEXICON_STORE.remove(word)
+        
+        # Vérifier si le mot existait
+        if not removed:
             return jsonify({
                 'status': 'error',
                 'message': f'Le mot "{word}" n\'existe pas dans la liste des mots interdits'
             }), 404
         
-        # Supprimer du dictionnaire en mémoire
-        del FORBIDDEN_WORDS[word]
-        
-        # Sauvegarder dans le fichier
-        save_success = save_forbidden_words(FORBIDDEN_WORDS)
-        
-        if save_success:
-            return jsonify({
-                'status': 'success',
-                'message': f'Le mot "{word}" a été supprimé de la liste des mots interdits',
-                'current_dictionary': FORBIDDEN_WORDS
-            })
-        else:
-            return jsonify({
-                'status': 'warning',
-                'message': f'Le mot "{word}" a été supprimé temporairement mais la mise à jour n\'a pas pu être sauvegardée dans le fichier',
-                'current_dictionary': FORBIDDEN_WORDS
-            })
+        return jsonify({
+            'status': 'success',
+            'message': f'Le mot "{word}" a été supprimé de la liste des mots interdits',
+            'lexicon_version': snapshot.version,
+            'current_dictionary': snapshot.memo('display_words', display_forbidden_words)
+        })
     
     except Exception as e:
         logger.error(f"Erreur lors de la suppression du mot interdit: {str(e)}", exc_info=True)
@@ -0,0 +1,217 @@
+"""
+Mode de service asynchrone (ASGI) de l'API de modération
+
+Lancement : uvicorn asgi_app:app --host 0.0.0.0 --port 5004
+
+Les routes /moderate et /moderate_batch sont natives asyncio : l'appel à l'API Mistral
+ne bloque aucun thread, ce qui permet des milliers de modérations en cours dans un seul
+processus. Les autres routes (/forbidden_words, /get_flag_config, ...) sont servies par
+l'application Flask existante, montée telle quelle, et partagent le même état en mémoire.
+"""
+import asyncio
+import functools
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import app as moderation_service
+from coalescer import AsyncRequestCoalescer
+from mistral_client import (
+    AsyncMistralClient, create_client_from_env, current_priority, request_priority,
+    RateLimitTimeout, PRIORITY_INTERACTIVE, PRIORITY_BULK
+)
+
+logger = logging.getLogger(__name__)
+
+# Nombre de connexions simultanées vers l'API Mistral en mode asynchrone
+ASYNC_POOL_SIZE = 100
+
+# Client et regroupement asynchrones, créés au démarrage dans la boucle du serveur
+ASYNC_MISTRAL_CLIENT = None
+ASYNC_MODERATION_COALESCER = None
+
+
+async def request_moderation_api_async(texts, deadline=None):
+    """Équivalent non bloquant de request_moderation_api"""
+    started = time.monotonic()
+    try:
+        response = await ASYNC_MISTRAL_CLIENT.post(
+            "/moderations",
+            json=moderation_service.build_moderation_payload(texts),
+            deadline=deadline or moderation_service.moderation_deadline()
+        )
+        moderation_service.record_moderation_call(response, started)
+        return moderation_service.parse_moderation_response(response, texts)
+
+    except RateLimitTimeout as e:
+        logger.warning(f"Appel API abandonné: {str(e)}")
+        return [{"error": str(e)} for _ in texts]
+
+    except Exception as e:
+        logger.error(f"Exception lors de l'appel API: {str(e)}")
+        moderation_service.UPSTREAM_RESPONSES.inc(status_code='exception')
+        moderation_service.MODERATION_BREAKER.record_failure(str(e))
+        return [{"error": str(e)} for _ in texts]
+
+
+async def check_moderation_api_batch_async(texts, threshold):
+    """
+    Équivalent non bloquant de check_moderation_api_batch (même cache, même disjoncteur, même décision)
+
+    La lecture et l'écriture du cache (SQLite sous verrou) sont exécutées dans un thread
+    pour ne pas bloquer la boucle d'événements sur des entrées/sorties disque.
+    """
+    deadline = moderation_service.moderation_deadline()
+    api_results, pending = await run_in_threadpool(moderation_service.lookup_moderation_cache, texts)
+
+    if pending:
+        if not moderation_service.MODERATION_BREAKER.allow_request():
+            fetched = moderation_service.short_circuited_results(pending)
+        elif ASYNC_MODERATION_COALESCER is not None and current_priority() == PRIORITY_INTERACTIVE:
+            fetched = await ASYNC_MODERATION_COALESCER.submit_many(list(pending), deadline)
+        else:
+            fetched = await request_moderation_api_async(list(pending), deadline)
+        await run_in_threadpool(moderation_service.store_moderation_results, api_results, pending, fetched)
+
+    return moderation_service.moderation_checks(api_results, threshold)
+
+
+def apply_local_moderation_batch(texts, checks, threshold):
+    return [
+        moderation_service.apply_local_moderation(text, should_moderate, api_result, threshold)
+        for text, (should_moderate, api_result) in zip(texts, checks)
+    ]
+
+
+async def moderate_texts_async(texts, threshold):
+    """
+    Équivalent non bloquant de moderate_texts
+
+    Les paquets sont envoyés en parallèle ; les étapes locales d'un lot sont exécutées
+    dans un thread pour ne pas bloquer la boucle d'événements.
+    """
+    batch_size = moderation_service.MODERATION_BATCH_SIZE
+    chunks = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    chunk_checks = await asyncio.gather(*(check_moderation_api_batch_async(chunk, threshold) for chunk in chunks))
+    checks = [check for chunk in chunk_checks for check in chunk]
+    return await run_in_threadpool(apply_local_moderation_batch, texts, checks, threshold)
+
+
+def error_response(message, status_code):
+    return JSONResponse({'status': 'error', 'message': message}, status_code=status_code)
+
+
+def track_in_flight(endpoint):
+    """Compte les requêtes en cours d'une route native dans les métriques du service"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            with moderation_service.IN_FLIGHT_REQUESTS.track_in_progress(endpoint=endpoint):
+                return await handler(request)
+        return wrapper
+    return decorator
+
+
+@track_in_flight('/moderate')
+async def moderate(request):
+    """
+    Point d'entrée API pour la modération (version asynchrone de /moderate)
+    """
+    try:
+        data = await request.json()
+
+        if not data or 'text' not in data:
+            return error_response('Le champ "text" est requis', 400)
+
+        original_text = data['text']
+        logger.info(
+            f"Demande de modération ({len(original_text)} caractères)",
+            extra={'event': 'moderation_request', 'review_text': original_text}
+        )
+
+        threshold = moderation_service.parse_moderation_threshold(data)
+
+        with request_priority(moderation_service.parse_request_priority(data, PRIORITY_INTERACTIVE)):
+            checks = await check_moderation_api_batch_async([original_text], threshold)
+        should_moderate, api_result = checks[0]
+        # Étapes locales (verrou inter-processus, rechargement du lexique) hors de la boucle d'événements
+        moderation_result = await run_in_threadpool(
+            moderation_service.apply_local_moderation, original_text, should_moderate, api_result, threshold
+        )
+
+        return JSONResponse(moderation_service.build_moderation_response(original_text, threshold, moderation_result))
+
+    except Exception as e:
+        logger.error(f"Erreur lors de la modération: {str(e)}", exc_info=True)
+        return error_response(f"Erreur serveur: {str(e)}", 500)
+
+
+@track_in_flight('/moderate_batch')
+async def moderate_batch(request):
+    """
+    Point d'entrée API pour la modération d'une liste d'avis (version asynchrone de /moderate_batch)
+    """
+    try:
+        data = await request.json()
+
+        error_message = moderation_service.validate_batch_texts(data)
+        if error_message:
+            return error_response(error_message, 400)
+
+        texts = data['texts']
+        logger.info(f"Demande de modération par lot pour {len(texts)} texte(s)")
+
+        threshold = moderation_service.parse_moderation_threshold(data)
+
+        with request_priority(moderation_service.parse_request_priority(data, PRIORITY_BULK)):
+            moderation_results = await moderate_texts_async(texts, threshold)
+
+        return JSONResponse(moderation_service.build_batch_moderation_response(texts, threshold, moderation_results))
+
+    except Exception as e:
+        logger.error(f"Erreur lors de la modération par lot: {str(e)}", exc_info=True)
+        return error_response(f"Erreur serveur: {str(e)}", 500)
+
+
+@asynccontextmanager
+async def lifespan(_):
+    global ASYNC_MISTRAL_CLIENT, ASYNC_MODERATION_COALESCER
+
+    ASYNC_MISTRAL_CLIENT = create_client_from_env(
+        moderation_service.MISTRAL_API_KEY,
+        read_timeout=10,
+        pool_size=ASYNC_POOL_SIZE,
+        client_class=AsyncMistralClient
+    )
+    if moderation_service.MODERATION_COALESCE_WINDOW_MS > 0:
+        ASYNC_MODERATION_COALESCER = AsyncRequestCoalescer(
+            request_moderation_api_async,
+            window_seconds=moderation_service.MODERATION_COALESCE_WINDOW_MS / 1000,
+            max_batch_size=moderation_service.MODERATION_BATCH_SIZE,
+            timeout_result=moderation_service.timed_out_result
+        )
+        ASYNC_MODERATION_COALESCER.start()
+    moderation_service.MODERATION_JOBS.start()
+
+    yield
+
+    if ASYNC_MODERATION_COALESCER is not None:
+        await ASYNC_MODERATION_COALESCER.stop()
+    await ASYNC_MISTRAL_CLIENT.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/moderate', moderate, methods=['POST']),
+        Route('/moderate_batch', moderate_batch, methods=['POST']),
+        # Toutes les autres routes : application Flask existante
+        Mount('/', app=WSGIMiddleware(moderation_service.app))
+    ],
+    lifespan=lifespan
+)
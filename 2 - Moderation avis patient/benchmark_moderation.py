@@ -0,0 +1,345 @@
+"""
+Banc d'essai de performance de moderate_text et determine_flag
+
+Usage :
+    python benchmark_moderation.py
+    python benchmark_moderation.py --lexicon-sizes 320,10000,100000 --reviews 2000 --output bench.json
+    python benchmark_moderation.py --baseline bench.json --max-regression 0.2
+
+- Corpus synthétique d'avis de patients en français, reproductible (--seed) : plusieurs profils
+  de longueur, de densité de mots interdits et de densité de titres/noms propres
+- Dictionnaire agrandi de la taille actuelle jusqu'à 100 000 entrées (mots synthétiques)
+- Appel à l'API Mistral remplacé par un bouchon local déterministe (aucun appel réseau)
+- Résultats : avis/s, durée moyenne de chaque étape, temps de construction et mémoire du matcher
+- --baseline : compare à un résultat précédent et sort en erreur si le débit baisse de plus de --max-regression
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# L'API n'est jamais appelée (bouchon local) : une clé est inutile pour le banc d'essai
+os.environ.setdefault('MISTRAL_API_KEY', 'benchmark')
+# Les décisions du banc d'essai ne doivent pas alimenter l'historique utilisé par /what_if_flag_config
+os.environ['MODERATION_DECISIONS_DB'] = ''
+
+import app as moderation_service
+from lexicon_store import LexiconStore
+from moderation_cache import ModerationCache
+from proper_names import ProperNameDetector, TITLES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Catégories renvoyées par l'API de modération Mistral
+MODERATION_CATEGORIES = [
+    "sexual", "hate_and_discrimination", "violence_and_threats", "dangerous_and_criminal_content",
+    "selfharm", "health", "financial", "law", "pii"
+]
+
+# Profils d'avis : (nom, nombre de mots min, max, densité de mots interdits, densité de titres + noms)
+CORPUS_PROFILES = [
+    ('court', 15, 30, 0.02, 0.02),
+    ('moyen', 60, 120, 0.01, 0.01),
+    ('long', 250, 400, 0.005, 0.01),
+    ('charge', 60, 120, 0.10, 0.05)
+]
+
+REVIEW_WORDS = (
+    "le la les un une des du de et à au en dans pour avec sans sur par très bien mal "
+    "accueil service personnel équipe hôpital clinique chambre attente rendez-vous urgences "
+    "soins consultation opération traitement douleur infirmières médecins secrétariat parking "
+    "repas propreté bruit nuit jour semaine heure minutes retard patient famille enfant "
+    "aimable souriant compétent professionnel disponible attentif rapide lent froid sale propre "
+    "recommande déçu satisfait merci vraiment toujours jamais encore trop peu assez "
+    "été était avons avait fait dit expliqué examiné attendu reçu sorti revenu appelé"
+).split()
+
+FAMILY_NAMES = [
+    "Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau",
+    "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux", "Vincent", "Fournier"
+]
+
+SYLLABLES = ["ba", "cro", "di", "fla", "gue", "ju", "ka", "lo", "mir", "nou", "pé", "qua", "ri", "sto",
+             "tra", "vu", "xé", "zo", "bre", "chi", "dré", "fou", "gna", "pli"]
+
+
+class StubResponse:
+    def __init__(self, payload):
+        self.status_code = 200
+        self.headers = {}
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class StubMistralClient:
+    """
+    Bouchon déterministe de l'API de modération : les scores sont dérivés de l'empreinte
+    du texte, un même corpus donne donc toujours les mêmes verdicts
+    """
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    def post(self, path, json=None, **kwargs):
+        self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return StubResponse({
+            'id': f'stub-{self.calls}',
+            'model': moderation_service.MODERATION_MODEL,
+            'results': [self.scores(text) for text in json['input']]
+        })
+
+    @staticmethod
+    def scores(text):
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=len(MODERATION_CATEGORIES)).digest()
+        # Environ 10 % des avis ont une catégorie au-dessus de 0.5
+        category_scores = {
+            category: round((byte / 255) ** 60, 4) for category, byte in zip(MODERATION_CATEGORIES, digest)
+        }
+        return {
+            'categories': {category: score >= 0.5 for category, score in category_scores.items()},
+            'category_scores': category_scores
+        }
+
+
+def synthetic_words(count, rng, existing):
+    """Mots et expressions synthétiques (absents du français courant) pour agrandir le dictionnaire"""
+    words = []
+    seen = set(existing)
+    while len(words) < count:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.1:
+            word += ' ' + ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def scaled_lexicon(base_words, size, seed):
+    """Dictionnaire actuel complété par des mots synthétiques jusqu'à size entrées"""
+    rng = random.Random(f"{seed}-lexicon")
+    return list(base_words) + synthetic_words(max(0, size - len(base_words)), rng, base_words)
+
+
+def scaled_titles(count, seed):
+    """Liste des titres actuelle complétée par des titres synthétiques jusqu'à count entrées"""
+    rng = random.Random(f"{seed}-titles")
+    extra = [word.capitalize() for word in synthetic_words(max(0, count - len(TITLES)), rng, []) if ' ' not in word]
+    return TITLES + extra
+
+
+def generate_review(rng, profile, lexicon_words):
+    """Avis synthétique : mots courants, mots du dictionnaire et titres suivis d'un nom"""
+    _, min_words, max_words, profanity_density, name_density = profile
+    words = []
+    for _ in range(rng.randint(min_words, max_words)):
+        draw = rng.random()
+        if draw < profanity_density:
+            words.append(rng.choice(lexicon_words))
+        elif draw < profanity_density + name_density:
+            title = rng.choice(TITLES).replace('\\.?', '.')
+            words.append(f"{title} {rng.choice(FAMILY_NAMES)}")
+        else:
+            words.append(rng.choice(REVIEW_WORDS))
+    review = ' '.join(words)
+    return review[0].upper() + review[1:] + '.'
+
+
+def generate_corpus(count, lexicon_words, seed):
+    """count avis par profil, identiques d'une exécution à l'autre pour un même seed"""
+    rng = random.Random(f"{seed}-corpus")
+    return {
+        profile[0]: [generate_review(rng, profile, lexicon_words) for _ in range(count)]
+        for profile in CORPUS_PROFILES
+    }
+
+
+def install_lexicon(words):
+    """
+    Remplace le dictionnaire du service par words (sans toucher à mots_interdits.txt)
+
+    Returns:
+        tuple: (durée de construction en secondes, mémoire allouée par le matcher en octets)
+    """
+    def build_store():
+        # Aucun fichier ni journal : le dictionnaire n'existe qu'en mémoire
+        return LexiconStore(os.devnull, lambda: words, moderation_service.build_lexicon_matcher, journal_file=os.devnull)
+
+    # Mémoire mesurée sur une première construction (tracemalloc ralentit l'exécution),
+    # durée sur une seconde construction sans traçage
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    store = build_store()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+
+    started = time.perf_counter()
+    moderation_service.LEXICON_STORE = build_store()
+    return time.perf_counter() - started, after - before
+
+
+def stage_totals():
+    return {key[0]: value for key, value in moderation_service.STAGE_DURATION.totals().items()}
+
+
+def run_scenario(corpus, threshold):
+    """Modère tout le corpus avec moderate_text ; retourne les mesures du scénario"""
+    # Cache vide à chaque scénario : chaque avis passe par le bouchon de l'API
+    moderation_service.MODERATION_CACHE = ModerationCache(max_entries=100000)
+    before = stage_totals()
+    flags = {'RED': 0, 'GREEN': 0}
+
+    results = {}
+    total_reviews = 0
+    total_seconds = 0.0
+    for profile_name, reviews in corpus.items():
+        started = time.perf_counter()
+        for review in reviews:
+            flag = moderation_service.moderate_text(review, threshold)[3]
+            flags[flag] += 1
+        elapsed = time.perf_counter() - started
+        results[profile_name] = round(len(reviews) / elapsed, 1)
+        total_reviews += len(reviews)
+        total_seconds += elapsed
+
+    after = stage_totals()
+    stages = {}
+    for stage, (count, total) in after.items():
+        previous_count, previous_total = before.get(stage, (0, 0.0))
+        if count > previous_count:
+            stages[stage] = round((total - previous_total) / (count - previous_count) * 1e6, 1)
+
+    return {
+        'reviews_per_second': round(total_reviews / total_seconds, 1),
+        'reviews_per_second_by_profile': results,
+        'stage_microseconds': stages,
+        'flags': flags
+    }
+
+
+def max_rss_megabytes():
+    if resource is None:
+        return None
+    # ru_maxrss est en kilo-octets sous Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def print_scenario(result):
+    stages = ', '.join(f"{stage} {value} µs" for stage, value in sorted(result['stage_microseconds'].items()))
+    profiles = ', '.join(f"{name} {value}/s" for name, value in result['reviews_per_second_by_profile'].items())
+    print(
+        f"dictionnaire {result['lexicon_size']:>7} | titres {result['title_count']:>4} | "
+        f"{result['reviews_per_second']:>8} avis/s | construction {result['matcher_build_seconds']:.2f} s, "
+        f"{result['matcher_memory_megabytes']} Mo"
+    )
+    print(f"    profils : {profiles}")
+    print(f"    étapes (moyenne par avis) : {stages}")
+    print(f"    flags : {result['flags']}")
+
+
+def compare_with_baseline(results, baseline_path, max_regression):
+    """Retourne la liste des scénarios dont le débit a baissé de plus de max_regression"""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {
+            (scenario['lexicon_size'], scenario['title_count']): scenario
+            for scenario in json.load(file)['scenarios']
+        }
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['lexicon_size'], result['title_count']))
+        if previous is None:
+            continue
+        ratio = result['reviews_per_second'] / previous['reviews_per_second']
+        print(
+            f"dictionnaire {result['lexicon_size']:>7} | titres {result['title_count']:>4} | "
+            f"{previous['reviews_per_second']} -> {result['reviews_per_second']} avis/s ({ratio - 1:+.1%})"
+        )
+        if ratio < 1 - max_regression:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai de performance de moderate_text")
+    parser.add_argument('--lexicon-sizes', default='current,1000,10000,100000',
+                        help="Tailles du dictionnaire, séparées par des virgules (current : dictionnaire actuel)")
+    parser.add_argument('--title-counts', default='current',
+                        help="Nombres de titres, séparés par des virgules (current : liste actuelle)")
+    parser.add_argument('--reviews', type=int, default=500, help="Nombre d'avis par profil de corpus")
+    parser.add_argument('--seed', type=int, default=42, help="Graine du corpus et des mots synthétiques")
+    parser.add_argument('--threshold', type=float, default=moderation_service.DEFAULT_MODERATION_THRESHOLD,
+                        help="Seuil de modération entre 0.1 et 1.0")
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help="Latence simulée du bouchon de l'API")
+    parser.add_argument('--output', help="Fichier JSON des résultats (à conserver comme référence)")
+    parser.add_argument('--baseline', help="Fichier JSON d'une exécution précédente à comparer")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="Baisse de débit tolérée par rapport à --baseline (défaut : 0.2 soit 20 %%)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Appel distant remplacé par le bouchon ; regroupement désactivé (un seul thread)
+    moderation_service.MISTRAL_CLIENT = StubMistralClient(args.api_latency_ms / 1000)
+    moderation_service.MODERATION_COALESCER = None
+
+    base_words = list(moderation_service.LEXICON_STORE.snapshot.words)
+    lexicon_sizes = [len(base_words) if size == 'current' else int(size) for size in args.lexicon_sizes.split(',')]
+    title_counts = [len(TITLES) if count == 'current' else int(count) for count in args.title_counts.split(',')]
+    threshold = max(0.1, min(1.0, args.threshold))
+
+    results = []
+    for lexicon_size in lexicon_sizes:
+        lexicon_words = scaled_lexicon(base_words, lexicon_size, args.seed)
+        build_seconds, matcher_bytes = install_lexicon(lexicon_words)
+        # Le corpus puise dans le dictionnaire agrandi : le nombre de correspondances suit sa taille
+        corpus = generate_corpus(args.reviews, lexicon_words, args.seed)
+
+        for title_count in title_counts:
+            moderation_service.PROPER_NAME_DETECTOR = ProperNameDetector(scaled_titles(title_count, args.seed))
+            result = run_scenario(corpus, threshold)
+            result.update({
+                'lexicon_size': len(lexicon_words),
+                'title_count': title_count,
+                'matcher_build_seconds': round(build_seconds, 3),
+                'matcher_memory_megabytes': round(matcher_bytes / 1024 / 1024, 1)
+            })
+            print_scenario(result)
+            results.append(result)
+
+    print(f"Mémoire maximale du processus : {max_rss_megabytes()} Mo")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({
+                'seed': args.seed,
+                'reviews_per_profile': args.reviews,
+                'max_rss_megabytes': max_rss_megabytes(),
+                'scenarios': results
+            }, file, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.max_regression)
+        if regressions:
+            print(f"❌ Régression de débit supérieure à {args.max_regression:.0%} sur "
+                  f"{len(regressions)} scénario(s)", file=sys.stderr)
+            sys.exit(1)
+        print("✅ Pas de régression de débit")
+
+
+if __name__ == '__main__':
+    main()
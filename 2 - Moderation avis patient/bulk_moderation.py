@@ -0,0 +1,225 @@
+"""
+Modération en masse d'archives d'avis (CSV ou JSONL) en ligne de commande
+
+Usage :
+    python bulk_moderation.py avis.csv resultats.jsonl --text-column avis --id-column id
+    python bulk_moderation.py avis.jsonl resultats.jsonl --workers 4
+
+- Lecture en flux : la mémoire reste bornée quelle que soit la taille du fichier
+- Appels à l'API Mistral par lots multi-entrées (--batch-size), plusieurs lots en parallèle (--workers)
+- Point de reprise (<sortie>.checkpoint) écrit après chaque lot : relancer la même commande
+  après un arrêt reprend là où le traitement s'était interrompu
+- Débit affiché régulièrement sur la sortie d'erreur
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import app as moderation_service
+from mistral_client import PRIORITY_BULK, request_priority
+
+
+def read_records(input_path, input_format, text_column, id_column):
+    """
+    Lit le fichier d'entrée en flux et produit des tuples (identifiant, texte)
+
+    Le texte vaut None pour un enregistrement illisible (ligne JSON invalide, champ absent ou
+    qui n'est pas une chaîne) : il est compté en erreur sans interrompre le traitement.
+    """
+    # utf-8-sig : ignore le BOM des exports Excel, qui corromprait le nom de la première colonne
+    with open(input_path, 'r', encoding='utf-8-sig', newline='') as file:
+        if input_format == 'csv':
+            for index, row in enumerate(csv.DictReader(file)):
+                record_id = row.get(id_column) if id_column else None
+                yield (record_id if record_id not in (None, '') else index), row.get(text_column) or ''
+        else:
+            for index, line in enumerate(file):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if not isinstance(record, dict):
+                    yield index, None
+                    continue
+                record_id = record.get(id_column) if id_column else None
+                text = record.get(text_column)
+                if text is None:
+                    text = ''
+                elif not isinstance(text, str):
+                    text = None
+                yield (record_id if record_id is not None else index), text
+
+
+def read_batches(records, batch_size):
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def moderate_batch(batch, threshold, full_output):
+    """Modère un lot et retourne les lignes JSONL correspondantes"""
+    texts = [text for _, text in batch if text is not None and text.strip()]
+    # File "bulk" du limiteur de débit : le trafic interactif du même processus reste prioritaire
+    with request_priority(PRIORITY_BULK):
+        moderation_results = iter(moderation_service.moderate_texts(texts, threshold))
+
+    lines = []
+    for record_id, text in batch:
+        if text is None:
+            output = {'id': record_id, 'status': 'error', 'message': "Enregistrement invalide (JSON illisible ou texte qui n'est pas une chaîne)"}
+        elif not text.strip():
+            output = {'id': record_id, 'status': 'error', 'message': 'Texte vide'}
+        else:
+            response = moderation_service.build_moderation_response(text, threshold, next(moderation_results))
+            if full_output:
+                output = {'id': record_id, **response}
+            else:
+                output = {
+                    'id': record_id,
+                    'status': response['status'],
+                    'flag': response['flag'],
+                    'flag_reasons': response['flag_reasons'],
+                    'is_moderated': response['is_moderated'],
+                    'moderated_text': response['moderated_text'],
+                    'moderation_details': response['moderation_details']
+                }
+        lines.append(json.dumps(output, ensure_ascii=False) + '\n')
+    return lines
+
+
+def load_checkpoint(checkpoint_path, input_path):
+    """Retourne (enregistrements déjà traités, taille de la sortie, compteurs de flags) depuis le point de reprise"""
+    if not os.path.exists(checkpoint_path):
+        return 0, 0, {'RED': 0, 'GREEN': 0, 'ERROR': 0}
+    with open(checkpoint_path, 'r', encoding='utf-8') as file:
+        checkpoint = json.load(file)
+    if checkpoint.get('input') != os.path.abspath(input_path):
+        raise SystemExit(f"Le point de reprise {checkpoint_path} concerne un autre fichier d'entrée ({checkpoint.get('input')})")
+    return checkpoint['records_done'], checkpoint['output_bytes'], checkpoint['flags']
+
+
+def save_checkpoint(checkpoint_path, input_path, records_done, output_bytes, counts):
+    """Écrit le point de reprise de manière atomique (fichier temporaire puis remplacement)"""
+    temporary_path = checkpoint_path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump({
+            'input': os.path.abspath(input_path),
+            'records_done': records_done,
+            'output_bytes': output_bytes,
+            'flags': counts,
+            'updated_at': time.strftime('%Y-%m-%d %H:%M:%S')
+        }, file)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def report(records_done, resumed_from, started_at, counts, final=False):
+    elapsed = time.monotonic() - started_at
+    processed = records_done - resumed_from
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    prefix = "Terminé" if final else "Progression"
+    print(
+        f"{prefix} : {records_done} avis traités ({processed} dans cette exécution, {rate:.1f} avis/s) "
+        f"- RED: {counts['RED']}, GREEN: {counts['GREEN']}, erreurs: {counts['ERROR']}",
+        file=sys.stderr
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modération en masse d'avis (CSV ou JSONL) vers JSONL")
+    parser.add_argument('input', help="Fichier d'avis (.csv ou .jsonl)")
+    parser.add_argument('output', help="Fichier de résultats JSONL")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Format d'entrée (déduit de l'extension par défaut)")
+    parser.add_argument('--text-column', default='text', help="Colonne/champ contenant l'avis (défaut : text)")
+    parser.add_argument('--id-column', default='id', help="Colonne/champ identifiant l'avis (défaut : id, sinon numéro de ligne)")
+    parser.add_argument('--threshold', type=float, default=moderation_service.DEFAULT_MODERATION_THRESHOLD,
+                        help="Seuil de modération entre 0.1 et 1.0")
+    parser.add_argument('--batch-size', type=int, default=moderation_service.MODERATION_BATCH_SIZE,
+                        help="Nombre d'avis par lot")
+    parser.add_argument('--workers', type=int, default=2, help="Nombre de lots traités en parallèle")
+    parser.add_argument('--report-every', type=float, default=10.0, help="Intervalle d'affichage du débit (secondes)")
+    parser.add_argument('--full', action='store_true', help="Écrire la réponse complète (format /moderate) pour chaque avis")
+    parser.add_argument('--restart', action='store_true', help="Ignorer le point de reprise et recommencer depuis le début")
+    parser.add_argument('--verbose', action='store_true', help="Conserver les logs détaillés de l'API")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    input_format = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+    threshold = max(0.1, min(1.0, args.threshold))
+    checkpoint_path = args.output + '.checkpoint'
+
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    records_done, output_bytes, counts = load_checkpoint(checkpoint_path, args.input)
+    if records_done:
+        # Le point de reprise ne vaut que si le fichier de sortie contient les résultats qu'il compte
+        output_size = os.path.getsize(args.output) if os.path.exists(args.output) else None
+        if output_size is None or output_size < output_bytes:
+            raise SystemExit(
+                f"Le point de reprise indique {records_done} avis traités ({output_bytes} octets écrits), "
+                f"mais {args.output} est {'absent' if output_size is None else f'plus court ({output_size} octets)'} : "
+                f"relancer avec --restart pour recommencer depuis le début"
+            )
+        print(f"Reprise après {records_done} avis déjà traités", file=sys.stderr)
+
+    records = read_records(args.input, input_format, args.text_column, args.id_column)
+    # Sauter les enregistrements déjà traités lors d'une exécution précédente
+    records = islice(records, records_done, None)
+
+    mode = 'r+b' if records_done else 'wb'
+    with open(args.output, mode) as output, ThreadPoolExecutor(max_workers=args.workers) as executor:
+        # Supprimer une éventuelle ligne partiellement écrite après le dernier point de reprise
+        output.seek(output_bytes)
+        output.truncate()
+
+        started_at = last_report = time.monotonic()
+        resumed_from = records_done
+        in_flight = deque()
+        batches = read_batches(records, args.batch_size)
+
+        def submit_next():
+            batch = next(batches, None)
+            if batch is not None:
+                in_flight.append((len(batch), executor.submit(moderate_batch, batch, threshold, args.full)))
+
+        for _ in range(args.workers):
+            submit_next()
+
+        # Les lots sont écrits dans l'ordre d'entrée ; au plus "workers" lots sont en mémoire
+        while in_flight:
+            batch_size, future = in_flight.popleft()
+            lines = future.result()
+            submit_next()
+
+            for line in lines:
+                output.write(line.encode('utf-8'))
+                flag = json.loads(line).get('flag')
+                counts[flag if flag in counts else 'ERROR'] += 1
+            output.flush()
+            os.fsync(output.fileno())
+
+            records_done += batch_size
+            save_checkpoint(checkpoint_path, args.input, records_done, output.tell(), counts)
+
+            if time.monotonic() - last_report >= args.report_every:
+                report(records_done, resumed_from, started_at, counts)
+                last_report = time.monotonic()
+
+        report(records_done, resumed_from, started_at, counts, final=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur autour d'un service distant (API de modération Mistral)
+
+    - Fermé : les appels passent ; les échecs et les réponses lentes consécutifs sont comptés
+    - Ouvert : après failure_threshold échecs consécutifs, plus aucun appel n'est envoyé
+      (les requêtes passent directement aux étapes locales)
+    - Semi-ouvert : après recovery_seconds, un appel de test (probe_function) est envoyé en
+      arrière-plan ; s'il réussit rapidement le disjoncteur se referme, sinon il reste ouvert.
+      Aucune requête utilisateur n'attend ce test.
+    """
+
+    def __init__(self, probe_function, failure_threshold=5, slow_call_seconds=2.0, recovery_seconds=30.0):
+        """
+        Args:
+            probe_function (callable): Appel de test sans argument, retourne True si le service répond correctement
+            failure_threshold (int): Nombre d'échecs (ou réponses lentes) consécutifs déclenchant l'ouverture
+            slow_call_seconds (float): Durée au-delà de laquelle une réponse réussie compte comme un échec
+            recovery_seconds (float): Délai avant chaque appel de test lorsque le disjoncteur est ouvert
+        """
+        self.probe_function = probe_function
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.recovery_seconds = recovery_seconds
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_failure_reason = None
+        self.times_opened = 0
+        self.short_circuited = 0
+        self.probes = 0
+
+    def allow_request(self):
+        """Indique si un appel peut être envoyé ; sinon il est compté comme court-circuité"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self, duration):
+        """Enregistre un appel réussi (une réponse trop lente compte comme un échec)"""
+        if duration >= self.slow_call_seconds:
+            self.record_failure(f"Réponse lente ({duration:.2f}s >= {self.slow_call_seconds}s)")
+            return
+        with self._lock:
+            if self.state == CLOSED:
+                self.consecutive_failures = 0
+
+    def record_failure(self, reason):
+        """Enregistre un échec ; ouvre le disjoncteur au-delà du seuil"""
+        with self._lock:
+            self.last_failure_reason = reason
+            if self.state != CLOSED:
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.times_opened += 1
+                logger.error(
+                    f"Disjoncteur ouvert après {self.consecutive_failures} échec(s) consécutif(s): {reason}"
+                )
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        timer = threading.Timer(self.recovery_seconds, self._probe)
+        timer.daemon = True
+        timer.start()
+
+    def _probe(self):
+        with self._lock:
+            self.state = HALF_OPEN
+            self.probes += 1
+
+        started = time.monotonic()
+        try:
+            healthy = self.probe_function()
+        except Exception as e:
+            self.last_failure_reason = f"Appel de test: {str(e)}"
+            healthy = False
+        duration = time.monotonic() - started
+
+        with self._lock:
+            if healthy and duration < self.slow_call_seconds:
+                logger.info(f"Disjoncteur refermé (appel de test réussi en {duration:.2f}s)")
+                self.state = CLOSED
+                self.consecutive_failures = 0
+                self.opened_at = None
+            else:
+                logger.warning(f"Appel de test échoué, disjoncteur maintenu ouvert {self.recovery_seconds}s")
+                self._open()
+
+    def stats(self):
+        """État du disjoncteur et compteurs pour la supervision"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'slow_call_seconds': self.slow_call_seconds,
+                'recovery_seconds': self.recovery_seconds,
+                'opened_at': datetime.fromtimestamp(self.opened_at).isoformat() if self.opened_at else None,
+                'last_failure_reason': self.last_failure_reason,
+                'times_opened': self.times_opened,
+                'short_circuited': self.short_circuited,
+                'probes': self.probes
+            }
+
+    def register_metrics(self, metrics, prefix):
+        """
+        Expose l'état du disjoncteur dans un MetricsRegistry (valeurs lues à chaque exposition)
+
+        Args:
+            metrics (MetricsRegistry): Registre de l'application
+            prefix (str): Préfixe des noms de métriques (ex: "moderation")
+        """
+        metrics.function_gauge(
+            f'{prefix}_breaker_state', "État du disjoncteur (1 pour l'état courant : closed, open, half_open)",
+            lambda: {(state,): int(self.state == state) for state in (CLOSED, OPEN, HALF_OPEN)}, ['state']
+        )
+        metrics.function_counter(
+            f'{prefix}_breaker_opened_total', "Ouvertures du disjoncteur", lambda: self.times_opened
+        )
+        metrics.function_counter(
+            f'{prefix}_breaker_short_circuited_total', "Appels non envoyés car le disjoncteur était ouvert",
+            lambda: self.short_circuited
+        )
+
+
+def create_breaker_from_env(probe_function):
+    """
+    Construit le disjoncteur à partir des variables d'environnement
+
+    MODERATION_BREAKER_FAILURES (défaut 5), MODERATION_BREAKER_SLOW_MS (défaut 2000),
+    MODERATION_BREAKER_RECOVERY_S (défaut 30)
+    """
+    return CircuitBreaker(
+        probe_function,
+        failure_threshold=int(os.getenv('MODERATION_BREAKER_FAILURES', '5')),
+        slow_call_seconds=float(os.getenv('MODERATION_BREAKER_SLOW_MS', '2000')) / 1000,
+        recovery_seconds=float(os.getenv('MODERATION_BREAKER_RECOVERY_S', '30'))
+    )
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+def batch_deadline(deadlines):
+    """Date limite d'un lot : la plus tardive de ses éléments (None si l'un d'eux n'en a pas)"""
+    if any(deadline is None for deadline in deadlines):
+        return None
+    return max(deadlines)
+
+
+class RequestCoalescer:
+    """
+    Regroupe les appels concurrents en appels par lots (micro-batching)
+
+    Les éléments soumis par différents threads sont collectés pendant une courte fenêtre
+    (ou jusqu'à max_batch_size éléments), puis transmis ensemble à batch_function.
+    Chaque appelant reçoit le résultat correspondant à son propre élément.
+    Plusieurs lots peuvent être en cours simultanément (max_concurrent_batches).
+
+    Chaque appelant peut fixer une date limite (time.monotonic()) : elle court depuis la
+    soumission, attente dans la file comprise. Passé ce délai, l'appelant reçoit
+    timeout_result(élément) sans attendre la fin du lot, et un élément encore en file
+    n'est pas envoyé.
+    """
+
+    def __init__(self, batch_function, window_seconds=0.01, max_batch_size=32, max_concurrent_batches=4,
+                 timeout_result=None):
+        """
+        Args:
+            batch_function (callable): Fonction (liste d'éléments, date limite ou None) -> liste de
+                résultats (même ordre) ; la date limite est la plus tardive des éléments du lot
+            window_seconds (float): Durée de collecte après l'arrivée du premier élément d'un lot
+            max_batch_size (int): Taille maximale d'un lot
+            max_concurrent_batches (int): Nombre de lots traités en parallèle
+            timeout_result (callable): Élément -> résultat retourné lorsque la date limite est
+                dépassée (par défaut, TimeoutError est levée)
+        """
+        self.batch_function = batch_function
+        self.timeout_result = timeout_result
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self._stats_lock = threading.Lock()
+        self._pid = None
+        self.items_submitted = 0
+        self.batches_sent = 0
+        self.items_timed_out = 0
+
+    def _ensure_started(self):
+        # Le collecteur est démarré au premier appel de chaque processus : un processus créé
+        # par fork après l'import (gunicorn --preload) n'hérite pas des threads du parent
+        with self._stats_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_batches, thread_name_prefix='coalescer'
+            )
+            self._thread = threading.Thread(target=self._collect, name='coalescer-collector', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit_many(self, items, deadline=None):
+        """Soumet plusieurs éléments et attend leurs résultats (dans le même ordre), au plus jusqu'à deadline"""
+        self._ensure_started()
+        futures = []
+        for item in items:
+            future = Future()
+            self._queue.put((item, future, deadline))
+            futures.append(future)
+
+        results = []
+        for item, future in zip(items, futures):
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                results.append(future.result(timeout=timeout))
+            except FutureTimeoutError:
+                results.append(self._timed_out(item))
+        return results
+
+    def submit(self, item, deadline=None):
+        """Soumet un élément et attend son résultat"""
+        return self.submit_many([item], deadline)[0]
+
+    def _timed_out(self, item):
+        with self._stats_lock:
+            self.items_timed_out += 1
+        if self.timeout_result is None:
+            raise TimeoutError("Date limite dépassée avant le résultat du lot regroupé")
+        return self.timeout_result(item)
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch):
+        # Les éléments dont l'appelant a déjà abandonné l'attente ne sont pas envoyés
+        now = time.monotonic()
+        batch = [entry for entry in batch if entry[2] is None or entry[2] > now]
+        if not batch:
+            return
+
+        with self._stats_lock:
+            self.items_submitted += len(batch)
+            self.batches_sent += 1
+
+        try:
+            results = self.batch_function(
+                [item for item, _, _ in batch], batch_deadline([deadline for _, _, deadline in batch])
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors du traitement d'un lot regroupé: {str(e)}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        """Nombre d'éléments, de lots envoyés et taille moyenne des lots"""
+        with self._stats_lock:
+            return {
+                'items_submitted': self.items_submitted,
+                'batches_sent': self.batches_sent,
+                'items_timed_out': self.items_timed_out,
+                'average_batch_size': self.items_submitted / self.batches_sent if self.batches_sent else 0.0,
+                'window_seconds': self.window_seconds,
+                'max_batch_size': self.max_batch_size
+            }
+
+
+class AsyncRequestCoalescer:
+    """
+    Équivalent asyncio de RequestCoalescer, pour le mode ASGI
+
+    batch_function est une coroutine (liste d'éléments, date limite ou None) -> liste de résultats.
+    Le collecteur est démarré par start() dans la boucle d'événements du serveur.
+    """
+
+    def __init__(self, batch_function, window_seconds=0.01, max_batch_size=32, max_concurrent_batches=16,
+                 timeout_result=None):
+        self.batch_function = batch_function
+        self.timeout_result = timeout_result
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._semaphore = asyncio.Semaphore(max_concurrent_batches)
+        self._queue = None
+        self._task = None
+        self._batch_tasks = set()
+        self.items_submitted = 0
+        self.batches_sent = 0
+        self.items_timed_out = 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def submit_many(self, items, deadline=None):
+        """Soumet plusieurs éléments et attend leurs résultats (dans le même ordre), au plus jusqu'à deadline"""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._queue.put_nowait((item, future, deadline))
+            futures.append(future)
+
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        await asyncio.wait(futures, timeout=timeout)
+        results = []
+        for item, future in zip(items, futures):
+            if future.done():
+                results.append(future.result())
+            else:
+                # Le lot n'enverra pas de résultat à une attente abandonnée
+                future.cancel()
+                results.append(self._timed_out(item))
+        return results
+
+    async def submit(self, item, deadline=None):
+        """Soumet un élément et attend son résultat"""
+        return (await self.submit_many([item], deadline))[0]
+
+    def _timed_out(self, item):
+        self.items_timed_out += 1
+        if self.timeout_result is None:
+            raise TimeoutError("Date limite dépassée avant le résultat du lot regroupé")
+        return self.timeout_result(item)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = loop.create_task(self._run(batch))
+            # Garder une référence pour que la tâche ne soit pas collectée avant la fin
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run(self, batch):
+        async with self._semaphore:
+            # Les éléments dont l'appelant a déjà abandonné l'attente ne sont pas envoyés
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                return
+            self.items_submitted += len(batch)
+            self.batches_sent += 1
+
+            try:
+                results = await self.batch_function(
+                    [item for item, _, _ in batch], batch_deadline([deadline for _, _, deadline in batch])
+                )
+            except Exception as e:
+                logger.error(f"Erreur lors du traitement d'un lot regroupé: {str(e)}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        """Nombre d'éléments, de lots envoyés et taille moyenne des lots"""
+        return {
+            'items_submitted': self.items_submitted,
+            'batches_sent': self.batches_sent,
+            'items_timed_out': self.items_timed_out,
+            'average_batch_size': self.items_submitted / self.batches_sent if self.batches_sent else 0.0,
+            'window_seconds': self.window_seconds,
+            'max_batch_size': self.max_batch_size
+        }
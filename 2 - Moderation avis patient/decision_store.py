@@ -0,0 +1,320 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from moderation_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Préfixe des colonnes de scores par catégorie (table SQLite et DataFrame des décisions)
+SCORE_COLUMN_PREFIX = 'score_'
+
+DECISION_COLUMNS = (
+    'created_at', 'text_hash', 'text_length', 'moderation_threshold', 'max_score',
+    'forbidden_words_count', 'proper_names_count', 'text_modified', 'moderation_details', 'flag', 'flag_reasons'
+)
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value).isoformat() if value else None
+
+
+def score_column(category):
+    """Colonne du score d'une catégorie de l'API (ex: score_violence_and_threats)"""
+    return SCORE_COLUMN_PREFIX + re.sub(r'\W', '_', category)
+
+
+class DecisionStore:
+    """
+    Historique des décisions de modération (SQLite) pour rejouer le calcul des flags
+
+    Pour chaque avis modéré sont conservés les scores par catégorie de l'API Mistral
+    (une colonne par catégorie, ajoutée à la première apparition de la catégorie), les détails de la modération et le flag attribué. Le texte de l'avis et les noms
+    propres détectés ne sont pas conservés (RGPD) : seulement une empreinte, la longueur
+    et les nombres de mots et de noms relevés, qui suffisent à recalculer le flag.
+
+    - record() ne bloque pas la requête : les décisions sont écrites par lots dans un thread
+    - frame() retourne les décisions sous forme de DataFrame (une colonne par catégorie de score),
+      relues de façon incrémentale : seules les décisions nouvelles sont lues en base
+    - Les décisions plus anciennes que retention_seconds sont supprimées
+    """
+
+    def __init__(self, db_path='moderation_decisions.db', retention_seconds=365 * 86400,
+                 max_pending=10000, write_batch_size=500, flush_timeout=2.0):
+        """
+        Args:
+            db_path (str): Chemin de la base SQLite (None pour désactiver l'historique)
+            retention_seconds (float): Durée de conservation des décisions
+            max_pending (int): Nombre maximum de décisions en attente d'écriture (au-delà, elles sont ignorées)
+            write_batch_size (int): Nombre maximum de décisions écrites par transaction
+            flush_timeout (float): Attente maximale par frame() de l'écriture des décisions en attente
+        """
+        self.db_path = db_path
+        self.retention_seconds = retention_seconds
+        self.write_batch_size = write_batch_size
+        self.flush_timeout = flush_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        # Décisions mises en file / traitées par le thread d'écriture du processus (voir flush)
+        self._progress = threading.Condition(self._lock)
+        self._enqueued = 0
+        self._processed = 0
+        self._writer_pid = None
+        self._frame_lock = threading.Lock()
+        self._frame = None
+        self._frame_last_id = 0
+        self.written = 0
+        self.dropped = 0
+
+        if db_path:
+            try:
+                db = self._connect()
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS moderation_decisions ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL, text_hash TEXT, text_length INTEGER, "
+                    "moderation_threshold REAL, max_score REAL, "
+                    "forbidden_words_count INTEGER, proper_names_count INTEGER, text_modified INTEGER, "
+                    "moderation_details TEXT, flag TEXT, flag_reasons TEXT)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS moderation_decisions_created ON moderation_decisions (created_at)")
+                db.commit()
+                db.close()
+            except sqlite3.Error as e:
+                logger.error(f"Historique des décisions de modération désactivé: {str(e)}")
+                self.db_path = None
+
+    @property
+    def enabled(self):
+        return self.db_path is not None
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+
+    def _ensure_writer(self):
+        # Thread d'écriture démarré à la première décision, dans chaque processus (fork des workers)
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                if self._writer_pid is not None:
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                    self._enqueued = self._processed = 0
+                threading.Thread(target=self._write_loop, name='decision-writer', daemon=True).start()
+                self._writer_pid = os.getpid()
+
+    def record(self, text, api_result, moderation_details, text_modified, flag, flag_reasons, moderation_threshold):
+        """Ajoute une décision à la file d'écriture (sans attendre l'écriture en base)"""
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((
+                time.time(), text, api_result, moderation_details, text_modified,
+                flag, flag_reasons, moderation_threshold
+            ))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning("File d'écriture de l'historique des décisions pleine : décision ignorée")
+            return
+        with self._lock:
+            self._enqueued += 1
+
+    def _write_loop(self):
+        db = self._connect()
+        next_purge = 0
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.write_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                rows = [self._row(*decision) for decision in batch]
+                categories = sorted({category for _, category_scores in rows for category in category_scores})
+                self._add_score_columns(db, [score_column(category) for category in categories])
+                columns = list(DECISION_COLUMNS) + [f'"{score_column(category)}"' for category in categories]
+                db.executemany(
+                    f"INSERT INTO moderation_decisions ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})",
+                    [values + tuple(category_scores.get(category) for category in categories)
+                     for values, category_scores in rows]
+                )
+                if time.time() >= next_purge:
+                    db.execute(
+                        "DELETE FROM moderation_decisions WHERE created_at < ?",
+                        (time.time() - self.retention_seconds,)
+                    )
+                    next_purge = time.time() + 3600
+                db.commit()
+                with self._lock:
+                    self.written += len(batch)
+            except Exception as e:
+                logger.error(f"Erreur d'écriture de l'historique des décisions: {str(e)}", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                with self._progress:
+                    self._processed += len(batch)
+                    self._progress.notify_all()
+
+    @staticmethod
+    def _score_columns(db):
+        return [row[1] for row in db.execute("PRAGMA table_info(moderation_decisions)")
+                if row[1].startswith(SCORE_COLUMN_PREFIX)]
+
+    def _add_score_columns(self, db, columns):
+        missing = set(columns) - set(self._score_columns(db))
+        for column in sorted(missing):
+            try:
+                db.execute(f'ALTER TABLE moderation_decisions ADD COLUMN "{column}" REAL')
+            except sqlite3.OperationalError as e:
+                # Colonne ajoutée entre-temps par un autre processus
+                if 'duplicate column' not in str(e):
+                    raise
+
+    @staticmethod
+    def _row(created_at, text, api_result, moderation_details, text_modified, flag, flag_reasons,
+             moderation_threshold):
+        results = api_result.get('results') or [{}]
+        category_scores = results[0].get('category_scores') or {}
+        forbidden_words_count = (len(moderation_details.get('forbidden_words_applied', []))
+                                 + len(moderation_details.get('mistral_api_applied', [])))
+        proper_names_count = len(moderation_details.get('proper_names_applied', []))
+        # Les noms propres et les positions masquées ne sont pas conservés
+        details = {
+            'forbidden_words_applied': moderation_details.get('forbidden_words_applied', []),
+            'mistral_api_applied': moderation_details.get('mistral_api_applied', []),
+            'proper_names_count': proper_names_count,
+            'sources': moderation_details.get('sources', [])
+        }
+        values = (
+            created_at,
+            hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest(),
+            len(text),
+            moderation_threshold,
+            max(category_scores.values()) if category_scores else None,
+            forbidden_words_count,
+            proper_names_count,
+            int(text_modified),
+            json.dumps(details, ensure_ascii=False),
+            flag,
+            json.dumps(flag_reasons, ensure_ascii=False)
+        )
+        return values, category_scores
+
+    def flush(self, timeout=None):
+        """
+        Attend l'écriture des décisions enregistrées avant l'appel, au plus timeout secondes
+
+        Les décisions enregistrées pendant l'attente ne sont pas attendues : sous un trafic
+        continu, la file n'est jamais vide.
+
+        Returns:
+            bool: Vrai si toutes ces décisions ont été écrites
+        """
+        if self._writer_pid != os.getpid():
+            return True
+        with self._progress:
+            target = self._enqueued
+            return self._progress.wait_for(lambda: self._processed >= target, timeout)
+
+    def frame(self, since=None, until=None):
+        """
+        Décisions enregistrées sous forme de DataFrame
+
+        Colonnes : id, created_at, max_score (NaN sans score API), forbidden_words_count,
+        proper_names_count, text_modified, flag, et une colonne score_<catégorie> par catégorie
+
+        Args:
+            since (float): Horodatage minimal (inclus)
+            until (float): Horodatage maximal (exclu)
+        """
+        if not self.enabled:
+            raise RuntimeError("Historique des décisions désactivé (MODERATION_DECISIONS_DB vide)")
+        # Au-delà de flush_timeout, les dernières décisions ne sont prises en compte qu'à l'appel suivant
+        self.flush(self.flush_timeout)
+
+        with self._frame_lock:
+            db = self._connect()
+            try:
+                score_columns = self._score_columns(db)
+                new_rows = pd.read_sql_query(
+                    "SELECT id, created_at, max_score, forbidden_words_count, proper_names_count, text_modified, flag"
+                    + ''.join(f', "{column}"' for column in score_columns)
+                    + " FROM moderation_decisions WHERE id > ? ORDER BY id",
+                    db, params=(self._frame_last_id,)
+                )
+            finally:
+                db.close()
+
+            # Types explicites : un résultat vide a les mêmes types qu'un résultat non vide
+            new_rows = new_rows.astype({
+                'id': 'int64', 'created_at': 'float64', 'max_score': 'float64',
+                'forbidden_words_count': 'int64', 'proper_names_count': 'int64', 'text_modified': bool, 'flag': str,
+                **{column: 'float64' for column in score_columns}
+            })
+            if len(new_rows):
+                if self._frame is None or not len(self._frame):
+                    self._frame = new_rows
+                else:
+                    self._frame = pd.concat([self._frame, new_rows], ignore_index=True)
+                self._frame_last_id = int(new_rows['id'].iloc[-1])
+
+            frame = self._frame if self._frame is not None else new_rows
+
+            # Les décisions purgées par la rétention restent en mémoire : elles sont filtrées ici
+            oldest = time.time() - self.retention_seconds
+            if len(frame) and frame['created_at'].iloc[0] < oldest:
+                self._frame = frame = frame[frame['created_at'] >= oldest].reset_index(drop=True)
+
+        mask = pd.Series(True, index=frame.index)
+        if since is not None:
+            mask &= frame['created_at'] >= since
+        if until is not None:
+            mask &= frame['created_at'] < until
+        return frame[mask] if not mask.all() else frame
+
+    def stats(self):
+        """Taille de l'historique et état de la file d'écriture"""
+        stats = {
+            'enabled': self.enabled,
+            'pending': self._queue.qsize() if self._writer_pid == os.getpid() else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+            'retention_seconds': self.retention_seconds
+        }
+        if self.enabled:
+            db = self._connect()
+            try:
+                count, oldest, newest = db.execute(
+                    "SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM moderation_decisions"
+                ).fetchone()
+            finally:
+                db.close()
+            stats.update({'decisions': count, 'oldest': _timestamp(oldest), 'newest': _timestamp(newest)})
+        return stats
+
+
+def create_decision_store_from_env():
+    """
+    Construit l'historique des décisions à partir des variables d'environnement
+
+    MODERATION_DECISIONS_DB (défaut "moderation_decisions.db", vide pour désactiver l'historique),
+    MODERATION_DECISIONS_RETENTION_DAYS (défaut 365)
+    """
+    return DecisionStore(
+        db_path=os.getenv('MODERATION_DECISIONS_DB', 'moderation_decisions.db') or None,
+        retention_seconds=float(os.getenv('MODERATION_DECISIONS_RETENTION_DAYS', '365')) * 86400
+    )
@@ -29,11 +29,41 @@ rsync -avz --progress \
     --exclude 'test_*.py' \
     --include '.gitignore' \
     --include 'app.py' \
+    --include 'lexicon.py' \
+    --include 'proper_names.py' \
+    --include 'redaction.py' \
+    --include 'moderation_cache.py' \
+    --include 'decision_store.py' \
+    --include 'coalescer.py' \
+    --include 'circuit_breaker.py' \
+    --include 'job_queue.py' \
+    --include 'lexicon_store.py' \
+    --include 'generation_counter.py' \
+    --include 'structured_logging.py' \
+    --include 'asgi_app.py' \
+    --include 'bulk_moderation.py' \
+    --include 'mistral_client.py' \
+    --include 'metrics.py' \
     --include 'streamlit_moderation.py' \
     --include 'requirements.txt' \
     --include 'mots_interdits.txt' \
     --include '*.md' \
     "$LOCAL_PATH/app.py" \
+    "$LOCAL_PATH/lexicon.py" \
+    "$LOCAL_PATH/proper_names.py" \
+    "$LOCAL_PATH/redaction.py" \
+    "$LOCAL_PATH/moderation_cache.py" \
+    "$LOCAL_PATH/decision_store.py" \
+    "$LOCAL_PATH/coalescer.py" \
+    "$LOCAL_PATH/circuit_breaker.py" \
+    "$LOCAL_PATH/job_queue.py" \
+    "$LOCAL_PATH/lexicon_store.py" \
+    "$LOCAL_PATH/generation_counter.py" \
+    "$LOCAL_PATH/structured_logging.py" \
+    "$LOCAL_PATH/asgi_app.py" \
+    "$LOCAL_PATH/bulk_moderation.py" \
+    "$LOCAL_PATH/../mistral_client.py" \
+    "$LOCAL_PATH/../metrics.py" \
     "$LOCAL_PATH/streamlit_moderation.py" \
     "$LOCAL_PATH/requirements.txt" \
     "$LOCAL_PATH/mots_interdits.txt" \
@@ -0,0 +1,98 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus (un seul processus en développement)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SLOT_FORMAT = '<Q'
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+
+
+class GenerationCounter:
+    """
+    Compteurs de génération partagés entre les processus d'un même serveur (fichier projeté en mémoire)
+
+    Chaque état partagé (dictionnaire, configuration des flags) a son compteur, incrémenté
+    par le processus qui le modifie. Les autres processus comparent à chaque requête le
+    compteur à la dernière valeur vue : une lecture en mémoire, sans accès disque, et un
+    rechargement uniquement lorsque la valeur a changé.
+
+    lock() sérialise les modifications entre processus (flock) et entre threads.
+    """
+
+    def __init__(self, path, names):
+        """
+        Args:
+            path (str): Fichier des compteurs (créé si nécessaire)
+            names (iterable): Noms des compteurs, dans un ordre fixe partagé par tous les processus
+        """
+        self.path = path
+        self.slots = {name: index * SLOT_SIZE for index, name in enumerate(names)}
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._lock_file = None
+        self._lock_pid = None
+
+        size = len(self.slots) * SLOT_SIZE
+        self._file = open(path, 'a+b')
+        with self.lock():
+            if os.fstat(self._file.fileno()).st_size < size:
+                self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def _lock_fileno(self):
+        # Un processus créé par fork après l'import (gunicorn --preload) partagerait le verrou
+        # du parent : chaque processus ouvre son propre descripteur pour flock
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self.path, 'rb')
+            self._lock_pid = os.getpid()
+        return self._lock_file.fileno()
+
+    @contextmanager
+    def lock(self):
+        """Verrou exclusif inter-processus, réentrant dans un même thread"""
+        with self._thread_lock:
+            self._depth += 1
+            if self._depth == 1 and fcntl is not None:
+                fcntl.flock(self._lock_fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_fileno(), fcntl.LOCK_UN)
+
+    def get(self, name):
+        """Valeur courante du compteur (lecture en mémoire, sans verrou)"""
+        return struct.unpack_from(SLOT_FORMAT, self._map, self.slots[name])[0]
+
+    def increment(self, name):
+        """Incrémente le compteur et retourne la nouvelle valeur"""
+        with self.lock():
+            value = self.get(name) + 1
+            struct.pack_into(SLOT_FORMAT, self._map, self.slots[name], value)
+            return value
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'generations': {name: self.get(name) for name in self.slots}
+        }
+
+
+def create_generation_counter_from_env(names):
+    """
+    Construit les compteurs partagés à partir des variables d'environnement
+
+    MODERATION_SHARED_STATE_FILE (défaut "moderation_state.bin") : tous les processus
+    du serveur doivent utiliser le même fichier
+    """
+    return GenerationCounter(os.getenv('MODERATION_SHARED_STATE_FILE', 'moderation_state.bin'), names)
@@ -0,0 +1,448 @@
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """La file d'attente a atteint son nombre maximum de tâches en attente"""
+
+
+class CallbackURLError(ValueError):
+    """L'URL de rappel n'est pas autorisée (schéma, hôte hors liste, adresse interne)"""
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value).isoformat() if value else None
+
+
+def _host_allowed(host, allowed_hosts):
+    """Hôte présent dans la liste ("exemple.fr") ou sous-domaine d'une entrée commençant par un point (".exemple.fr")"""
+    return any(host == entry or (entry.startswith('.') and host.endswith(entry)) for entry in allowed_hosts)
+
+
+def check_callback_url(callback_url, allowed_hosts=()):
+    """
+    Vérifie qu'une URL de rappel peut recevoir les résultats de modération
+
+    Avec une liste d'hôtes autorisés, seuls ces hôtes sont acceptés. Sans liste, l'hôte est
+    résolu et toute adresse de bouclage, privée, link-local (ex: 169.254.169.254), réservée
+    ou multicast est refusée : un client ne peut pas faire envoyer les avis vers le réseau interne.
+
+    Raises:
+        CallbackURLError: Si l'URL n'est pas autorisée
+    """
+    parts = urlsplit(callback_url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise CallbackURLError('Le champ "callback_url" doit être une URL http(s)')
+    host = parts.hostname.lower().rstrip('.')
+    if allowed_hosts:
+        if not _host_allowed(host, allowed_hosts):
+            raise CallbackURLError(f"Hôte de rappel non autorisé: {host}")
+        return
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 80, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise CallbackURLError(f"Hôte de rappel introuvable: {host}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise CallbackURLError(f"Adresse de rappel interne refusée: {host} ({address})")
+
+
+class JobQueue:
+    """
+    File de tâches asynchrone persistante (SQLite) traitée par un nombre borné de threads
+
+    - submit() enregistre la tâche et retourne immédiatement son identifiant
+    - Les workers prennent les tâches directement en base (la plus ancienne en attente d'abord) :
+      avec plusieurs processus (gunicorn), une tâche soumise à un processus peut être traitée par
+      n'importe quel autre, et chaque tâche n'est prise que par un seul worker
+    - Les workers exécutent handler(payload) ; le résultat est conservé en base et,
+      si une URL de rappel est fournie, envoyé en POST (JSON) à la fin du traitement
+    - Chaque processus renouvelle régulièrement le bail (heartbeat_at) des tâches qu'il exécute ;
+      une tâche "running" dont le bail a expiré (processus arrêté ou tué) est remise en attente.
+      Le démarrage ou le recyclage d'un worker ne touche pas aux tâches des autres processus.
+      Après max_attempts prises sans fin de traitement (ex: avis qui fait tomber le processus),
+      la tâche passe à l'état "failed" au lieu d'être relancée.
+    - Les tâches terminées sont supprimées après retention_seconds
+    """
+
+    def __init__(self, handler, db_path='moderation_jobs.db', workers=4, max_pending=10000,
+                 retention_seconds=7 * 86400, callback_timeout=10, callback_retries=3,
+                 lease_seconds=300, poll_interval=1.0, callback_allowed_hosts=(), max_attempts=3):
+        """
+        Args:
+            handler (callable): Fonction payload (dict) -> résultat (dict sérialisable en JSON)
+            db_path (str): Chemin de la base SQLite
+            workers (int): Nombre de tâches traitées en parallèle
+            max_pending (int): Nombre maximum de tâches en attente (au-delà, submit lève QueueFullError)
+            retention_seconds (float): Durée de conservation des tâches terminées
+            callback_timeout (float): Timeout de l'appel à l'URL de rappel
+            callback_retries (int): Nombre de nouvelles tentatives de l'appel à l'URL de rappel
+            lease_seconds (float): Durée sans renouvellement du bail après laquelle une tâche
+                                   "running" est considérée comme abandonnée et remise en attente
+            poll_interval (float): Intervalle de recherche de nouvelles tâches en base (tâches
+                                   soumises à un autre processus)
+            callback_allowed_hosts (iterable): Hôtes autorisés pour les URL de rappel (voir
+                                               check_callback_url) ; vide : tout hôte public
+            max_attempts (int): Nombre maximum de prises d'une tâche dont le bail expire
+        """
+        self.handler = handler
+        self.db_path = db_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.callback_timeout = callback_timeout
+        self.callback_retries = callback_retries
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.callback_allowed_hosts = tuple(host.lower() for host in callback_allowed_hosts)
+        self.max_attempts = max_attempts
+        self._submitted = 0
+        self._pid = None
+        self._threads = []
+        self._running_jobs = set()
+        self._wakeup = threading.Event()
+        self._callbacks = None
+
+        # Création du schéma ; chaque processus ouvre ensuite sa propre connexion (voir _connection)
+        db = sqlite3.connect(db_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT, payload TEXT, result TEXT, error TEXT, "
+            "reference TEXT, callback_url TEXT, callback_status TEXT, "
+            "created_at REAL, started_at REAL, finished_at REAL, worker TEXT, heartbeat_at REAL, "
+            "attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Bases créées avant l'ajout des baux et du nombre de tentatives
+        columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (('worker', 'TEXT'), ('heartbeat_at', 'REAL'),
+                                    ('attempts', 'INTEGER NOT NULL DEFAULT 0')):
+            if column not in columns:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        db.commit()
+        db.close()
+
+    def _connection(self):
+        """
+        Connexion SQLite du processus courant
+
+        Une connexion (et son verrou) ouverte avant un fork n'est pas réutilisée dans le processus
+        enfant (workers gunicorn) : chaque processus ouvre la sienne à sa première utilisation.
+        """
+        if self._pid != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            self._lock = threading.Lock()
+            self._db = db
+            self._threads = []
+            self._running_jobs = set()
+            self._wakeup = threading.Event()
+            self._callbacks = None
+            self._worker_id = f"{socket.gethostname()}:{os.getpid()}"
+            self._pid = os.getpid()
+        return self._db
+
+    def start(self):
+        """
+        Lance les workers du processus courant (sans effet s'ils sont déjà lancés)
+
+        Appelé par le serveur uniquement : un script qui importe l'application
+        (ex: bulk_moderation.py) ne traite pas les tâches de la file.
+        """
+        self._connection()
+        with self._lock:
+            if self._threads:
+                return
+            # Les rappels (avec nouvelles tentatives) ne bloquent pas les workers de modération
+            self._callbacks = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job-callback')
+            self._threads = [
+                threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                for index in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True))
+
+        self._purge_expired()
+        self._requeue_expired()
+        for thread in self._threads:
+            thread.start()
+
+    def _execute(self, sql, parameters=()):
+        db = self._connection()
+        with self._lock:
+            cursor = db.execute(sql, parameters)
+            db.commit()
+            return cursor
+
+    def _query(self, sql, parameters=()):
+        db = self._connection()
+        with self._lock:
+            return db.execute(sql, parameters).fetchall()
+
+    def _requeue_expired(self):
+        """
+        Remet en attente les tâches "running" dont le bail n'a pas été renouvelé (processus arrêté)
+
+        Une tâche déjà prise max_attempts fois passe à l'état "failed" (avec rappel éventuel)
+        plutôt que de faire tomber les processus indéfiniment.
+        """
+        now = time.time()
+        expired_before = now - self.lease_seconds
+        db = self._connection()
+        with self._lock:
+            abandoned = db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE status = ? AND COALESCE(heartbeat_at, started_at, 0) < ? AND attempts >= ? "
+                "RETURNING id, callback_url",
+                (FAILED, f"Traitement interrompu {self.max_attempts} fois (bail expiré) : tâche abandonnée",
+                 now, RUNNING, expired_before, self.max_attempts)
+            ).fetchall()
+            requeued = db.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, worker = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND COALESCE(heartbeat_at, started_at, 0) < ?",
+                (QUEUED, RUNNING, expired_before)
+            ).rowcount
+            db.commit()
+
+        if abandoned:
+            logger.error(f"{len(abandoned)} tâche(s) de modération abandonnée(s) après {self.max_attempts} tentatives")
+            for row in abandoned:
+                if row['callback_url'] and self._callbacks is not None:
+                    self._callbacks.submit(self._send_callback, row['id'], row['callback_url'])
+        if requeued:
+            logger.info(f"{requeued} tâche(s) de modération interrompue(s) remise(s) en attente")
+            self._wakeup.set()
+
+    def _heartbeat(self):
+        """Renouvelle le bail des tâches en cours dans ce processus et reprend les tâches abandonnées"""
+        interval = max(0.1, self.lease_seconds / 3)
+        while True:
+            time.sleep(interval)
+            try:
+                with self._lock:
+                    job_ids = list(self._running_jobs)
+                if job_ids:
+                    self._execute(
+                        f"UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker = ? "
+                        f"AND id IN ({', '.join('?' * len(job_ids))})",
+                        (time.time(), RUNNING, self._worker_id, *job_ids)
+                    )
+                self._requeue_expired()
+            except Exception as e:
+                logger.error(f"Erreur lors du renouvellement des baux des tâches: {str(e)}", exc_info=True)
+
+    def _purge_expired(self):
+        self._execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - self.retention_seconds)
+        )
+
+    def _pending_count(self):
+        return self._query("SELECT COUNT(*) AS count FROM jobs WHERE status = ?", (QUEUED,))[0]['count']
+
+    def submit(self, payload, callback_url=None, reference=None):
+        """
+        Enregistre une tâche en attente (elle sera prise par le premier worker disponible)
+
+        Args:
+            payload (dict): Données transmises au handler
+            callback_url (str): URL appelée en POST avec la tâche terminée (optionnel)
+            reference (str): Identifiant libre du client (ex: identifiant de l'avis), renvoyé tel quel
+
+        Returns:
+            str: Identifiant de la tâche
+
+        Raises:
+            QueueFullError: Si la file contient déjà max_pending tâches en attente
+            CallbackURLError: Si l'URL de rappel n'est pas autorisée
+        """
+        if callback_url:
+            check_callback_url(callback_url, self.callback_allowed_hosts)
+        if self._pending_count() >= self.max_pending:
+            raise QueueFullError(f"File de modération pleine ({self.max_pending} tâches en attente)")
+
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, status, payload, reference, callback_url, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(payload, ensure_ascii=False), reference, callback_url, time.time())
+        )
+        # Réveille les workers de ce processus ; ceux des autres processus la trouvent au prochain passage
+        self._wakeup.set()
+
+        with self._lock:
+            self._submitted += 1
+            purge = self._submitted % 1000 == 0
+        if purge:
+            self._purge_expired()
+        return job_id
+
+    def get(self, job_id):
+        """Retourne l'état d'une tâche (et son résultat si elle est terminée), ou None"""
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._job_dict(rows[0]) if rows else None
+
+    def _job_dict(self, row):
+        return {
+            'job_id': row['id'],
+            'job_status': row['status'],
+            'reference': row['reference'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'callback_url': row['callback_url'],
+            'callback_status': row['callback_status'],
+            'attempts': row['attempts'],
+            'created_at': _timestamp(row['created_at']),
+            'started_at': _timestamp(row['started_at']),
+            'finished_at': _timestamp(row['finished_at'])
+        }
+
+    def _claim(self):
+        """Passe la plus ancienne tâche en attente à l'état "running" pour ce processus ; retourne sa ligne"""
+        db = self._connection()
+        now = time.time()
+        with self._lock:
+            # Une seule instruction : SQLite sérialise les écritures, deux workers (même de processus
+            # différents) ne peuvent pas prendre la même tâche
+            row = db.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, worker = ?, attempts = attempts + 1 "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) AND status = ? "
+                "RETURNING *",
+                (RUNNING, now, now, self._worker_id, QUEUED, QUEUED)
+            ).fetchone()
+            db.commit()
+            if row is not None:
+                self._running_jobs.add(row['id'])
+            return row
+
+    def _work(self):
+        while True:
+            try:
+                row = self._claim()
+            except Exception as e:
+                logger.error(f"Erreur lors de la prise d'une tâche: {str(e)}", exc_info=True)
+                row = None
+            if row is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                self._run(row)
+            except Exception as e:
+                logger.error(f"Erreur du worker sur la tâche {row['id']}: {str(e)}", exc_info=True)
+            finally:
+                with self._lock:
+                    self._running_jobs.discard(row['id'])
+
+    def _finish(self, job_id, status, result=None, error=None):
+        """Enregistre la fin d'une tâche ; False si elle a été reprise par un autre worker entre-temps"""
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+            "WHERE id = ? AND status = ? AND worker = ?",
+            (status, result, error, time.time(), job_id, RUNNING, self._worker_id)
+        )
+        if cursor.rowcount == 0:
+            logger.warning(f"Tâche {job_id} reprise par un autre worker (bail expiré) : résultat ignoré")
+            return False
+        return True
+
+    def _run(self, row):
+        try:
+            result = self.handler(json.loads(row['payload']))
+            finished = self._finish(row['id'], DONE, result=json.dumps(result, ensure_ascii=False))
+        except Exception as e:
+            logger.error(f"Erreur lors du traitement de la tâche {row['id']}: {str(e)}", exc_info=True)
+            finished = self._finish(row['id'], FAILED, error=str(e))
+
+        if finished and row['callback_url']:
+            self._callbacks.submit(self._send_callback, row['id'], row['callback_url'])
+
+    def _send_callback(self, job_id, callback_url):
+        """Envoie la tâche terminée à l'URL de rappel, avec nouvelles tentatives"""
+        job = self.get(job_id)
+        callback_status = None
+        for attempt in range(self.callback_retries + 1):
+            try:
+                # Nouvelle vérification à l'envoi (résolution DNS modifiée depuis la soumission) ;
+                # les redirections ne sont pas suivies
+                check_callback_url(callback_url, self.callback_allowed_hosts)
+                response = requests.post(
+                    callback_url, json=job, timeout=self.callback_timeout, allow_redirects=False
+                )
+                callback_status = f"HTTP {response.status_code}"
+                if response.status_code < 500:
+                    break
+            except CallbackURLError as e:
+                callback_status = f"Erreur: {str(e)}"
+                break
+            except requests.RequestException as e:
+                callback_status = f"Erreur: {str(e)}"
+            if attempt < self.callback_retries:
+                time.sleep(2 ** attempt)
+
+        if callback_status is None or not callback_status.startswith('HTTP 2'):
+            logger.error(f"Échec du rappel {callback_url} pour la tâche {job_id}: {callback_status}")
+        self._execute("UPDATE jobs SET callback_status = ? WHERE id = ?", (callback_status, job_id))
+
+    def stats(self):
+        """Nombre de tâches par état et profondeur de la file"""
+        rows = self._query("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status")
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({row['status']: row['count'] for row in rows})
+        return {
+            'jobs': counts,
+            'queue_depth': counts[QUEUED],
+            'workers': self.workers,
+            'started': self._pid == os.getpid() and bool(self._threads),
+            'lease_seconds': self.lease_seconds,
+            'max_attempts': self.max_attempts,
+            'max_pending': self.max_pending,
+            'retention_seconds': self.retention_seconds
+        }
+
+
+def create_job_queue_from_env(handler):
+    """
+    Construit la file de tâches à partir des variables d'environnement
+
+    MODERATION_JOBS_DB (défaut "moderation_jobs.db"), MODERATION_JOBS_WORKERS (défaut 4),
+    MODERATION_JOBS_MAX_PENDING (défaut 10000), MODERATION_JOBS_RETENTION_DAYS (défaut 7),
+    MODERATION_JOBS_LEASE_SECONDS (défaut 300 : au-delà, la tâche d'un processus arrêté est relancée),
+    MODERATION_JOBS_MAX_ATTEMPTS (défaut 3 : au-delà, une tâche interrompue passe à l'état "failed"),
+    MODERATION_CALLBACK_ALLOWED_HOSTS (hôtes des URL de rappel séparés par des virgules, ".exemple.fr"
+    pour ses sous-domaines ; vide : tout hôte dont les adresses sont publiques)
+    """
+    return JobQueue(
+        handler,
+        db_path=os.getenv('MODERATION_JOBS_DB', 'moderation_jobs.db'),
+        workers=int(os.getenv('MODERATION_JOBS_WORKERS', '4')),
+        max_pending=int(os.getenv('MODERATION_JOBS_MAX_PENDING', '10000')),
+        retention_seconds=float(os.getenv('MODERATION_JOBS_RETENTION_DAYS', '7')) * 86400,
+        lease_seconds=float(os.getenv('MODERATION_JOBS_LEASE_SECONDS', '300')),
+        max_attempts=int(os.getenv('MODERATION_JOBS_MAX_ATTEMPTS', '3')),
+        callback_allowed_hosts=[
+            host.strip() for host in os.getenv('MODERATION_CALLBACK_ALLOWED_HOSTS', '').split(',') if host.strip()
+        ]
+    )
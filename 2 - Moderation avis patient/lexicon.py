@@ -0,0 +1,118 @@
+import re
+
+from redaction import redact_spans
+
+
+def _trie_pattern(words):
+    """
+    Construit une alternance regex factorisée par préfixe (trie) à partir d'une liste de mots
+
+    Exemple : ["con", "connard", "connasse"] -> "con(?:na(?:rd|sse))?"
+    Le moteur regex ne teste ainsi qu'une branche par caractère, quelle que soit la taille du lexique.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def node_pattern(node):
+        terminal = '' in node
+        alternatives = [re.escape(char) + node_pattern(child)
+                        for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
+        if len(alternatives) == 1 and not terminal:
+            return alternatives[0]
+        group = '(?:' + '|'.join(alternatives) + ')'
+        # Le "?" gourmand essaie d'abord la forme la plus longue (ex: "connard" avant "con")
+        return group + '?' if terminal else group
+
+    return node_pattern(trie)
+
+
+class LexiconMatcher:
+    """
+    Matcher compilé unique pour plusieurs lexiques de mots interdits
+
+    Chaque lexique est associé à une source (ex: 'API Mistral', 'Dictionnaire de mots interdits').
+    Un mot présent dans plusieurs lexiques est attribué à la première source active déclarée.
+    L'objet est immuable une fois construit : pour modifier le lexique, on construit un nouveau
+    matcher et on remplace la référence globale (échange atomique).
+    """
+
+    def __init__(self, lexicons):
+        """
+        Args:
+            lexicons (list): Liste ordonnée de tuples (source, mots) par ordre de priorité
+        """
+        self.sources = [source for source, _ in lexicons]
+        # mot -> liste des sources qui le contiennent, par ordre de priorité
+        self.term_sources = {}
+        for source, words in lexicons:
+            for word in words:
+                word = word.strip().lower()
+                if word:
+                    sources = self.term_sources.setdefault(word, [])
+                    if source not in sources:
+                        sources.append(source)
+        self._patterns = {}
+
+    def __len__(self):
+        return len(self.term_sources)
+
+    def _pattern_for(self, active_sources):
+        """Retourne (en le compilant au besoin) le motif couvrant les sources actives"""
+        key = frozenset(active_sources)
+        if key not in self._patterns:
+            words = [word for word, sources in self.term_sources.items()
+                     if any(source in key for source in sources)]
+            if words:
+                pattern = re.compile(r'\b(?:' + _trie_pattern(words) + r')\b', flags=re.IGNORECASE)
+            else:
+                pattern = None
+            self._patterns[key] = pattern
+        return self._patterns[key]
+
+    def compile(self, active_sources):
+        """Précompile le motif pour une combinaison de sources (appelé lors de la reconstruction)"""
+        self._pattern_for(active_sources)
+        return self
+
+    def find(self, text, active_sources):
+        """
+        Relève en une seule passe les occurrences des mots des sources actives, sans modifier le texte
+
+        Args:
+            text (str): Texte à analyser
+            active_sources (iterable): Sources à appliquer
+
+        Returns:
+            list: Occurrences (start, end, source, terme) sur le texte fourni
+        """
+        pattern = self._pattern_for(active_sources)
+        if pattern is None:
+            return []
+
+        spans = []
+        for match in pattern.finditer(text):
+            term = match.group(0).lower()
+            source = next((source for source in self.term_sources.get(term, [])
+                           if source in active_sources), None)
+            spans.append((match.start(), match.end(), source, term))
+        return spans
+
+    def redact(self, text, active_sources):
+        """
+        Masque en une seule passe tous les mots des sources actives
+
+        Args:
+            text (str): Texte à modérer
+            active_sources (iterable): Sources à appliquer
+
+        Returns:
+            tuple: (texte masqué, liste des occurrences (start, end, source, terme))
+        """
+        spans = self.find(text, active_sources)
+        return redact_spans(text, spans), spans
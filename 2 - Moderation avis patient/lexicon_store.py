@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+GENERATION_NAME = 'lexicon'
+
+
+class LexiconSnapshot:
+    """
+    Version immuable du dictionnaire de mots interdits
+
+    Contient la liste des mots (ordre du fichier), le matcher compilé correspondant et un
+    ETag calculé sur le contenu. Les représentations dérivées (ex: corps JSON de la route
+    /forbidden_words) sont calculées une seule fois par version via memo().
+    """
+
+    def __init__(self, version, words, matcher):
+        self.version = version
+        self.words = tuple(words)
+        self.word_set = frozenset(self.words)
+        self.matcher = matcher
+        self.etag = hashlib.sha256('\n'.join(self.words).encode('utf-8')).hexdigest()[:32]
+        self._memo = {}
+
+    def __contains__(self, word):
+        return word in self.word_set
+
+    def __len__(self):
+        return len(self.words)
+
+    def memo(self, key, factory):
+        """Retourne la valeur dérivée key, calculée une seule fois pour cette version"""
+        if key not in self._memo:
+            self._memo[key] = factory(self)
+        return self._memo[key]
+
+
+class LexiconStore:
+    """
+    Dictionnaire de mots interdits versionné, en copie sur écriture
+
+    - Lecture : LEXICON_STORE.snapshot retourne la version courante, immuable ; une requête
+      en cours garde sa version même si le dictionnaire est modifié entre-temps
+    - Écriture : chaque modification est ajoutée au journal (une ligne JSON, sans réécrire
+      le fichier des mots), puis une nouvelle version est construite et échangée atomiquement
+    - Compaction : toutes les compact_every modifications, le fichier des mots est réécrit
+      (fichier temporaire puis remplacement) et le journal est vidé
+    - Plusieurs processus : avec un compteur de génération partagé, chaque modification
+      incrémente le compteur ; les autres processus le voient à leur prochaine lecture et
+      rechargent le fichier des mots et le journal
+    """
+
+    def __init__(self, words_file, load_words, build_matcher, journal_file=None, compact_every=100,
+                 generation=None):
+        """
+        Args:
+            words_file (str): Fichier des mots interdits (un mot par ligne)
+            load_words (callable): Fonction sans argument retournant les mots de words_file
+            build_matcher (callable): Fonction liste de mots -> matcher compilé
+            journal_file (str): Journal des modifications (défaut : words_file + ".journal")
+            compact_every (int): Nombre de modifications journalisées avant compaction
+            generation (GenerationCounter): Compteurs partagés entre processus (optionnel)
+        """
+        self.words_file = words_file
+        self.journal_file = journal_file or words_file + '.journal'
+        self.load_words = load_words
+        self.build_matcher = build_matcher
+        self.compact_every = compact_every
+        self.generation = generation
+        self._write_lock = threading.Lock()
+        self._seen_generation = None
+        self._reloads = 0
+
+        with self._write_lock, self._shared_lock():
+            self._snapshot = self._load()
+
+    @property
+    def snapshot(self):
+        """Version courante du dictionnaire (lecture sans verrou, sauf après une modification par un autre processus)"""
+        if self.generation is not None and self.generation.get(GENERATION_NAME) != self._seen_generation:
+            self.refresh()
+        return self._snapshot
+
+    def _shared_lock(self):
+        return self.generation.lock() if self.generation is not None else nullcontext()
+
+    def _load(self):
+        """Lit le fichier des mots, rejoue le journal et construit la version correspondante"""
+        if self.generation is not None:
+            self._seen_generation = self.generation.get(GENERATION_NAME)
+        words = dict.fromkeys(self.load_words())
+        version, self._journal_entries = self._replay_journal(words)
+        return LexiconSnapshot(version, words, self.build_matcher(list(words)))
+
+    def _sync(self):
+        """Recharge le dictionnaire s'il a été modifié par un autre processus (verrous tenus)"""
+        if self.generation is not None and self.generation.get(GENERATION_NAME) != self._seen_generation:
+            self._snapshot = self._load()
+            self._reloads += 1
+            logger.info(f"Dictionnaire rechargé (version {self._snapshot.version}, modifié par un autre processus)")
+
+    def refresh(self):
+        """Prend en compte les modifications faites par les autres processus"""
+        with self._write_lock, self._shared_lock():
+            self._sync()
+
+    def _replay_journal(self, words):
+        """Applique à words les modifications journalisées depuis la dernière compaction"""
+        version = 0
+        entries = 0
+        if not os.path.exists(self.journal_file):
+            return version, entries
+
+        with open(self.journal_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dernière ligne incomplète (arrêt pendant l'écriture) : ignorée
+                    logger.warning(f"Ligne invalide ignorée dans {self.journal_file}")
+                    continue
+                self._apply(words, entry.get('add', []), entry.get('remove', []))
+                version = entry['version']
+                if not entry.get('compacted'):
+                    entries += 1
+        if entries:
+            logger.info(f"{entries} modification(s) du dictionnaire rejouée(s) depuis {self.journal_file}")
+        return version, entries
+
+    @staticmethod
+    def _apply(words, add, remove):
+        for word in remove:
+            words.pop(word, None)
+        for word in add:
+            words.setdefault(word, None)
+
+    def update(self, add=(), remove=(), replace=None):
+        """
+        Ajoute et/ou supprime des mots : une écriture dans le journal et une reconstruction du matcher,
+        quel que soit le nombre de mots
+
+        Args:
+            add (iterable): Mots à ajouter (déjà normalisés)
+            remove (iterable): Mots à supprimer (déjà normalisés)
+            replace (iterable): Nouvelle liste complète (déjà normalisée) ; remplace add et remove
+                par la différence avec la version courante
+
+        Returns:
+            tuple: (version courante (LexiconSnapshot), mots réellement ajoutés, mots réellement supprimés)
+        """
+        with self._write_lock, self._shared_lock():
+            self._sync()
+            current = self._snapshot
+            if replace is not None:
+                target = dict.fromkeys(replace)
+                add = [word for word in target if word not in current]
+                remove = [word for word in current.words if word not in target]
+            added = [word for word in dict.fromkeys(add) if word not in current]
+            removed = [word for word in dict.fromkeys(remove) if word in current and word not in added]
+            if not added and not removed:
+                return current, [], []
+
+            version = current.version + 1
+            self._append_journal({'version': version, 'add': added, 'remove': removed})
+
+            words = dict.fromkeys(current.words)
+            self._apply(words, added, removed)
+            snapshot = LexiconSnapshot(version, words, self.build_matcher(list(words)))
+            # Échange atomique : les lecteurs voient l'ancienne ou la nouvelle version, jamais un état intermédiaire
+            self._snapshot = snapshot
+            if self.generation is not None:
+                self._seen_generation = self.generation.increment(GENERATION_NAME)
+
+            self._journal_entries += 1
+            if self._journal_entries >= self.compact_every:
+                self._compact(snapshot)
+            return snapshot, added, removed
+
+    def add(self, word):
+        return self.update(add=[word])
+
+    def remove(self, word):
+        return self.update(remove=[word])
+
+    def _append_journal(self, entry):
+        with open(self.journal_file, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _compact(self, snapshot):
+        """Réécrit le fichier des mots à partir de la version courante et vide le journal"""
+        try:
+            temporary_file = self.words_file + '.tmp'
+            with open(temporary_file, 'w', encoding='utf-8') as file:
+                for word in snapshot.words:
+                    file.write(f"{word}\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_file, self.words_file)
+
+            # Le journal ne conserve que le numéro de version ; rejouer un journal non vidé
+            # sur le fichier déjà réécrit donnerait le même résultat
+            temporary_journal = self.journal_file + '.tmp'
+            with open(temporary_journal, 'w', encoding='utf-8') as file:
+                file.write(json.dumps({'version': snapshot.version, 'compacted': True}) + '\n')
+            os.replace(temporary_journal, self.journal_file)
+            self._journal_entries = 0
+            logger.info(f"Dictionnaire compacté dans {self.words_file} (version {snapshot.version})")
+        except OSError as e:
+            logger.error(f"Erreur lors de la compaction du dictionnaire: {str(e)}")
+
+    def compact(self):
+        """Force une compaction (ex: avant un déploiement)"""
+        with self._write_lock, self._shared_lock():
+            self._sync()
+            self._compact(self._snapshot)
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            'version': snapshot.version,
+            'etag': snapshot.etag,
+            'word_count': len(snapshot),
+            'journal_entries': self._journal_entries,
+            'compact_every': self.compact_every,
+            'reloads': self._reloads
+        }
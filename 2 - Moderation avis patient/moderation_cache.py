@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Normalise un texte avant hachage (forme Unicode NFC, espaces fusionnés)"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def cache_key(text, model):
+    """Clé de cache : empreinte SHA-256 du modèle et du texte normalisé"""
+    return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+
+class ModerationCache:
+    """
+    Cache des résultats de l'API de modération
+
+    - Niveau mémoire : LRU borné avec durée de vie (TTL)
+    - Niveau persistant optionnel : base SQLite, conservée entre les redémarrages ;
+      les entrées expirées en sont supprimées toutes les purge_interval secondes
+
+    Seuls les scores bruts de l'API sont conservés : la décision de modération et le flag
+    sont recalculés à chaque requête avec le seuil et la configuration en vigueur.
+
+    Le LRU et la base ont chacun leur verrou : une lecture en mémoire n'attend jamais
+    une écriture sur disque.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=86400, db_path=None, purge_interval=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.purge_interval = purge_interval
+        self._entries = OrderedDict()  # clé -> (expire_at, résultat JSON)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._locks_pid = os.getpid()
+        self._db = None
+        self._pid = None
+        self._next_purge = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self.purged_entries = 0
+
+        if db_path:
+            # Création du schéma ; chaque processus ouvre ensuite sa propre connexion (voir _connection)
+            try:
+                db = sqlite3.connect(db_path)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS moderation_cache ("
+                    "key TEXT PRIMARY KEY, model TEXT, result TEXT, created_at REAL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS moderation_cache_created_at ON moderation_cache (created_at)")
+                db.commit()
+                db.close()
+            except sqlite3.Error as e:
+                logger.error(f"Cache de modération persistant désactivé: {str(e)}")
+                self.db_path = None
+
+    def _connection(self):
+        """
+        Connexion SQLite du processus courant (None sans niveau persistant)
+
+        Une connexion ouverte avant un fork n'est pas réutilisée dans le processus enfant
+        (workers gunicorn) : chaque processus ouvre la sienne à sa première utilisation.
+        À appeler sous self._db_lock.
+        """
+        if self.db_path is None:
+            return None
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._db
+
+    def _check_process(self):
+        # Verrous éventuellement pris par un autre thread au moment d'un fork : recréés dans l'enfant
+        if self._locks_pid != os.getpid():
+            self._lock = threading.Lock()
+            self._db_lock = threading.Lock()
+            self._locks_pid = os.getpid()
+
+    def get(self, text, model):
+        """Retourne le résultat API en cache pour ce texte, ou None"""
+        self._check_process()
+        key = cache_key(text, model)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expire_at, result = entry
+                if expire_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(result)
+                del self._entries[key]
+
+        row = None
+        with self._db_lock:
+            db = self._connection()
+            if db is not None:
+                try:
+                    row = db.execute(
+                        "SELECT result, created_at FROM moderation_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.error(f"Erreur de lecture du cache de modération: {str(e)}")
+
+        with self._lock:
+            if row is not None and row[1] + self.ttl_seconds > now:
+                self._store(key, row[0], row[1] + self.ttl_seconds)
+                self.hits += 1
+                self.persistent_hits += 1
+                return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def set(self, text, model, result):
+        """Enregistre le résultat API d'un texte dans les deux niveaux de cache"""
+        self._check_process()
+        key = cache_key(text, model)
+        now = time.time()
+        serialized = json.dumps(result, ensure_ascii=False)
+
+        with self._lock:
+            self._store(key, serialized, now + self.ttl_seconds)
+
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO moderation_cache (key, model, result, created_at) VALUES (?, ?, ?, ?)",
+                    (key, model, serialized, now)
+                )
+                db.commit()
+                if now >= self._next_purge:
+                    self._next_purge = now + self.purge_interval
+                    self._purge_expired(db, now)
+            except sqlite3.Error as e:
+                logger.error(f"Erreur d'écriture du cache de modération: {str(e)}")
+
+    def _purge_expired(self, db, now):
+        """Supprime de la base les entrées expirées, par paquets pour ne pas bloquer les autres processus"""
+        purged = 0
+        while True:
+            deleted = db.execute(
+                "DELETE FROM moderation_cache WHERE key IN ("
+                "SELECT key FROM moderation_cache WHERE created_at < ? LIMIT 10000)",
+                (now - self.ttl_seconds,)
+            ).rowcount
+            db.commit()
+            purged += deleted
+            if deleted < 10000:
+                break
+        if purged:
+            self.purged_entries += purged
+            logger.info(f"Cache de modération : {purged} entrée(s) expirée(s) supprimée(s)")
+
+    def _store(self, key, serialized, expire_at):
+        self._entries[key] = (expire_at, serialized)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Vide les deux niveaux de cache (les compteurs sont conservés)"""
+        self._check_process()
+        with self._lock:
+            self._entries.clear()
+        with self._db_lock:
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM moderation_cache")
+                db.commit()
+
+    def stats(self):
+        """Compteurs de succès/échecs du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'persistent_hits': self.persistent_hits,
+                'purged_entries': self.purged_entries,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'persistent': self.db_path is not None
+            }
+
+
+def create_cache_from_env():
+    """
+    Construit le cache à partir des variables d'environnement
+
+    MODERATION_CACHE_SIZE (défaut 10000), MODERATION_CACHE_TTL en secondes (défaut 86400),
+    MODERATION_CACHE_DB (défaut "moderation_cache.db", vide pour désactiver la persistance),
+    MODERATION_CACHE_PURGE_INTERVAL en secondes (défaut 3600)
+    """
+    return ModerationCache(
+        max_entries=int(os.getenv('MODERATION_CACHE_SIZE', '10000')),
+        ttl_seconds=float(os.getenv('MODERATION_CACHE_TTL', '86400')),
+        db_path=os.getenv('MODERATION_CACHE_DB', 'moderation_cache.db') or None,
+        purge_interval=float(os.getenv('MODERATION_CACHE_PURGE_INTERVAL', '3600'))
+    )
@@ -0,0 +1,128 @@
+import re
+
+# Détection des noms propres (améliorée)
+# Pour une détection plus précise, un modèle NLP serait nécessaire
+TITLES = [
+    # Titres médicaux et académiques
+    "Dr", "Docteur", "Pr", "Professeur", "Prof",
+    # Titres professionnels médicaux
+    "Médecin", "Infirmier", "Infirmière", "Chirurgien", "Chirurgienne",
+    "Pharmacien", "Pharmacienne", "Kinésithérapeute", "Kiné",
+    "Aide-soignant", "Aide-soignante", "Sage-femme", "Sage femme",
+    # Civilités complètes
+    "Monsieur", "Madame", "Mademoiselle",
+    # Civilités abrégées avec et sans point
+    "M\\.?", "Mr\\.?", "Mme\\.?", "Mlle\\.?", "Me\\.?",
+    # Autres titres professionnels
+    "Maître", "Maitre", "Directeur", "Directrice",
+    "Responsable", "Chef"
+]
+
+# Nom suivant un titre : mot commençant par une lettre (avec support des traits d'union)
+# Avec re.IGNORECASE, cette classe couvre aussi les noms tout en majuscules
+NAME_PATTERN = "[A-Z][a-zéèêëàâäôöûüç-]+"
+
+# Texte de remplacement d'un nom détecté
+NAME_REPLACEMENT = "*****"
+
+
+def _title_regex(title):
+    """Les titres contenant "\\.?" sont déjà des regex, les autres sont échappés"""
+    return title if "\\.?" in title else re.escape(title)
+
+
+class ProperNameDetector:
+    """
+    Détecteur de noms propres (RGPD) compilé une seule fois à partir de la liste des titres
+
+    Une seule regex parcourt le texte pour repérer les positions où un titre est suivi d'un
+    espace ; à ces positions seulement, une seconde regex relève les (titre, nom) candidats
+    de chaque titre. La résolution reproduit ensuite en mémoire le traitement historique
+    titre par titre : un nom déjà masqué par un titre précédent (ou un titre masqué en tant
+    que nom) n'est plus détecté, et les détections d'un même titre ne se chevauchent pas.
+    """
+
+    def __init__(self, titles=TITLES):
+        self.titles = list(titles)
+        title_regexes = [_title_regex(title) for title in self.titles]
+
+        # Positions où commence un titre suivi d'un espace
+        self._scan = re.compile(
+            r'\b(?=(?:' + '|'.join(title_regexes) + r')\s)',
+            flags=re.IGNORECASE
+        )
+        # Un groupe optionnel (titre + espaces, nom) par titre, évalué à une position donnée
+        self._candidates = re.compile(
+            ''.join(f'(?:(?=({title}\\s+)({NAME_PATTERN})))?' for title in title_regexes),
+            flags=re.IGNORECASE
+        )
+
+    def _find_candidates(self, text):
+        """Retourne, pour chaque titre, la liste ordonnée des (début, fin du titre, fin du nom)"""
+        candidates = [[] for _ in self.titles]
+        for scan_match in self._scan.finditer(text):
+            match = self._candidates.match(text, scan_match.start())
+            for index in range(len(self.titles)):
+                title_group = 2 * index + 1
+                if match.group(title_group) is not None:
+                    candidates[index].append(
+                        (match.start(title_group), match.end(title_group), match.end(title_group + 1))
+                    )
+        return candidates
+
+    def find(self, text, masked_spans=()):
+        """
+        Détecte les noms propres précédés d'un titre
+
+        Args:
+            text (str): Texte à analyser
+            masked_spans (iterable): Étendues (start, end, ...) déjà masquées par une étape précédente ;
+                                     un titre ou une initiale de nom qu'elles recouvrent n'est pas détecté
+
+        Returns:
+            list: Occurrences (start, end, nom détecté) où [start, end) est l'étendue du nom
+                  et "nom détecté" le titre suivi du nom, dans l'ordre de la liste des titres
+        """
+        masked = []  # Étendues des noms déjà masqués (start, end)
+        excluded = [(span[0], span[1]) for span in masked_spans]
+        spans = []
+
+        def overlaps(start, end, ranges):
+            return any(start < range_end and range_start < end for range_start, range_end in ranges)
+
+        def overlaps_masked(start, end):
+            return overlaps(start, end, masked)
+
+        for title_candidates in self._find_candidates(text):
+            # Les noms d'un même titre ne sont masqués qu'une fois toutes ses détections faites
+            title_spans = []
+            last_end = 0
+            for start, name_start, name_end in title_candidates:
+                if start < last_end or overlaps_masked(start, name_end) or overlaps(start, name_start + 1, excluded):
+                    continue
+                title_spans.append((name_start, name_end, text[start:name_end]))
+                last_end = name_end
+            masked.extend((name_start, name_end) for name_start, name_end, _ in title_spans)
+            spans.extend(title_spans)
+
+        return spans
+
+    def redact(self, text):
+        """
+        Masque les noms propres détectés
+
+        Returns:
+            tuple: (texte masqué, liste des noms détectés au format "Titre Nom")
+        """
+        spans = self.find(text)
+        if not spans:
+            return text, []
+
+        parts = []
+        position = 0
+        for start, end, _ in sorted(spans):
+            parts.append(text[position:start])
+            parts.append(NAME_REPLACEMENT)
+            position = end
+        parts.append(text[position:])
+        return ''.join(parts), [detected for _, _, detected in spans]
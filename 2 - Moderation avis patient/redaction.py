@@ -0,0 +1,50 @@
+def merge_spans(spans):
+    """
+    Fusionne les étendues qui se chevauchent
+
+    Args:
+        spans (list): Étendues (start, end, source, terme) relevées sur le texte original
+
+    Returns:
+        list: Groupes triés (start, end, étendues du groupe) ne se chevauchant pas
+    """
+    groups = []
+    for span in sorted(spans, key=lambda span: (span[0], span[1])):
+        start, end = span[0], span[1]
+        if groups and start < groups[-1][1]:
+            group_start, group_end, group_spans = groups[-1]
+            group_spans.append(span)
+            groups[-1] = (group_start, max(group_end, end), group_spans)
+        else:
+            groups.append((start, end, [span]))
+    return groups
+
+
+def redact_spans(text, spans, replacements=None):
+    """
+    Applique toutes les redactions en une seule passe sur le texte original
+
+    Chaque groupe d'étendues fusionnées est remplacé par des astérisques de même longueur,
+    sauf si l'une de ses sources a un texte de remplacement fixe (ex: noms propres -> "*****").
+
+    Args:
+        text (str): Texte original
+        spans (list): Étendues (start, end, source, terme)
+        replacements (dict): Texte de remplacement fixe par source
+
+    Returns:
+        str: Texte masqué
+    """
+    if not spans:
+        return text
+
+    replacements = replacements or {}
+    parts = []
+    position = 0
+    for start, end, group_spans in merge_spans(spans):
+        replacement = next((replacements[source] for _, _, source, _ in group_spans if source in replacements), None)
+        parts.append(text[position:start])
+        parts.append(replacement if replacement is not None else "*" * (end - start))
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
@@ -3,6 +3,7 @@
 # Script de redémarrage des services de modération
 # À exécuter sur le serveur après déploiement
 # Usage: ./restart_services.sh
+#        SERVER_MODE=asgi ./restart_services.sh   (mode asynchrone avec uvicorn)
 
 echo "🔄 Redémarrage des services de modération..."
 echo ""
@@ -11,6 +12,8 @@ echo ""
 APP_DIR="/var/www/surpriz.io/Hospitalidee/moderation_2"
 STREAMLIT_PORT="8503"
 API_PORT="5004"
+# Mode de service de l'API : "flask" (par défaut) ou "asgi" (uvicorn, appels API non bloquants)
+SERVER_MODE="${SERVER_MODE:-flask}"
 
 # Aller dans le dossier de l'application
 cd "$APP_DIR" || exit 1
@@ -39,6 +42,7 @@ echo ""
 # Arrêter les anciens processus
 echo "🛑 Arrêt des services existants..."
 pkill -f "python.*app.py" 2>/dev/null && echo "   - API Flask arrêtée" || echo "   - API Flask n'était pas en cours d'exécution"
+pkill -f "uvicorn.*asgi_app" 2>/dev/null && echo "   - API ASGI arrêtée" || true
 pkill -f "streamlit.*streamlit_moderation.py" 2>/dev/null && echo "   - Streamlit arrêté" || echo "   - Streamlit n'était pas en cours d'exécution"
 
 # Attendre un peu pour s'assurer que les ports sont libérés
@@ -47,9 +51,14 @@ sleep 2
 echo ""
 echo "🚀 Démarrage des nouveaux services..."
 
-# Démarrer l'API Flask
-echo "   - Démarrage de l'API Flask sur le port $API_PORT..."
-nohup python app.py > api.log 2>&1 &
+# Démarrer l'API (Flask ou ASGI)
+if [ "$SERVER_MODE" = "asgi" ]; then
+    echo "   - Démarrage de l'API ASGI (uvicorn) sur le port $API_PORT..."
+    nohup uvicorn asgi_app:app --host 0.0.0.0 --port $API_PORT > api.log 2>&1 &
+else
+    echo "   - Démarrage de l'API Flask sur le port $API_PORT..."
+    nohup python app.py > api.log 2>&1 &
+fi
 API_PID=$!
 echo "     PID: $API_PID"
 
@@ -98,4 +107,5 @@ echo "   - Streamlit : tail -f $APP_DIR/streamlit.log"
 echo ""
 echo "💡 Pour arrêter les services :"
 echo "   pkill -f 'python.*app.py'"
+echo "   pkill -f 'uvicorn.*asgi_app'"
 echo "   pkill -f 'streamlit.*streamlit_moderation.py'"
\ No newline at end of file
@@ -4,6 +4,7 @@ import json
 import os
 from dotenv import load_dotenv
 import pandas as pd
+import io
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -17,11 +18,58 @@ st.set_page_config(
 
 # Définition des variables globales
 API_URL = "http://localhost:5004"  # URL de l'API de modération
+# Nombre d'avis par requête /moderate_batch dans l'onglet de modération en masse
+BULK_CHUNK_SIZE = 200
+# Nombre de lignes affichées par page dans le tableau des résultats
+BULK_PAGE_SIZES = [25, 50, 100, 250]
+
+# Durée pendant laquelle les versions du dictionnaire et de la configuration sont réutilisées
+# sans interroger l'API (les modifications faites depuis cette interface sont visibles immédiatement)
+VERSIONS_TTL_SECONDS = 5
+
+# Session HTTP unique (connexions réutilisées), partagée par toutes les exécutions du script
+@st.cache_resource
+def get_http_session():
+    return requests.Session()
+
+# Versions courantes du dictionnaire et de la configuration des flags (réponse légère, mise en cache quelques secondes)
+@st.cache_data(ttl=VERSIONS_TTL_SECONDS, show_spinner=False)
+def fetch_versions():
+    response = get_http_session().get(f"{API_URL}/versions", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+# Liste des mots interdits, téléchargée une seule fois par version du dictionnaire
+@st.cache_data(max_entries=4, show_spinner=False)
+def fetch_forbidden_words(lexicon_etag):
+    response = get_http_session().get(f"{API_URL}/forbidden_words", timeout=10)
+    response.raise_for_status()
+    return response.json().get('forbidden_words', {})
+
+# Configuration des flags, téléchargée une seule fois par version
+@st.cache_data(max_entries=4, show_spinner=False)
+def fetch_flag_config(flag_config_etag):
+    response = get_http_session().get(f"{API_URL}/get_flag_config", timeout=10)
+    response.raise_for_status()
+    return response.json().get('flag_config', {})
+
+# Export complet du dictionnaire, téléchargé une seule fois par version
+@st.cache_data(max_entries=2, show_spinner=False)
+def fetch_forbidden_words_export(lexicon_etag, export_format):
+    response = get_http_session().get(
+        f"{API_URL}/forbidden_words/export", params={"format": export_format}, timeout=60
+    )
+    response.raise_for_status()
+    return response.content
+
+def invalidate_versions():
+    """Force la lecture des versions à la prochaine exécution (après une modification)"""
+    fetch_versions.clear()
 
 # Fonction pour appeler l'API de modération
 def moderate_text(text, threshold=0.5):
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{API_URL}/moderate",
             json={"text": text, "moderation_threshold": threshold},
             timeout=10
@@ -36,16 +84,59 @@ def moderate_text(text, threshold=0.5):
         st.error(f"Erreur lors de l'appel à l'API: {str(e)}")
         return None
 
+# Fonction pour modérer une liste d'avis en un seul appel (traitement par lot côté serveur)
+def moderate_texts_batch(texts, threshold=0.5):
+    response = get_http_session().post(
+        f"{API_URL}/moderate_batch",
+        json={"texts": texts, "moderation_threshold": threshold, "priority": "bulk"},
+        timeout=300
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Erreur API ({response.status_code}): {response.text[:200]}")
+    return response.json()['results']
+
+# Fonction pour lire un fichier d'avis importé (CSV ou Excel)
+def read_reviews_file(uploaded_file):
+    if uploaded_file.name.lower().endswith('.xlsx'):
+        return pd.read_excel(uploaded_file)
+    return pd.read_csv(uploaded_file, sep=None, engine='python')
+
+# Fichiers d'export des résultats (CSV et Parquet), calculés une seule fois par traitement
+def build_bulk_exports(results_df):
+    parquet_buffer = io.BytesIO()
+    results_df.to_parquet(parquet_buffer, index=False)
+    return {
+        'csv': results_df.to_csv(index=False).encode('utf-8-sig'),
+        'parquet': parquet_buffer.getvalue()
+    }
+
+# Ligne du tableau des résultats pour un avis modéré
+def bulk_result_row(result):
+    category_scores = {}
+    api_results = result.get('api_result', {}).get('results') or []
+    if api_results:
+        category_scores = api_results[0].get('category_scores') or {}
+    return {
+        'Flag': result.get('flag'),
+        'Avis modéré': result.get('moderated_text'),
+        'Modifié': result.get('is_moderated'),
+        'Raisons': " ; ".join(result.get('flag_reasons', [])),
+        'Sources': ", ".join(result.get('moderation_details', {}).get('sources', [])),
+        'Score API max': max(category_scores.values()) if category_scores else None
+    }
+
 # Fonction pour ajouter un mot au dictionnaire des mots interdits
 def add_forbidden_word(word):
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{API_URL}/add_forbidden_word",
             json={"word": word},
             timeout=10
         )
         
         if response.status_code == 200:
+            # Nouvelle version : la liste ou la configuration sera rechargée à la prochaine exécution
+            invalidate_versions()
             return response.json()
         else:
             st.error(f"Erreur API ({response.status_code}): {response.text}")
@@ -54,16 +145,46 @@ def add_forbidden_word(word):
         st.error(f"Erreur lors de l'ajout du mot interdit: {str(e)}")
         return None
 
+# Fonction pour ajouter, supprimer ou remplacer une liste de mots en une seule requête
+def bulk_update_forbidden_words(mode, words=None, uploaded_file=None):
+    try:
+        if uploaded_file is not None:
+            response = get_http_session().post(
+                f"{API_URL}/forbidden_words/bulk",
+                data={"mode": mode},
+                files={"file": (uploaded_file.name, uploaded_file.getvalue())},
+                timeout=120
+            )
+        else:
+            response = get_http_session().post(
+                f"{API_URL}/forbidden_words/bulk",
+                json={"mode": mode, "words": words},
+                timeout=120
+            )
+        
+        if response.status_code == 200:
+            # Nouvelle version : la liste sera rechargée à la prochaine exécution
+            invalidate_versions()
+            return response.json()
+        else:
+            st.error(f"Erreur API ({response.status_code}): {response.text}")
+            return None
+    except Exception as e:
+        st.error(f"Erreur lors de la mise à jour en masse des mots interdits: {str(e)}")
+        return None
+
 # Fonction pour supprimer un mot du dictionnaire des mots interdits
 def remove_forbidden_word(word):
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{API_URL}/remove_forbidden_word",
             json={"word": word},
             timeout=10
         )
         
         if response.status_code == 200:
+            # Nouvelle version : la liste ou la configuration sera rechargée à la prochaine exécution
+            invalidate_versions()
             return response.json()
         else:
             st.error(f"Erreur API ({response.status_code}): {response.text}")
@@ -75,16 +196,8 @@ def remove_forbidden_word(word):
 # Fonction pour récupérer la configuration des flags
 def get_flag_config():
     try:
-        response = requests.get(
-            f"{API_URL}/get_flag_config",
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            return response.json().get('flag_config', {})
-        else:
-            st.error(f"Erreur API ({response.status_code}): {response.text}")
-            return {}
+        # Nouvelle requête uniquement si la configuration a changé côté serveur
+        return fetch_flag_config(fetch_versions()['flag_config']['etag'])
     except Exception as e:
         st.error(f"Erreur lors de la récupération de la configuration des flags: {str(e)}")
         return {}
@@ -92,13 +205,15 @@ def get_flag_config():
 # Fonction pour mettre à jour la configuration des flags
 def update_flag_config(config):
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{API_URL}/update_flag_config",
             json={"flag_config": config},
             timeout=10
         )
         
         if response.status_code == 200:
+            # Nouvelle version : la liste ou la configuration sera rechargée à la prochaine exécution
+            invalidate_versions()
             return response.json()
         else:
             st.error(f"Erreur API ({response.status_code}): {response.text}")
@@ -107,19 +222,29 @@ def update_flag_config(config):
         st.error(f"Erreur lors de la mise à jour de la configuration des flags: {str(e)}")
         return None
 
-# Fonction pour récupérer la liste des mots interdits
-def get_forbidden_words():
+# Fonction pour simuler une configuration des flags sur l'historique des décisions
+def simulate_flag_config(config):
     try:
-        response = requests.get(
-            f"{API_URL}/forbidden_words",
-            timeout=10
+        response = get_http_session().post(
+            f"{API_URL}/what_if_flag_config",
+            json={"flag_config": config},
+            timeout=60
         )
         
         if response.status_code == 200:
-            return response.json().get('forbidden_words', {})
+            return response.json()
         else:
             st.error(f"Erreur API ({response.status_code}): {response.text}")
-            return {}
+            return None
+    except Exception as e:
+        st.error(f"Erreur lors de la simulation de la configuration des flags: {str(e)}")
+        return None
+
+# Fonction pour récupérer la liste des mots interdits
+def get_forbidden_words():
+    try:
+        # Nouvelle requête uniquement si le dictionnaire a changé côté serveur
+        return fetch_forbidden_words(fetch_versions()['lexicon']['etag'])
     except Exception as e:
         st.error(f"Erreur lors de la récupération des mots interdits: {str(e)}")
         return {}
@@ -148,7 +273,9 @@ with col_update:
 st.markdown("---")
 
 # Créer des onglets pour organiser l'interface
-tab1, tab2, tab3 = st.tabs(["🔍 Test de modération", "📋 Gestion des mots", "⚙️ Configuration des flags"])
+tab1, tab2, tab3, tab4 = st.tabs([
+    "🔍 Test de modération", "📋 Gestion des mots", "⚙️ Configuration des flags", "📤 Modération en masse"
+])
 
 with tab1:
 
@@ -317,14 +444,11 @@ with tab1:
                             st.write("")  # Espacement
                             if st.button("➕ Ajouter", key="quick_add_btn", help="Ajouter les mots sélectionnés à la liste des mots interdits"):
                                 if selected_words:
-                                    success_count = 0
-                                    for word in selected_words:
-                                        add_result = add_forbidden_word(word)
-                                        if add_result and add_result.get('status') in ['success', 'warning']:
-                                            success_count += 1
+                                    # Tous les mots en une seule requête (une seule reconstruction du dictionnaire)
+                                    add_result = bulk_update_forbidden_words('add', words=selected_words)
                                     
-                                    if success_count > 0:
-                                        st.success(f"✅ {success_count} mot(s) ajouté(s) avec succès !")
+                                    if add_result and add_result.get('status') == 'success':
+                                        st.success(f"✅ {add_result['added']} mot(s) ajouté(s) avec succès !")
                                         st.rerun()
                                     else:
                                         st.error("❌ Échec de l'ajout des mots.")
@@ -419,6 +543,61 @@ with tab2:
                 st.rerun()
             else:
                 st.error("Échec de l'ajout du mot interdit.")
+    
+    # Import et export de listes complètes (ex: listes d'argot régional)
+    st.subheader("Import / export en masse")
+    
+    # Résultat du dernier import, affiché après le rechargement de la liste
+    if 'bulk_words_message' in st.session_state:
+        st.success(st.session_state.pop('bulk_words_message'))
+    
+    bulk_modes = {
+        'add': "➕ Ajouter les mots du fichier",
+        'remove': "➖ Supprimer les mots du fichier",
+        'replace': "🔄 Remplacer tout le dictionnaire par le fichier"
+    }
+    
+    with st.form("bulk_words_form", clear_on_submit=True):
+        words_file = st.file_uploader(
+            "Fichier de mots (texte : un mot par ligne, ou CSV : première colonne)",
+            type=['txt', 'csv']
+        )
+        bulk_mode = st.radio("Opération", options=list(bulk_modes), format_func=bulk_modes.get, horizontal=True)
+        bulk_submitted = st.form_submit_button("Importer")
+        
+        if bulk_submitted and words_file is not None:
+            result = bulk_update_forbidden_words(bulk_mode, uploaded_file=words_file)
+            if result and result.get('status') == 'success':
+                message = (
+                    f"✅ {result['added']} mot(s) ajouté(s), {result['removed']} supprimé(s), "
+                    f"{result['unchanged']} inchangé(s) — {result['word_count']} mots dans le dictionnaire"
+                )
+                if result.get('invalid_count'):
+                    message += f" ({result['invalid_count']} entrée(s) de plus de 100 caractères ignorée(s))"
+                st.session_state['bulk_words_message'] = message
+                st.rerun()
+            else:
+                st.error("Échec de l'import.")
+    
+    try:
+        lexicon_etag = fetch_versions()['lexicon']['etag']
+        col_export_txt, col_export_csv = st.columns(2)
+        with col_export_txt:
+            st.download_button(
+                "⬇️ Exporter (texte)",
+                data=fetch_forbidden_words_export(lexicon_etag, 'txt'),
+                file_name="mots_interdits.txt",
+                mime="text/plain"
+            )
+        with col_export_csv:
+            st.download_button(
+                "⬇️ Exporter (CSV)",
+                data=fetch_forbidden_words_export(lexicon_etag, 'csv'),
+                file_name="mots_interdits.csv",
+                mime="text/csv"
+            )
+    except Exception as e:
+        st.error(f"Erreur lors de l'export des mots interdits: {str(e)}")
 
 with tab3:
     st.header("⚙️ Configuration des flags RED/GREEN")
@@ -506,17 +685,70 @@ with tab3:
                 st.markdown("• Score API Mistral faible")
                 st.markdown("• Pas de contenu problématique détecté")
             
-            # Bouton de sauvegarde
-            submitted = st.form_submit_button("💾 Sauvegarder la configuration", type="primary")
+            # Boutons de simulation et de sauvegarde
+            col_simulate, col_save = st.columns(2)
+            with col_simulate:
+                simulated = st.form_submit_button("🔮 Simuler sur l'historique")
+            with col_save:
+                submitted = st.form_submit_button("💾 Sauvegarder la configuration", type="primary")
             
-            if submitted:
-                new_config = {
-                    'mistral_api_score_threshold': api_threshold,
-                    'forbidden_words_trigger_red': forbidden_words_trigger,
-                    'proper_names_trigger_red': proper_names_trigger,
-                    'text_modification_trigger_red': text_modification_trigger
-                }
+            new_config = {
+                'mistral_api_score_threshold': api_threshold,
+                'forbidden_words_trigger_red': forbidden_words_trigger,
+                'proper_names_trigger_red': proper_names_trigger,
+                'text_modification_trigger_red': text_modification_trigger
+            }
+            
+            if simulated:
+                # Flags recalculés sur les avis déjà modérés, sans nouvel appel à l'API Mistral
+                with st.spinner("Simulation en cours..."):
+                    simulation = simulate_flag_config(new_config)
                 
+                if simulation and simulation.get('status') == 'success':
+                    if simulation['total'] == 0:
+                        st.info("Aucune décision enregistrée pour le moment : modérez des avis pour alimenter l'historique.")
+                    else:
+                        current, candidate = simulation['current'], simulation['candidate']
+                        st.markdown(f"**Simulation sur {simulation['total']} avis déjà modérés**")
+                        
+                        sim_col1, sim_col2, sim_col3 = st.columns(3)
+                        with sim_col1:
+                            st.metric(
+                                "🔴 FLAG RED",
+                                f"{candidate['RED']} ({candidate['red_ratio']:.1%})",
+                                delta=candidate['RED'] - current['RED'],
+                                delta_color="inverse"
+                            )
+                        with sim_col2:
+                            st.metric(
+                                "🟢 FLAG GREEN",
+                                f"{candidate['GREEN']} ({1 - candidate['red_ratio']:.1%})",
+                                delta=candidate['GREEN'] - current['GREEN']
+                            )
+                        with sim_col3:
+                            st.metric("🔁 Avis changeant de flag", simulation['changes']['green_to_red'] + simulation['changes']['red_to_green'])
+                        
+                        st.markdown(
+                            f"GREEN → RED : **{simulation['changes']['green_to_red']}** avis — "
+                            f"RED → GREEN : **{simulation['changes']['red_to_green']}** avis "
+                            f"(par rapport à la configuration actuelle)"
+                        )
+                        
+                        reason_labels = {
+                            'api_score': "Score API Mistral",
+                            'forbidden_words': "Mots interdits",
+                            'proper_names': "Noms propres",
+                            'text_modified': "Texte modifié"
+                        }
+                        st.dataframe(
+                            pd.DataFrame(
+                                [(reason_labels.get(code, code), count) for code, count in simulation['candidate_reasons'].items()],
+                                columns=["Condition RED", "Avis concernés"]
+                            ),
+                            hide_index=True
+                        )
+            
+            if submitted:
                 result = update_flag_config(new_config)
                 if result and result.get('status') in ['success', 'warning']:
                     st.success("✅ Configuration sauvegardée avec succès !")
@@ -553,6 +785,135 @@ with tab3:
     else:
         st.error("Impossible de récupérer la configuration actuelle des flags.")
 
+with tab4:
+    st.header("📤 Modération en masse (CSV / Excel)")
+    
+    st.info(
+        f"""
+        Importez un fichier d'avis (CSV ou Excel) : les avis sont envoyés au serveur par lots de
+        {BULK_CHUNK_SIZE} (`/moderate_batch`), et non un par un. Les résultats restent sur le serveur
+        Streamlit : seule la page affichée est envoyée au navigateur, l'export complet se fait par téléchargement.
+        """
+    )
+    
+    uploaded_file = st.file_uploader("Fichier d'avis", type=['csv', 'xlsx'])
+    
+    if uploaded_file is not None:
+        try:
+            reviews_df = read_reviews_file(uploaded_file)
+        except Exception as e:
+            reviews_df = None
+            st.error(f"Impossible de lire le fichier : {str(e)}")
+        
+        if reviews_df is not None and not reviews_df.empty:
+            st.markdown(f"**{len(reviews_df)} lignes**, colonnes : {', '.join(map(str, reviews_df.columns))}")
+            
+            columns = list(reviews_df.columns)
+            col_text, col_id, col_threshold = st.columns(3)
+            with col_text:
+                text_column = st.selectbox("Colonne de l'avis", options=columns)
+            with col_id:
+                id_column = st.selectbox("Colonne identifiant (optionnelle)", options=columns, index=None,
+                                         placeholder="Aucune")
+            with col_threshold:
+                bulk_threshold = st.slider("Seuil de modération", min_value=0.1, max_value=1.0, value=0.5,
+                                           step=0.1, key="bulk_threshold")
+            
+            if st.button("🚀 Lancer la modération", type="primary", key="bulk_start"):
+                texts = reviews_df[text_column].fillna('').astype(str).tolist()
+                rows = [None] * len(texts)
+                # Les avis vides ne sont pas envoyés au serveur
+                pending = [index for index, text in enumerate(texts) if text.strip()]
+                for index in set(range(len(texts))) - set(pending):
+                    rows[index] = {'Flag': 'VIDE', 'Avis modéré': '', 'Modifié': False,
+                                   'Raisons': "Avis vide", 'Sources': '', 'Score API max': None}
+                
+                progress = st.progress(0.0, text="Modération en cours...")
+                failed_chunks = 0
+                for chunk_start in range(0, len(pending), BULK_CHUNK_SIZE):
+                    chunk = pending[chunk_start:chunk_start + BULK_CHUNK_SIZE]
+                    try:
+                        results = moderate_texts_batch([texts[index] for index in chunk], bulk_threshold)
+                        for index, result in zip(chunk, results):
+                            rows[index] = bulk_result_row(result)
+                    except Exception as e:
+                        failed_chunks += 1
+                        for index in chunk:
+                            rows[index] = {'Flag': 'ERREUR', 'Avis modéré': '', 'Modifié': False,
+                                           'Raisons': str(e), 'Sources': '', 'Score API max': None}
+                    done = min(chunk_start + BULK_CHUNK_SIZE, len(pending))
+                    progress.progress(done / len(pending), text=f"{done} / {len(pending)} avis modérés")
+                progress.empty()
+                
+                results_df = pd.DataFrame(rows)
+                if id_column is not None:
+                    results_df.insert(0, 'Identifiant', reviews_df[id_column].values)
+                results_df.insert(1 if id_column is not None else 0, 'Avis original', texts)
+                
+                st.session_state['bulk_results'] = results_df
+                st.session_state['bulk_exports'] = build_bulk_exports(results_df)
+                st.session_state['bulk_source'] = uploaded_file.name
+                st.session_state['bulk_page'] = 1
+                if failed_chunks:
+                    st.warning(f"{failed_chunks} lot(s) en erreur : les avis concernés ont le flag ERREUR.")
+        elif reviews_df is not None:
+            st.warning("Le fichier ne contient aucune ligne.")
+    
+    results_df = st.session_state.get('bulk_results')
+    if results_df is not None:
+        st.markdown("---")
+        st.subheader(f"📊 Résultats — {st.session_state.get('bulk_source', '')}")
+        
+        flag_counts = results_df['Flag'].value_counts()
+        total = len(results_df)
+        col_red, col_green, col_other = st.columns(3)
+        with col_red:
+            red_count = int(flag_counts.get('RED', 0))
+            st.metric("🔴 FLAG RED", red_count, f"{red_count / total:.1%}", delta_color="off")
+        with col_green:
+            green_count = int(flag_counts.get('GREEN', 0))
+            st.metric("🟢 FLAG GREEN", green_count, f"{green_count / total:.1%}", delta_color="off")
+        with col_other:
+            st.metric("⚪ Vides / erreurs", total - red_count - green_count)
+        
+        # Filtre et pagination : seule la page courante est envoyée au navigateur
+        col_filter, col_page_size, col_page = st.columns(3)
+        with col_filter:
+            flag_filter = st.multiselect("Flags affichés", options=sorted(flag_counts.index), default=None,
+                                         placeholder="Tous")
+        filtered_df = results_df[results_df['Flag'].isin(flag_filter)] if flag_filter else results_df
+        with col_page_size:
+            page_size = st.selectbox("Lignes par page", options=BULK_PAGE_SIZES, index=1)
+        page_count = max(1, -(-len(filtered_df) // page_size))
+        with col_page:
+            page = st.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count,
+                                   value=min(st.session_state.get('bulk_page', 1), page_count), step=1)
+            st.session_state['bulk_page'] = page
+        
+        page_start = (page - 1) * page_size
+        st.dataframe(filtered_df.iloc[page_start:page_start + page_size], use_container_width=True)
+        st.caption(f"Lignes {page_start + 1 if len(filtered_df) else 0} à "
+                   f"{min(page_start + page_size, len(filtered_df))} sur {len(filtered_df)}")
+        
+        # Export de l'ensemble des résultats (y compris les lignes non affichées)
+        export_name = os.path.splitext(st.session_state.get('bulk_source', 'avis'))[0] + "_moderation"
+        exports = st.session_state['bulk_exports']
+        col_csv, col_parquet = st.columns(2)
+        with col_csv:
+            st.download_button(
+                "⬇️ Télécharger en CSV",
+                data=exports['csv'],
+                file_name=f"{export_name}.csv",
+                mime="text/csv"
+            )
+        with col_parquet:
+            st.download_button(
+                "⬇️ Télécharger en Parquet",
+                data=exports['parquet'],
+                file_name=f"{export_name}.parquet",
+                mime="application/octet-stream"
+            )
+
 # Pied de page
 st.markdown("---")
 st.markdown("**Application de modération** - Développée pour la modération automatique d'avis clients")
\ No newline at end of file
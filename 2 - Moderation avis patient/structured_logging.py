@@ -0,0 +1,289 @@
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus (un seul processus en développement)
+    fcntl = None
+
+# Champs ajoutés aux enregistrements via extra={...}
+REVIEW_TEXT_FIELDS = ('review_text',)
+PAYLOAD_FIELDS = ('review_text', 'api_response')
+
+# Attributs standard d'un LogRecord (tout le reste provient de extra={...})
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formate chaque enregistrement en une ligne JSON
+
+    Les champs passés via extra={...} sont ajoutés à l'enregistrement. Les champs
+    volumineux (texte de l'avis, réponse de l'API) peuvent être :
+    - échantillonnés : conservés seulement pour une fraction payload_sample_rate des enregistrements
+    - tronqués : chaînes limitées à max_field_chars caractères
+    - supprimés : le texte brut de l'avis n'est jamais écrit si drop_review_text est vrai
+    """
+
+    def __init__(self, payload_sample_rate=1.0, max_field_chars=2000, drop_review_text=False):
+        super().__init__()
+        self.payload_sample_rate = payload_sample_rate
+        self.max_field_chars = max_field_chars
+        self.drop_review_text = drop_review_text
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': self.truncate(record.getMessage())
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+
+        keep_payload = self.payload_sample_rate >= 1 or random.random() < self.payload_sample_rate
+        for key, value in vars(record).items():
+            if key in STANDARD_ATTRIBUTES or key.startswith('_'):
+                continue
+            if key in REVIEW_TEXT_FIELDS and self.drop_review_text:
+                continue
+            if key in PAYLOAD_FIELDS and not keep_payload:
+                entry[f'{key}_sampled_out'] = True
+                continue
+            entry[key] = self.truncate_value(value)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+    def truncate(self, text):
+        if self.max_field_chars and len(text) > self.max_field_chars:
+            return text[:self.max_field_chars] + f"... [{len(text) - self.max_field_chars} caractères tronqués]"
+        return text
+
+    def truncate_value(self, value):
+        if isinstance(value, str):
+            return self.truncate(value)
+        if isinstance(value, (dict, list)):
+            serialized = json.dumps(value, ensure_ascii=False, default=str)
+            if self.max_field_chars and len(serialized) > self.max_field_chars:
+                return self.truncate(serialized)
+        return value
+
+
+def gzip_namer(name):
+    return name + '.gz'
+
+
+def gzip_rotator(source, destination):
+    """Compresse le fichier sorti de la rotation puis le supprime"""
+    with open(source, 'rb') as source_file, gzip.open(destination, 'wb') as destination_file:
+        shutil.copyfileobj(source_file, destination_file)
+    os.remove(source)
+
+
+def claim_log_file(path):
+    """
+    Réserve à ce processus l'écriture et la rotation de path (verrou exclusif sur path + '.lock')
+
+    Returns:
+        Fichier de verrou, à garder ouvert tant que le processus écrit dans path,
+        ou None si un autre processus écrit déjà dans path
+    """
+    lock_file = open(path + '.lock', 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+    return lock_file
+
+
+def process_log_path(path):
+    """Fichier de log propre au processus courant : moderation.log -> moderation.<pid>.log"""
+    base, extension = os.path.splitext(path)
+    return f'{base}.{os.getpid()}{extension}'
+
+
+def build_file_handler(path, rotation='size', max_bytes=10 * 1024 * 1024, when='midnight', backup_count=10,
+                       compress=True):
+    """
+    Construit le gestionnaire du fichier de log avec rotation
+
+    La rotation dans le processus ("size", "time") n'est sûre que si un seul processus écrit
+    dans le fichier : le premier processus qui le réserve écrit dans path, les autres (workers
+    gunicorn/uvicorn) écrivent chacun dans leur propre fichier (process_log_path). Avec
+    "external", tous les processus écrivent dans path, dont la rotation est faite par un
+    outil externe (logrotate) : le fichier est rouvert lorsqu'il a été déplacé.
+
+    Args:
+        path (str): Fichier de log
+        rotation (str): "size" (au-delà de max_bytes), "time" (selon when, ex: "midnight", "H")
+            ou "external" (logrotate)
+        max_bytes (int): Taille maximale du fichier avant rotation
+        when (str): Intervalle de rotation (TimedRotatingFileHandler)
+        backup_count (int): Nombre de fichiers conservés après rotation
+        compress (bool): Compresser (gzip) les fichiers sortis de la rotation
+    """
+    if rotation == 'external':
+        return logging.handlers.WatchedFileHandler(path, encoding='utf-8')
+
+    lock_file = claim_log_file(path)
+    if lock_file is None:
+        path = process_log_path(path)
+        lock_file = claim_log_file(path)
+
+    if rotation == 'time':
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=backup_count, encoding='utf-8'
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+    if compress:
+        handler.namer = gzip_namer
+        handler.rotator = gzip_rotator
+    # Le verrou reste pris tant que le gestionnaire existe
+    handler.lock_file = lock_file
+    return handler
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener dont l'arrêt attend une place dans la file bornée au lieu d'échouer"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Dépose les enregistrements dans une file bornée, vidée par un thread d'écriture (QueueListener)
+
+    Les enregistrements ne sont pas formatés : le message est calculé et la trace d'exception
+    mise en texte, les champs extra={...} sont conservés tels quels pour le formatage JSON
+    dans le thread d'écriture.
+
+    Les gestionnaires de sortie et le thread d'écriture sont créés au premier enregistrement
+    de chaque processus : un processus créé par fork après l'import (gunicorn --preload)
+    n'hérite pas du thread du parent. Lorsque la file est pleine (disque trop lent),
+    l'enregistrement est abandonné et compté dans dropped_records.
+    """
+
+    def __init__(self, build_handlers, max_queue_size=10000):
+        """
+        Args:
+            build_handlers (callable): Retourne la liste des gestionnaires de sortie du processus
+            max_queue_size (int): Nombre maximum d'enregistrements en attente d'écriture
+        """
+        super().__init__(None)
+        self.build_handlers = build_handlers
+        self.max_queue_size = max_queue_size
+        self.listener = None
+        self.dropped_records = 0
+        self._pid = None
+
+    def _ensure_started(self):
+        # Appelé sous le verrou du gestionnaire (Handler.handle), réinitialisé après un fork
+        if self._pid == os.getpid():
+            return
+        self.queue = queue.Queue(self.max_queue_size)
+        self.listener = DrainingQueueListener(self.queue, *self.build_handlers(), respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def emit(self, record):
+        self._ensure_started()
+        super().emit(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1
+
+    def stop(self):
+        """Arrête le thread d'écriture de ce processus après avoir vidé la file"""
+        if self._pid == os.getpid() and self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(build_handlers, level=logging.INFO, max_queue_size=10000):
+    """
+    Installe un QueueHandler sur le logger racine : les requêtes déposent les enregistrements
+    dans une file bornée en mémoire, un thread par processus (QueueListener) les formate et les écrit
+
+    Args:
+        build_handlers (callable): Retourne les gestionnaires de sortie, appelé une fois par processus
+
+    Returns:
+        StructuredQueueHandler: Gestionnaire installé (thread d'écriture arrêté, et la file vidée,
+        à la sortie du processus)
+    """
+    queue_handler = StructuredQueueHandler(build_handlers, max_queue_size)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    atexit.register(queue_handler.stop)
+    return queue_handler
+
+
+def configure_logging_from_env(default_file='moderation.log'):
+    """
+    Configure le logging à partir des variables d'environnement
+
+    LOG_FILE (défaut default_file), LOG_LEVEL (défaut INFO),
+    LOG_ROTATION ("size", "time" ou "external", défaut "size"), LOG_MAX_BYTES (défaut 10 Mo),
+    LOG_ROTATION_WHEN (défaut "midnight"), LOG_BACKUP_COUNT (défaut 10), LOG_COMPRESS (défaut true),
+    LOG_PAYLOAD_SAMPLE_RATE (défaut 1.0), LOG_MAX_FIELD_CHARS (défaut 2000),
+    LOG_DROP_REVIEW_TEXT (défaut false), LOG_QUEUE_SIZE (défaut 10000)
+    """
+    def build_handlers():
+        file_handler = build_file_handler(
+            os.getenv('LOG_FILE', default_file),
+            rotation=os.getenv('LOG_ROTATION', 'size'),
+            max_bytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+            when=os.getenv('LOG_ROTATION_WHEN', 'midnight'),
+            backup_count=int(os.getenv('LOG_BACKUP_COUNT', '10')),
+            compress=os.getenv('LOG_COMPRESS', 'true').lower() == 'true'
+        )
+        file_handler.setFormatter(JsonFormatter(
+            payload_sample_rate=float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '1.0')),
+            max_field_chars=int(os.getenv('LOG_MAX_FIELD_CHARS', '2000')),
+            drop_review_text=os.getenv('LOG_DROP_REVIEW_TEXT', 'false').lower() == 'true'
+        ))
+
+        # La console garde le format lisible ; les champs structurés ne sont écrits que dans le fichier
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        return [file_handler, stream_handler]
+
+    return configure_logging(
+        build_handlers,
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        max_queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    )
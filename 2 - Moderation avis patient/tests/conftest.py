@@ -0,0 +1,31 @@
+# Les modules du service de modération sont importés directement (comme par app.py)
+import os
+import shutil
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+
+@pytest.fixture(scope='session')
+def moderation_service(tmp_path_factory):
+    """
+    Module app.py importé dans un dossier temporaire (copie du dictionnaire et de la
+    configuration des flags) : bases, journaux et fichiers d'état ne touchent pas au dépôt
+    """
+    directory = tmp_path_factory.mktemp('service')
+    for name in ('mots_interdits.txt', 'flag_config.json'):
+        shutil.copy(os.path.join(SERVICE_DIR, name), directory)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(directory)
+        patch.setenv('MISTRAL_API_KEY', 'test')
+        patch.setenv('LOG_FILE', str(directory / 'moderation.log'))
+        patch.setenv('MODERATION_CACHE_DB', '')
+        patch.setenv('MODERATION_DECISIONS_DB', '')
+        patch.setenv('MODERATION_JOBS_DB', str(directory / 'moderation_jobs.db'))
+        patch.setenv('MODERATION_SHARED_STATE_FILE', str(directory / 'moderation_state.bin'))
+        import app
+        yield app
@@ -0,0 +1,161 @@
+"""Non-régression du regroupement des appels concurrents en lots (coalescer.py)"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from coalescer import AsyncRequestCoalescer, RequestCoalescer, batch_deadline
+
+
+def upper_batch(items, deadline):
+    return [item.upper() for item in items]
+
+
+def test_batch_deadline_is_latest_deadline_or_none():
+    assert batch_deadline([1.0, 3.0, 2.0]) == 3.0
+    assert batch_deadline([1.0, None]) is None
+
+
+def test_results_follow_each_caller_items_order():
+    batches = []
+
+    def record_batch(items, deadline):
+        batches.append(list(items))
+        return upper_batch(items, deadline)
+
+    coalescer = RequestCoalescer(record_batch, window_seconds=0.05, max_batch_size=64)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def caller(index):
+        items = [f'avis {index}-{rank}' for rank in range(5)]
+        barrier.wait()
+        results[index] = (items, coalescer.submit_many(items))
+
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    for items, caller_results in results.values():
+        assert caller_results == [item.upper() for item in items]
+    # Les appels concurrents ont bien été regroupés
+    assert len(results) == 8 and len(batches) < 8
+    assert coalescer.stats()['items_submitted'] == 40
+
+
+def test_max_batch_size_splits_batches():
+    sizes = []
+
+    def record_size(items, deadline):
+        sizes.append(len(items))
+        return upper_batch(items, deadline)
+
+    coalescer = RequestCoalescer(record_size, window_seconds=0.05, max_batch_size=3)
+    assert coalescer.submit_many(['a', 'b', 'c', 'd', 'e']) == ['A', 'B', 'C', 'D', 'E']
+    assert max(sizes) <= 3 and sum(sizes) == 5
+
+
+def test_batch_exception_is_raised_to_every_caller_of_the_batch():
+    def failing_batch(items, deadline):
+        raise ValueError('API indisponible')
+
+    coalescer = RequestCoalescer(failing_batch, window_seconds=0.05)
+    errors = []
+    barrier = threading.Barrier(3)
+
+    def caller(item):
+        barrier.wait()
+        try:
+            coalescer.submit(item)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=caller, args=(item,)) for item in 'abc']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert errors == ['API indisponible'] * 3
+
+
+def test_deadline_returns_timeout_result_without_waiting_for_batch():
+    release = threading.Event()
+
+    def slow_batch(items, deadline):
+        release.wait(5)
+        return upper_batch(items, deadline)
+
+    coalescer = RequestCoalescer(slow_batch, window_seconds=0.0, timeout_result=lambda item: f'délai {item}')
+    start = time.monotonic()
+    assert coalescer.submit_many(['a', 'b'], deadline=time.monotonic() + 0.1) == ['délai a', 'délai b']
+    assert time.monotonic() - start < 1.0
+    release.set()
+    assert coalescer.stats()['items_timed_out'] == 2
+
+
+def test_deadline_without_timeout_result_raises():
+    coalescer = RequestCoalescer(lambda items, deadline: time.sleep(0.5) or upper_batch(items, deadline),
+                                 window_seconds=0.0)
+    with pytest.raises(TimeoutError):
+        coalescer.submit('a', deadline=time.monotonic() + 0.05)
+
+
+def test_expired_items_are_not_sent_and_batch_receives_deadline():
+    calls = []
+
+    def record_batch(items, deadline):
+        calls.append((list(items), deadline))
+        return upper_batch(items, deadline)
+
+    coalescer = RequestCoalescer(record_batch, window_seconds=0.0, max_concurrent_batches=1,
+                                 timeout_result=lambda item: None)
+    # Élément déjà expiré à la soumission : jamais transmis à batch_function
+    assert coalescer.submit('expiré', deadline=time.monotonic() - 1) is None
+    deadline = time.monotonic() + 5
+    assert coalescer.submit('a', deadline=deadline) == 'A'
+    assert calls == [(['a'], deadline)]
+
+
+def test_async_results_follow_each_caller_items_order():
+    async def async_upper_batch(items, deadline):
+        return upper_batch(items, deadline)
+
+    async def scenario():
+        coalescer = AsyncRequestCoalescer(async_upper_batch, window_seconds=0.05)
+        coalescer.start()
+        calls = [[f'avis {index}-{rank}' for rank in range(4)] for index in range(6)]
+        results = await asyncio.gather(*(coalescer.submit_many(items) for items in calls))
+        await coalescer.stop()
+        return calls, results, coalescer.stats()
+
+    calls, results, stats = asyncio.run(scenario())
+    assert results == [[item.upper() for item in items] for items in calls]
+    assert stats['items_submitted'] == 24 and stats['batches_sent'] == 1
+
+
+def test_async_batch_exception_and_deadline():
+    async def failing_batch(items, deadline):
+        raise ValueError('API indisponible')
+
+    async def slow_batch(items, deadline):
+        await asyncio.sleep(1)
+        return upper_batch(items, deadline)
+
+    async def scenario():
+        failing = AsyncRequestCoalescer(failing_batch, window_seconds=0.01)
+        slow = AsyncRequestCoalescer(slow_batch, window_seconds=0.0, timeout_result=lambda item: f'délai {item}')
+        failing.start()
+        slow.start()
+        errors = await asyncio.gather(failing.submit('a'), failing.submit('b'), return_exceptions=True)
+        timed_out = await slow.submit('c', deadline=time.monotonic() + 0.05)
+        await failing.stop()
+        await slow.stop()
+        return errors, timed_out, slow.stats()
+
+    errors, timed_out, stats = asyncio.run(scenario())
+    assert [str(error) for error in errors] == ['API indisponible'] * 2
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert timed_out == 'délai c' and stats['items_timed_out'] == 1
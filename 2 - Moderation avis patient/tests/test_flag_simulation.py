@@ -0,0 +1,67 @@
+"""Parité entre determine_flag et sa version vectorisée sur l'historique des décisions (decision_store.py)"""
+import pytest
+
+from decision_store import DecisionStore
+
+CONFIGS = [
+    {},
+    {'mistral_api_score_threshold': 0.7},
+    {'mistral_api_score_threshold': 0.0},
+    {'mistral_api_score_threshold': 1.0},
+    {'forbidden_words_trigger_red': False},
+    {'proper_names_trigger_red': False, 'text_modification_trigger_red': False},
+    {'mistral_api_score_threshold': 0.5, 'forbidden_words_trigger_red': False,
+     'proper_names_trigger_red': False, 'text_modification_trigger_red': False}
+]
+
+# (api_result, moderation_details, texte original, texte modéré)
+CASES = [
+    ({'results': [{'category_scores': {'violence': 0.1, 'sexual': 0.05}}]}, {}, 'Très bon accueil', 'Très bon accueil'),
+    # Score exactement au seuil : le seuil est inclus
+    ({'results': [{'category_scores': {'violence': 0.7, 'sexual': 0.2}}]}, {}, 'Un avis', 'Un avis'),
+    ({'results': [{'category_scores': {'hate': 0.3}}]}, {}, 'Un avis', 'Un avis'),
+    ({'results': [{'category_scores': {'hate': 0.95, 'pii': 0.5}}]}, {}, 'Un avis', 'Un avis'),
+    ({'results': [{'category_scores': {'violence': 0.2}}]},
+     {'forbidden_words_applied': ['nul']}, 'Service nul', 'Service ***'),
+    ({'results': [{'category_scores': {'violence': 0.2}}]},
+     {'mistral_api_applied': ['con']}, 'Quel con', 'Quel ***'),
+    ({'results': [{'category_scores': {'violence': 0.4}}]},
+     {'proper_names_applied': [{'original': 'Dr Martin'}]}, 'Le Dr Martin', 'Le Dr *****'),
+    # Erreur de l'API : pas de score
+    ({'error': 'Erreur API: 503'}, {'forbidden_words_applied': ['nul']}, 'nul', '***'),
+    ({'error': 'API Mistral indisponible (disjoncteur ouvert)'}, {}, 'Un avis', 'Un avis'),
+    ({'results': [{'category_scores': {}}]}, {}, 'Un avis', 'Un avis'),
+    ({'results': [{'category_scores': {'violence': 0.69999}}]}, {}, 'Un avis', 'Un avis')
+]
+
+
+@pytest.fixture(scope='module')
+def decisions(moderation_service, tmp_path_factory):
+    """Décisions enregistrées (flags selon la configuration par défaut) puis relues en DataFrame"""
+    store = DecisionStore(str(tmp_path_factory.mktemp('decisions') / 'decisions.db'))
+    for api_result, details, original, moderated in CASES:
+        flag, reasons = moderation_service.determine_flag(api_result, details, original, moderated, {})
+        store.record(original, api_result, details, original != moderated, flag, reasons, 0.5)
+    assert store.flush(timeout=10)
+    return store.frame()
+
+
+@pytest.mark.parametrize('flag_config', CONFIGS)
+def test_vectorized_flags_match_determine_flag(moderation_service, decisions, flag_config):
+    red, triggers = moderation_service.determine_flags_vectorized(decisions, flag_config)
+    assert len(red) == len(CASES)
+    for index, (api_result, details, original, moderated) in enumerate(CASES):
+        flag, reasons = moderation_service.determine_flag(api_result, details, original, moderated, flag_config)
+        assert bool(red[index]) == (flag == 'RED'), (index, flag_config)
+        codes = {moderation_service.flag_reason_code(reason) for reason in reasons} - {'none'}
+        assert {code for code, trigger in triggers.items() if trigger[index]} == codes, (index, flag_config)
+
+
+def test_recorded_flags_match_default_config(moderation_service, decisions):
+    red, _ = moderation_service.determine_flags_vectorized(decisions, {})
+    assert list(red) == list(decisions['flag'] == 'RED')
+
+
+def test_empty_history_gives_empty_flags(moderation_service, decisions):
+    red, triggers = moderation_service.determine_flags_vectorized(decisions.iloc[0:0], {})
+    assert len(red) == 0 and all(len(trigger) == 0 for trigger in triggers.values())
@@ -0,0 +1,64 @@
+"""Non-régression des compteurs de génération partagés entre processus (generation_counter.py)"""
+import multiprocessing
+import os
+
+from generation_counter import GenerationCounter, SLOT_SIZE
+
+NAMES = ['lexicon', 'flags']
+
+
+def increment_many(counter, name, count):
+    for _ in range(count):
+        counter.increment(name)
+
+
+def open_and_increment(path, name, count):
+    increment_many(GenerationCounter(path, NAMES), name, count)
+
+
+def test_counters_start_at_zero_and_increment_independently(tmp_path):
+    counter = GenerationCounter(str(tmp_path / 'state.bin'), NAMES)
+    assert counter.stats()['generations'] == {'lexicon': 0, 'flags': 0}
+    assert counter.increment('lexicon') == 1
+    assert counter.increment('lexicon') == 2
+    assert (counter.get('lexicon'), counter.get('flags')) == (2, 0)
+    assert os.path.getsize(tmp_path / 'state.bin') == len(NAMES) * SLOT_SIZE
+
+
+def test_increment_is_seen_by_second_counter_on_same_file(tmp_path):
+    first = GenerationCounter(str(tmp_path / 'state.bin'), NAMES)
+    second = GenerationCounter(str(tmp_path / 'state.bin'), NAMES)
+    first.increment('flags')
+    assert second.get('flags') == 1
+    assert second.increment('flags') == 2
+    assert first.get('flags') == 2
+
+
+def test_values_survive_reopening_the_file(tmp_path):
+    GenerationCounter(str(tmp_path / 'state.bin'), NAMES).increment('lexicon')
+    assert GenerationCounter(str(tmp_path / 'state.bin'), NAMES).get('lexicon') == 1
+
+
+def test_increment_in_other_process_is_seen_without_reopening(tmp_path):
+    counter = GenerationCounter(str(tmp_path / 'state.bin'), NAMES)
+    process = multiprocessing.get_context('spawn').Process(
+        target=open_and_increment, args=(str(tmp_path / 'state.bin'), 'lexicon', 3))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+    assert counter.get('lexicon') == 3
+
+
+def test_concurrent_increments_from_forked_processes_are_not_lost(tmp_path):
+    # Compteur créé avant le fork, comme avec gunicorn --preload : chaque processus prend son propre verrou
+    counter = GenerationCounter(str(tmp_path / 'state.bin'), NAMES)
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=increment_many, args=(counter, 'lexicon', 200)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    increment_many(counter, 'lexicon', 200)
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+    assert counter.get('lexicon') == 1000
+    assert counter.get('flags') == 0
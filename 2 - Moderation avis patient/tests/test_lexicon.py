@@ -0,0 +1,86 @@
+"""Non-régression du matcher compilé des mots interdits (lexicon.py)"""
+import re
+
+from lexicon import LexiconMatcher, _trie_pattern
+
+API = 'API Mistral'
+DICTIONARY = 'Dictionnaire de mots interdits'
+
+
+def make_matcher():
+    return LexiconMatcher([
+        (API, ['con', 'connard', 'trou', 'trou du cul']),
+        (DICTIONARY, ['connard', 'nul', 'Incompétent '])
+    ])
+
+
+def test_trie_pattern_factorizes_prefixes():
+    assert _trie_pattern(['con', 'connard', 'connasse']) == 'con(?:na(?:rd|sse))?'
+
+
+def test_trie_pattern_matches_exactly_the_words():
+    words = ['con', 'connard', 'connasse', 'nul', 'nulle', 'trou du cul']
+    pattern = re.compile(r'\b(?:' + _trie_pattern(words) + r')\b')
+    for word in words:
+        assert pattern.fullmatch(word)
+    for other in ['conn', 'connar', 'nu', 'trou du']:
+        assert not pattern.fullmatch(other)
+
+
+def test_find_returns_spans_on_original_text():
+    text = 'Quel connard, vraiment nul.'
+    assert make_matcher().find(text, [API, DICTIONARY]) == [
+        (5, 12, API, 'connard'),
+        (23, 26, DICTIONARY, 'nul')
+    ]
+
+
+def test_find_prefers_longest_word_at_same_position():
+    # "connard" et non "con", "trou du cul" et non "trou"
+    matcher = make_matcher()
+    assert matcher.find('connard', [API]) == [(0, 7, API, 'connard')]
+    assert matcher.find('Un TROU du cul', [API]) == [(3, 14, API, 'trou du cul')]
+    assert matcher.find('trou du', [API]) == [(0, 4, API, 'trou')]
+
+
+def test_find_leftmost_match_wins_over_overlapping_phrase():
+    matcher = LexiconMatcher([(DICTIONARY, ['du cul', 'trou du'])])
+    assert matcher.find('trou du cul', [DICTIONARY]) == [(0, 7, DICTIONARY, 'trou du')]
+
+
+def test_find_respects_word_boundaries():
+    matcher = make_matcher()
+    assert matcher.find('connards et déconnecté', [API, DICTIONARY]) == []
+    assert matcher.find('M. Jean-con', [API]) == [(8, 11, API, 'con')]
+
+
+def test_find_is_case_insensitive_and_reports_lowercase_term():
+    assert make_matcher().find('CON, NUL.', [API, DICTIONARY]) == [
+        (0, 3, API, 'con'),
+        (5, 8, DICTIONARY, 'nul')
+    ]
+
+
+def test_find_only_uses_active_sources():
+    matcher = make_matcher()
+    assert matcher.find('con et connard', [DICTIONARY]) == [(7, 14, DICTIONARY, 'connard')]
+    assert matcher.find('con et connard', []) == []
+
+
+def test_word_in_several_lexicons_is_attributed_to_first_active_source():
+    matcher = make_matcher()
+    assert matcher.find('connard', [API, DICTIONARY])[0][2] == API
+    assert matcher.find('connard', [DICTIONARY])[0][2] == DICTIONARY
+
+
+def test_words_are_normalized():
+    matcher = make_matcher()
+    assert 'incompétent' in matcher.term_sources
+    assert matcher.find('Incompétent', [DICTIONARY]) == [(0, 11, DICTIONARY, 'incompétent')]
+    assert len(matcher) == 6
+
+
+def test_redact_masks_with_same_length_stars():
+    text, spans = make_matcher().redact('Quel connard, vraiment nul.', [API, DICTIONARY])
+    assert text == 'Quel *******, vraiment ***.'
+    assert [span[3] for span in spans] == ['connard', 'nul']
@@ -0,0 +1,151 @@
+"""Non-régression du dictionnaire versionné : journal, rejeu et compaction (lexicon_store.py)"""
+import json
+import os
+
+import lexicon_store
+from generation_counter import GenerationCounter
+from lexicon_store import LexiconStore
+
+
+def make_store(tmp_path, words=('con', 'nul'), compact_every=100, generation=None):
+    words_file = tmp_path / 'mots_interdits.txt'
+    if not words_file.exists():
+        words_file.write_text(''.join(f'{word}\n' for word in words), encoding='utf-8')
+
+    def load_words():
+        with open(words_file, 'r', encoding='utf-8') as file:
+            return [line.strip() for line in file if line.strip()]
+
+    return LexiconStore(str(words_file), load_words, frozenset, compact_every=compact_every, generation=generation)
+
+
+def journal_lines(store):
+    with open(store.journal_file, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_update_appends_to_journal_without_rewriting_words_file(tmp_path):
+    store = make_store(tmp_path)
+    snapshot, added, removed = store.update(add=['idiot', 'con'], remove=['nul'])
+    assert (added, removed) == (['idiot'], ['nul'])
+    assert snapshot.version == 1 and snapshot.words == ('con', 'idiot')
+    assert snapshot.matcher == frozenset({'con', 'idiot'})
+    assert journal_lines(store) == [{'version': 1, 'add': ['idiot'], 'remove': ['nul']}]
+    assert (tmp_path / 'mots_interdits.txt').read_text(encoding='utf-8') == 'con\nnul\n'
+
+
+def test_update_without_change_keeps_version_and_journal(tmp_path):
+    store = make_store(tmp_path)
+    snapshot, added, removed = store.update(add=['con'], remove=['absent'])
+    assert (snapshot.version, added, removed) == (0, [], [])
+    assert not os.path.exists(store.journal_file)
+
+
+def test_replace_journals_the_difference(tmp_path):
+    store = make_store(tmp_path)
+    snapshot, added, removed = store.update(replace=['nul', 'idiot'])
+    assert (added, removed) == (['idiot'], ['con'])
+    assert snapshot.words == ('nul', 'idiot')
+
+
+def test_snapshot_in_use_is_not_modified_by_update(tmp_path):
+    store = make_store(tmp_path)
+    before = store.snapshot
+    store.add('idiot')
+    assert before.words == ('con', 'nul') and 'idiot' not in before
+    assert store.snapshot is not before and 'idiot' in store.snapshot
+    assert store.snapshot.etag != before.etag
+
+
+def test_restart_replays_journal_on_words_file(tmp_path):
+    store = make_store(tmp_path)
+    store.add('idiot')
+    store.remove('con')
+    reloaded = make_store(tmp_path)
+    assert reloaded.snapshot.version == 2
+    assert reloaded.snapshot.words == ('nul', 'idiot')
+    assert reloaded.stats()['journal_entries'] == 2
+
+
+def test_incomplete_last_journal_line_is_ignored(tmp_path):
+    store = make_store(tmp_path)
+    store.add('idiot')
+    with open(store.journal_file, 'a', encoding='utf-8') as file:
+        file.write('{"version": 2, "add": ["tronq')
+    reloaded = make_store(tmp_path)
+    assert reloaded.snapshot.version == 1
+    assert reloaded.snapshot.words == ('con', 'nul', 'idiot')
+
+
+def test_compaction_rewrites_words_file_and_empties_journal(tmp_path):
+    store = make_store(tmp_path, compact_every=2)
+    store.add('idiot')
+    store.add('nase')
+    assert (tmp_path / 'mots_interdits.txt').read_text(encoding='utf-8') == 'con\nnul\nidiot\nnase\n'
+    assert journal_lines(store) == [{'version': 2, 'compacted': True}]
+    assert store.stats()['journal_entries'] == 0
+    reloaded = make_store(tmp_path, compact_every=2)
+    assert reloaded.snapshot.version == 2 and reloaded.snapshot.words == ('con', 'nul', 'idiot', 'nase')
+    assert reloaded.stats()['journal_entries'] == 0
+
+
+def test_crash_before_words_file_replacement_replays_journal(tmp_path, monkeypatch):
+    store = make_store(tmp_path, compact_every=2)
+    store.add('idiot')
+
+    # Arrêt pendant l'écriture du fichier temporaire : ni les mots ni le journal ne sont remplacés
+    def crash(source, destination):
+        raise OSError("arrêt simulé")
+    monkeypatch.setattr(lexicon_store.os, 'replace', crash)
+    store.remove('con')
+    monkeypatch.undo()
+
+    assert (tmp_path / 'mots_interdits.txt').read_text(encoding='utf-8') == 'con\nnul\n'
+    reloaded = make_store(tmp_path, compact_every=2)
+    assert reloaded.snapshot.version == 2
+    assert reloaded.snapshot.words == ('nul', 'idiot')
+
+
+def test_crash_between_words_file_and_journal_replacement_is_idempotent(tmp_path, monkeypatch):
+    store = make_store(tmp_path, compact_every=3)
+    store.add('idiot')
+    store.remove('con')
+    replace = os.replace
+
+    # Fichier des mots réécrit, puis arrêt avant le remplacement du journal
+    def crash_on_journal(source, destination):
+        if destination == store.journal_file:
+            raise OSError("arrêt simulé")
+        replace(source, destination)
+    monkeypatch.setattr(lexicon_store.os, 'replace', crash_on_journal)
+    store.add('con')
+    monkeypatch.undo()
+
+    assert (tmp_path / 'mots_interdits.txt').read_text(encoding='utf-8') == 'nul\nidiot\ncon\n'
+    assert len(journal_lines(store)) == 3
+    # Rejouer tout le journal sur le fichier déjà réécrit donne la même version
+    reloaded = make_store(tmp_path, compact_every=3)
+    assert reloaded.snapshot.version == 3
+    assert reloaded.snapshot.words == ('nul', 'idiot', 'con')
+
+
+def test_forced_compaction_keeps_version(tmp_path):
+    store = make_store(tmp_path)
+    store.add('idiot')
+    store.compact()
+    assert journal_lines(store) == [{'version': 1, 'compacted': True}]
+    reloaded = make_store(tmp_path)
+    assert reloaded.snapshot.version == 1 and reloaded.snapshot.words == ('con', 'nul', 'idiot')
+
+
+def test_update_by_another_store_is_seen_through_generation_counter(tmp_path):
+    state_file = str(tmp_path / 'state.bin')
+    first = make_store(tmp_path, generation=GenerationCounter(state_file, ['lexicon']))
+    second = make_store(tmp_path, generation=GenerationCounter(state_file, ['lexicon']))
+    first.add('idiot')
+    assert second.snapshot.version == 1 and 'idiot' in second.snapshot
+    assert second.stats()['reloads'] == 1
+    # Modification de la version rechargée : pas de conflit de version dans le journal
+    second.remove('nul')
+    assert [entry['version'] for entry in journal_lines(first)] == [1, 2]
+    assert first.snapshot.words == ('con', 'idiot')
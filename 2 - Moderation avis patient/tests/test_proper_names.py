@@ -0,0 +1,84 @@
+"""Non-régression de la détection des noms propres (proper_names.py)"""
+import re
+
+from proper_names import ProperNameDetector, NAME_REPLACEMENT, TITLES
+
+DETECTOR = ProperNameDetector()
+
+
+def test_find_returns_name_spans_and_detected_title_and_name():
+    assert DETECTOR.find('Le Dr Martin et Mme Durand') == [
+        (6, 12, 'Dr Martin'),
+        (20, 26, 'Mme Durand')
+    ]
+
+
+def test_find_handles_full_titles_abbreviations_and_hyphenated_names():
+    assert DETECTOR.find('Docteur Dupont') == [(8, 14, 'Docteur Dupont')]
+    assert DETECTOR.find('M. Jean-Pierre') == [(3, 14, 'M. Jean-Pierre')]
+    assert DETECTOR.find('Mlle Élise') == []  # le nom doit commencer par une lettre A-Z
+    assert DETECTOR.find('merci à Mlle Lucie') == [(13, 18, 'Mlle Lucie')]
+
+
+def test_find_is_case_insensitive():
+    assert DETECTOR.find('le dr house') == [(6, 11, 'dr house')]
+
+
+def test_find_keeps_historical_title_by_title_resolution():
+    # Un titre masqué en tant que nom par un titre précédent n'est plus détecté
+    assert DETECTOR.find('Dr Dr Who') == [(3, 5, 'Dr Dr')]
+    # Le mot suivant un titre est masqué même s'il ne s'agit pas d'un nom
+    assert DETECTOR.find('Monsieur le directeur') == [(9, 11, 'Monsieur le')]
+
+
+def test_find_without_title_detects_nothing():
+    assert DETECTOR.find("Martin m'a bien soigné") == []
+
+
+def test_masked_spans_covering_title_or_name_initial_block_detection():
+    assert DETECTOR.find('Dr Martin', masked_spans=[(0, 2, 'source', 'dr')]) == []
+    assert DETECTOR.find('Dr Martin', masked_spans=[(3, 5, 'source', 'ma')]) == []
+
+
+def test_masked_spans_on_name_tail_do_not_block_detection():
+    assert DETECTOR.find('Dr Martin', masked_spans=[(6, 9, 'source', 'tin')]) == [(3, 9, 'Dr Martin')]
+    assert DETECTOR.find('M. Jean-con', masked_spans=[(8, 11, 'source', 'con')]) == [(3, 11, 'M. Jean-con')]
+
+
+def test_redact_replaces_names_with_fixed_replacement():
+    text, detected = DETECTOR.redact('Le Dr Martin et Mme Durand')
+    assert text == f'Le Dr {NAME_REPLACEMENT} et Mme {NAME_REPLACEMENT}'
+    assert detected == ['Dr Martin', 'Mme Durand']
+    assert DETECTOR.redact('Rien à signaler') == ('Rien à signaler', [])
+
+
+def legacy_redact(text):
+    """Traitement historique titre par titre (réécriture du texte à chaque titre), pour comparaison"""
+    detected = []
+    for title in TITLES:
+        title_regex = title if "\\.?" in title else re.escape(title)
+        for name_pattern in ("[A-Z][a-zéèêëàâäôöûüç-]+", "[A-Z][A-ZÉÈÊËÀÂÄÔÖÛÜÇ]+"):
+            pattern = f"\\b({title_regex}\\s+)({name_pattern})"
+            detected.extend(f"{match[0]}{match[1]}" for match in re.findall(pattern, text, flags=re.IGNORECASE))
+            text = re.sub(pattern, r"\1*****", text, flags=re.IGNORECASE)
+    return text, detected
+
+
+def test_redact_matches_historical_title_by_title_processing():
+    samples = [
+        'Le Dr Martin et Mme Durand',
+        'Dr Dr Who',
+        'Monsieur le directeur',
+        'Merci au Docteur DUPONT et à l\'infirmière Claire',
+        'Mr. Smith, M. Jean-Pierre et Me Lebon',
+        'Le Chef Cuisinier Paul',
+        'Pr Pr Pr',
+        'Sage femme Lucie et Sage-femme Anne',
+        'Madame Mme Durand',
+        'Aucun nom ici.'
+    ]
+    for text in samples:
+        redacted, detected = DETECTOR.redact(text)
+        legacy_text, legacy_detected = legacy_redact(text)
+        assert redacted == legacy_text, text
+        assert sorted(detected) == sorted(legacy_detected), text
@@ -0,0 +1,82 @@
+"""Non-régression de la redaction en une passe (redaction.py) et de son enchaînement avec les détections"""
+from lexicon import LexiconMatcher
+from proper_names import ProperNameDetector, NAME_REPLACEMENT
+from redaction import merge_spans, redact_spans
+
+API = 'API Mistral'
+DICTIONARY = 'Dictionnaire de mots interdits'
+PROPER_NAMES = 'Détection de noms propres'
+
+MATCHER = LexiconMatcher([
+    (API, ['con', 'trou du cul', 'trou']),
+    (DICTIONARY, ['nul', 'du cul', 'sale con'])
+])
+DETECTOR = ProperNameDetector()
+
+
+def moderate(text, active_sources=(API, DICTIONARY)):
+    """Mêmes étapes que apply_local_moderation : étendues relevées sur le texte original, puis une redaction"""
+    lexicon_spans = MATCHER.find(text, list(active_sources))
+    name_spans = [(start, end, PROPER_NAMES, detected)
+                  for start, end, detected in DETECTOR.find(text, lexicon_spans)]
+    spans = sorted(lexicon_spans + name_spans, key=lambda span: (span[0], span[1]))
+    return redact_spans(text, spans, {PROPER_NAMES: NAME_REPLACEMENT})
+
+
+def test_merge_spans_sorts_and_merges_overlaps():
+    spans = [(5, 8, 'a', 'x'), (0, 3, 'b', 'y'), (2, 4, 'c', 'z'), (8, 9, 'd', 'w')]
+    assert merge_spans(spans) == [
+        (0, 4, [(0, 3, 'b', 'y'), (2, 4, 'c', 'z')]),
+        (5, 8, [(5, 8, 'a', 'x')]),
+        # Étendues adjacentes (sans chevauchement) : non fusionnées
+        (8, 9, [(8, 9, 'd', 'w')])
+    ]
+
+
+def test_merge_spans_keeps_the_widest_end_of_nested_spans():
+    assert merge_spans([(0, 10, 'a', 'x'), (2, 4, 'b', 'y')]) == [(0, 10, [(0, 10, 'a', 'x'), (2, 4, 'b', 'y')])]
+    assert merge_spans([]) == []
+
+
+def test_redact_spans_uses_same_length_stars_by_default():
+    assert redact_spans('abcdefghij', [(1, 3, API, 'bc'), (6, 7, DICTIONARY, 'g')]) == 'a**def*hij'
+    assert redact_spans('abc', []) == 'abc'
+
+
+def test_redact_spans_fixed_replacement_wins_for_merged_group():
+    spans = [(0, 3, API, 'abc'), (2, 5, PROPER_NAMES, 'cde'), (7, 9, API, 'hi')]
+    assert redact_spans('abcdefghij', spans, {PROPER_NAMES: NAME_REPLACEMENT}) == '*****fg**j'
+
+
+def test_lexicon_and_names_are_redacted_together():
+    assert moderate('Le Dr Martin est nul') == 'Le Dr ***** est ***'
+    assert moderate('Un trou du cul, ce Dr Martin') == 'Un ***********, ce Dr *****'
+
+
+def test_name_whose_tail_matches_lexicon_is_masked_whole():
+    # Comportement modifié volontairement : auparavant "M. Jean-con" donnait "M. ********"
+    # (nom "Jean-" détecté sur le texte déjà masqué, suivi des astérisques du mot interdit)
+    assert moderate('M. Jean-con') == f'M. {NAME_REPLACEMENT}'
+
+
+def test_lexicon_word_covering_title_or_name_initial_blocks_name_detection():
+    assert moderate('Dr Con est venu') == 'Dr *** est venu'
+    assert moderate('Monsieur Nul') == 'Monsieur ***'
+
+
+def test_leftmost_longest_phrases_are_redacted_once():
+    # "trou du cul" (API) l'emporte sur "trou" (API) et "du cul" (dictionnaire) qui le chevauchent
+    assert moderate('trou du cul') == '***********'
+    # Sans l'API, seul "du cul" s'applique
+    assert moderate('trou du cul', active_sources=[DICTIONARY]) == 'trou ******'
+    # "sale con" (dictionnaire) commence avant "con" (API) : une seule étendue
+    assert moderate('quel sale con') == 'quel ********'
+
+
+def test_spans_are_positions_in_original_text():
+    text = 'Mme Durand, quel con'
+    lexicon_spans = MATCHER.find(text, [API, DICTIONARY])
+    name_spans = DETECTOR.find(text, lexicon_spans)
+    assert lexicon_spans == [(17, 20, API, 'con')]
+    assert name_spans == [(4, 10, 'Mme Durand')]
+    assert text[17:20] == 'con' and text[4:10] == 'Durand'
@@ -1,8 +1,16 @@
 # app.py
-from flask import Flask, render_template, request, jsonify
-import requests
+from flask import Flask, Response, render_template, request, jsonify, g, stream_with_context
+import csv
+import io
+import json
 import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from dotenv import load_dotenv
+from mistral_client import create_client_from_env, SHARED_RATE_LIMITER, PRIORITY_BULK
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -12,23 +20,53 @@ app = Flask(__name__)
 # Récupérer la clé API depuis les variables d'environnement
 MISTRAL_API_KEY = os.getenv('MISTRAL_API_KEY')
 
+# Client HTTP partagé (connexions keep-alive, timeouts, nouvelles tentatives)
+MISTRAL_CLIENT = create_client_from_env(MISTRAL_API_KEY, read_timeout=60)
+
+# Génération en masse (/generate_batch et batch_generate.py)
+MAX_BATCH_REVIEWS = int(os.getenv('GENERATE_BATCH_MAX_REVIEWS', '1000'))
+MAX_BATCH_CONCURRENCY = int(os.getenv('GENERATE_BATCH_MAX_CONCURRENCY', '8'))
+DEFAULT_BATCH_CONCURRENCY = 4
+REVIEW_FILE_FORMATS = ('txt', 'csv', 'jsonl')
+
+# Métriques exposées au format Prometheus sur /metrics
+METRICS = MetricsRegistry()
+UPSTREAM_DURATION = METRICS.histogram(
+    'generate_upstream_duration_seconds', "Durée des appels à l'API de chat Mistral"
+)
+UPSTREAM_RESPONSES = METRICS.counter(
+    'generate_upstream_responses_total',
+    "Réponses de l'API de chat Mistral par code HTTP (exception : pas de réponse)",
+    ['status_code']
+)
+GENERATED_TOKENS = METRICS.counter(
+    'generate_tokens_total', "Tokens consommés d'après le champ usage des réponses (prompt, completion, total)", ['type']
+)
+FIRST_TOKEN_DURATION = METRICS.histogram(
+    'generate_first_token_seconds', "Délai avant le premier token des réponses en streaming (/generate_stream)"
+)
+IN_FLIGHT_REQUESTS = METRICS.gauge('generate_requests_in_flight', "Requêtes en cours de traitement", ['endpoint'])
+SHARED_RATE_LIMITER.register_metrics(METRICS, 'generate')
+
+@app.before_request
+def track_request_start():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    IN_FLIGHT_REQUESTS.inc(endpoint=g.metrics_endpoint)
+
+@app.teardown_request
+def track_request_end(error=None):
+    # pop : le teardown peut être appelé deux fois pour une réponse en streaming (stream_with_context)
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        IN_FLIGHT_REQUESTS.dec(endpoint=endpoint)
+
 @app.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/generate', methods=['POST'])
-def generate_response():
-    data = request.json
-    review = data.get('review')
-    system_prompt = data.get('system_prompt')
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json',
-        'Authorization': f'Bearer {MISTRAL_API_KEY}'
-    }
-    
-    payload = {
+def build_chat_payload(review, system_prompt):
+    """Requête de chat envoyée à l'API Mistral pour répondre à un avis"""
+    return {
         "model": "mistral-small-latest",
         "messages": [
             {
@@ -46,81 +84,451 @@ def generate_response():
         "presence_penalty": 0.2,
         "frequency_penalty": 0.2
     }
-    
-    try:
-        # Faire l'appel à l'API Mistral
-        response = requests.post(
-            "https://api.mistral.ai/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        
-        # Création d'un dictionnaire pour stocker les informations de la réponse
-        api_response_info = {
-            'status_code': response.status_code,
-            'is_success': response.status_code == 200,
-            'headers': dict(response.headers),
-            'raw_response': None,
-            'error_message': None
-        }
 
-        if response.status_code == 200:
-            result = response.json()
-            api_response_info['raw_response'] = result
-            api_response_info['generated_text'] = result['choices'][0]['message']['content']
-            api_response_info['model_used'] = result.get('model')
-            api_response_info['usage'] = result.get('usage')
-            api_response_info['conversation_id'] = result.get('id')
-            api_response_info['created_timestamp'] = result.get('created')
-            api_response_info['finish_reason'] = result['choices'][0].get('finish_reason')
-            
-            # Générer la commande cURL (comme avant)
-            curl_command = f"""curl --location "https://api.mistral.ai/v1/chat/completions" \\
+def build_curl_command(review, system_prompt):
+    """Commande cURL équivalente à l'appel à l'API Mistral"""
+    return f"""curl --location "{MISTRAL_CLIENT.url('/chat/completions')}" \\
 --header 'Content-Type: application/json' \\
 --header 'Accept: application/json' \\
 --header "Authorization: Bearer $MISTRAL_API_KEY" \\
---data '{
+--data '{{
     "model": "mistral-small-latest",
     "messages": [
-        {
+        {{
             "role": "system",
             "content": "{system_prompt}"
-        },
-        {
+        }},
+        {{
             "role": "user",
             "content": "Voici l\\'avis client à traiter : {review}"
-        }
+        }}
     ],
     "temperature": 0.7,
     "max_tokens": 500,
     "top_p": 0.9,
     "presence_penalty": 0.2,
     "frequency_penalty": 0.2
-}'"""
+}}'"""
+
+def record_usage(usage):
+    for token_type in ('prompt', 'completion', 'total'):
+        GENERATED_TOKENS.inc((usage or {}).get(f'{token_type}_tokens', 0), type=token_type)
+
+def api_error_info(response):
+    """Informations d'une réponse en erreur de l'API Mistral"""
+    api_response_info = {
+        'status_code': response.status_code,
+        'is_success': False,
+        'headers': dict(response.headers),
+        'raw_response': None,
+        'error_message': f'Erreur API: {response.status_code}'
+    }
+    try:
+        api_response_info['error_details'] = response.json()
+    except:
+        api_response_info['error_details'] = response.text
+    return api_response_info
+
+@app.route('/generate', methods=['POST'])
+def generate_response():
+    data = request.json
+    review = data.get('review')
+    system_prompt = data.get('system_prompt')
+    
+    payload = build_chat_payload(review, system_prompt)
+    
+    response = None
+    try:
+        # Faire l'appel à l'API Mistral
+        started = time.perf_counter()
+        response = MISTRAL_CLIENT.post("/chat/completions", json=payload)
+        UPSTREAM_DURATION.observe(time.perf_counter() - started)
+        UPSTREAM_RESPONSES.inc(status_code=response.status_code)
+        
+        if response.status_code == 200:
+            # Création d'un dictionnaire pour stocker les informations de la réponse
+            api_response_info = {
+                'status_code': response.status_code,
+                'is_success': True,
+                'headers': dict(response.headers),
+                'raw_response': None,
+                'error_message': None
+            }
+            result = response.json()
+            api_response_info['raw_response'] = result
+            api_response_info['generated_text'] = result['choices'][0]['message']['content']
+            api_response_info['model_used'] = result.get('model')
+            api_response_info['usage'] = result.get('usage')
+            record_usage(result.get('usage'))
+            api_response_info['conversation_id'] = result.get('id')
+            api_response_info['created_timestamp'] = result.get('created')
+            api_response_info['finish_reason'] = result['choices'][0].get('finish_reason')
             
             return jsonify({
                 'status': 'success',
                 'api_info': api_response_info,
-                'curl_command': curl_command
+                'curl_command': build_curl_command(review, system_prompt)
             })
         else:
-            api_response_info['error_message'] = f'Erreur API: {response.status_code}'
-            try:
-                api_response_info['error_details'] = response.json()
-            except:
-                api_response_info['error_details'] = response.text
+            return jsonify({
+                'status': 'error',
+                'api_info': api_error_info(response)
+            }), response.status_code
+            
+    except Exception as e:
+        if response is None:
+            UPSTREAM_RESPONSES.inc(status_code='exception')
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'error_type': type(e).__name__
+        }), 500
+
+def streamed_response(generator, mimetype, headers=None, on_close=None):
+    """
+    Réponse envoyée au fil de l'eau par un générateur
+
+    La requête reste comptée "en cours" jusqu'à la fin de l'envoi, et non jusqu'au retour de la vue ;
+    on_close est appelé à la fin de l'envoi, y compris si le client se déconnecte.
+    """
+    endpoint = g.pop('metrics_endpoint', None)
 
+    def close():
+        if on_close is not None:
+            on_close()
+        if endpoint is not None:
+            IN_FLIGHT_REQUESTS.dec(endpoint=endpoint)
+
+    response = Response(stream_with_context(generator), mimetype=mimetype, headers=headers)
+    response.call_on_close(close)
+    return response
+
+def sse_event(event, data):
+    """Événement Server-Sent Events (données JSON)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def iter_completion_chunks(response):
+    """Morceaux JSON ("chunks") d'une réponse de chat en streaming de l'API Mistral"""
+    # chunk_size=None : les lignes sont transmises dès leur arrivée, sans attendre un tampon plein
+    for line in response.iter_lines(chunk_size=None):
+        if not line.startswith(b'data:'):
+            continue
+        data = line[len(b'data:'):].strip()
+        if data == b'[DONE]':
+            return
+        yield json.loads(data)
+
+@app.route('/generate_stream', methods=['POST'])
+def generate_response_stream():
+    """
+    Génération de la réponse en streaming (Server-Sent Events)
+
+    Les tokens sont relayés au navigateur au fur et à mesure ("event: token"), puis
+    l'événement "done" donne le texte complet, le modèle, usage et finish_reason.
+    Une erreur de l'API avant le premier token est renvoyée en JSON comme pour /generate ;
+    une erreur pendant le streaming est signalée par l'événement "error".
+    """
+    data = request.json
+    review = data.get('review')
+    system_prompt = data.get('system_prompt')
+
+    payload = build_chat_payload(review, system_prompt)
+    payload['stream'] = True
+
+    response = None
+    try:
+        started = time.perf_counter()
+        response = MISTRAL_CLIENT.post("/chat/completions", json=payload, stream=True)
+        UPSTREAM_RESPONSES.inc(status_code=response.status_code)
+
+        if response.status_code != 200:
+            UPSTREAM_DURATION.observe(time.perf_counter() - started)
+            api_response_info = api_error_info(response)
+            response.close()
             return jsonify({
                 'status': 'error',
                 'api_info': api_response_info
             }), response.status_code
-            
     except Exception as e:
+        if response is None:
+            UPSTREAM_RESPONSES.inc(status_code='exception')
         return jsonify({
             'status': 'error',
             'message': str(e),
             'error_type': type(e).__name__
         }), 500
 
+    def events():
+        api_response_info = {
+            'status_code': response.status_code,
+            'is_success': True,
+            'headers': dict(response.headers),
+            'model_used': None,
+            'usage': None,
+            'conversation_id': None,
+            'created_timestamp': None,
+            'finish_reason': None
+        }
+        generated_text = []
+        try:
+            for chunk in iter_completion_chunks(response):
+                api_response_info['model_used'] = chunk.get('model') or api_response_info['model_used']
+                api_response_info['conversation_id'] = chunk.get('id') or api_response_info['conversation_id']
+                api_response_info['created_timestamp'] = chunk.get('created') or api_response_info['created_timestamp']
+                if chunk.get('usage'):
+                    api_response_info['usage'] = chunk['usage']
+                for choice in chunk.get('choices') or []:
+                    content = (choice.get('delta') or {}).get('content')
+                    if content:
+                        if not generated_text:
+                            FIRST_TOKEN_DURATION.observe(time.perf_counter() - started)
+                        generated_text.append(content)
+                        yield sse_event('token', {'content': content})
+                    if choice.get('finish_reason'):
+                        api_response_info['finish_reason'] = choice['finish_reason']
+
+            UPSTREAM_DURATION.observe(time.perf_counter() - started)
+            record_usage(api_response_info['usage'])
+            api_response_info['generated_text'] = ''.join(generated_text)
+            yield sse_event('done', {
+                'status': 'success',
+                'api_info': api_response_info,
+                'curl_command': build_curl_command(review, system_prompt)
+            })
+        except Exception as e:
+            app.logger.error(f"Erreur pendant le streaming de la réponse: {str(e)}", exc_info=True)
+            yield sse_event('error', {
+                'status': 'error',
+                'message': str(e),
+                'error_type': type(e).__name__,
+                'generated_text': ''.join(generated_text)
+            })
+
+    return streamed_response(events(), 'text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Désactive la mise en tampon des proxys (nginx) pour que chaque token parte immédiatement
+        'X-Accel-Buffering': 'no'
+    }, on_close=response.close)
+
+def read_reviews(file, input_format, text_field='review', id_field='id'):
+    """
+    Lit des avis en flux et produit des tuples (identifiant, avis)
+
+    Formats : txt (un avis par ligne), csv (colonnes text_field et id_field) ou jsonl
+    (champs text_field et id_field). Sans identifiant, le numéro de l'avis (à partir de 0) est utilisé.
+    """
+    if input_format == 'csv':
+        rows = csv.DictReader(file)
+    elif input_format == 'jsonl':
+        rows = (json.loads(line) for line in file if line.strip())
+    else:
+        rows = ({text_field: line.rstrip('\r\n')} for line in file if line.strip())
+    for index, row in enumerate(rows):
+        if isinstance(row, str):
+            row = {text_field: row}
+        record_id = row.get(id_field) if id_field else None
+        yield (record_id if record_id not in (None, '') else index), row.get(text_field) or ''
+
+def generate_reply(review, system_prompt, priority=PRIORITY_BULK):
+    """
+    Génère la réponse à un avis en dehors de l'interface (génération en masse)
+
+    Les appels passent dans la file "bulk" du limiteur de débit : le trafic interactif
+    (/generate, /generate_stream) reste prioritaire. Les 429/5xx sont retentés par le client
+    (MISTRAL_MAX_RETRIES, en respectant Retry-After).
+
+    Returns:
+        dict: status ("success" ou "error"), generated_text, finish_reason, model_used, usage et
+              duration_ms ; en cas d'erreur message (et status_code si l'API a répondu)
+    """
+    if not isinstance(review, str) or not review.strip():
+        return {'status': 'error', 'message': 'Avis vide'}
+
+    response = None
+    started = time.perf_counter()
+    try:
+        response = MISTRAL_CLIENT.post(
+            "/chat/completions", json=build_chat_payload(review, system_prompt), priority=priority
+        )
+        duration = time.perf_counter() - started
+        UPSTREAM_DURATION.observe(duration)
+        UPSTREAM_RESPONSES.inc(status_code=response.status_code)
+
+        if response.status_code != 200:
+            api_response_info = api_error_info(response)
+            return {
+                'status': 'error',
+                'status_code': response.status_code,
+                'message': api_response_info['error_message'],
+                'error_details': api_response_info['error_details'],
+                'duration_ms': round(duration * 1000, 1)
+            }
+
+        result = response.json()
+        record_usage(result.get('usage'))
+        return {
+            'status': 'success',
+            'generated_text': result['choices'][0]['message']['content'],
+            'finish_reason': result['choices'][0].get('finish_reason'),
+            'model_used': result.get('model'),
+            'usage': result.get('usage'),
+            'duration_ms': round(duration * 1000, 1)
+        }
+    except Exception as e:
+        if response is None:
+            UPSTREAM_RESPONSES.inc(status_code='exception')
+        return {
+            'status': 'error',
+            'message': str(e),
+            'error_type': type(e).__name__,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+def generate_replies(records, system_prompt, concurrency=DEFAULT_BATCH_CONCURRENCY):
+    """
+    Génère les réponses d'une suite de tuples (identifiant, avis), au plus concurrency appels simultanés
+
+    Les résultats ({"id": ..., "status": ..., ...}) sont produits au fur et à mesure, dans l'ordre
+    des avis. Les avis sont lus au fil de l'eau : au plus 2 × concurrency sont en mémoire.
+    """
+    records = iter(records)
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='generate-batch') as executor:
+
+        def submit_next():
+            record = next(records, None)
+            if record is not None:
+                record_id, review = record
+                in_flight.append((record_id, executor.submit(generate_reply, review, system_prompt)))
+
+        try:
+            # Avis d'avance : un avis lent ne laisse pas les autres appels inoccupés
+            for _ in range(2 * concurrency):
+                submit_next()
+            while in_flight:
+                record_id, future = in_flight.popleft()
+                result = future.result()
+                submit_next()
+                yield {'id': record_id, **result}
+        finally:
+            # Arrêt anticipé (client déconnecté, interruption) : les avis non commencés sont abandonnés
+            for _, future in in_flight:
+                future.cancel()
+
+class BatchTotals:
+    """Totaux d'une génération en masse : avis traités, erreurs et tokens consommés d'après usage"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.reviews = 0
+        self.succeeded = 0
+        self.usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        self.finish_reasons = Counter()
+
+    def add(self, result):
+        self.reviews += 1
+        if result.get('status') == 'success':
+            self.succeeded += 1
+            self.finish_reasons[result.get('finish_reason')] += 1
+            for key in self.usage:
+                self.usage[key] += (result.get('usage') or {}).get(key, 0)
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'reviews': self.reviews,
+            'succeeded': self.succeeded,
+            'failed': self.reviews - self.succeeded,
+            'usage': dict(self.usage),
+            'finish_reasons': dict(self.finish_reasons),
+            'duration_seconds': round(elapsed, 1),
+            'reviews_per_second': round(self.reviews / elapsed, 2) if elapsed > 0 else 0.0
+        }
+
+@app.route('/generate_batch', methods=['POST'])
+def generate_batch():
+    """
+    Génération en masse des réponses à une liste d'avis, avec un prompt système commun
+
+    Corps JSON : {"system_prompt": "...", "reviews": ["avis", {"id": 12, "review": "avis"}], "concurrency": 4}
+    ou formulaire multipart : fichier "file" (.txt, .csv ou .jsonl) et champs system_prompt,
+    concurrency, text_field (défaut : review) et id_field (défaut : id).
+
+    Les résultats sont renvoyés en JSON lines (application/x-ndjson), une ligne par avis dans
+    l'ordre des avis, au fur et à mesure de leur génération ; la dernière ligne ({"summary": ...})
+    donne les totaux (avis, erreurs, tokens d'après usage).
+    """
+    try:
+        uploaded_file = request.files.get('file')
+        if uploaded_file is not None:
+            data = request.form
+            input_format = (data.get('format') or uploaded_file.filename.rsplit('.', 1)[-1]).lower()
+            if input_format not in REVIEW_FILE_FORMATS:
+                return jsonify({
+                    'status': 'error',
+                    'message': f"Format de fichier non supporté (formats acceptés : {', '.join(REVIEW_FILE_FORMATS)})"
+                }), 400
+            reviews = read_reviews(
+                io.TextIOWrapper(uploaded_file.stream, encoding='utf-8-sig', newline=''), input_format,
+                text_field=data.get('text_field') or 'review', id_field=data.get('id_field') or 'id'
+            )
+            records = list(islice(reviews, MAX_BATCH_REVIEWS + 1))
+        else:
+            data = request.get_json(silent=True) or {}
+            reviews = data.get('reviews')
+            if not isinstance(reviews, list):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Le champ "reviews" doit être une liste d\'avis'
+                }), 400
+            records = [
+                (review.get('id', index), review.get('review')) if isinstance(review, dict) else (index, review)
+                for index, review in enumerate(reviews)
+            ]
+
+        system_prompt = data.get('system_prompt')
+        if not system_prompt:
+            return jsonify({'status': 'error', 'message': 'Le prompt système (system_prompt) est requis'}), 400
+        if not records:
+            return jsonify({'status': 'error', 'message': 'Aucun avis à traiter'}), 400
+        if len(records) > MAX_BATCH_REVIEWS:
+            return jsonify({
+                'status': 'error',
+                'message': f"Trop d'avis : {MAX_BATCH_REVIEWS} au maximum par requête (utiliser batch_generate.py au-delà)"
+            }), 400
+        try:
+            concurrency = int(data.get('concurrency') or DEFAULT_BATCH_CONCURRENCY)
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Le champ "concurrency" doit être un entier'}), 400
+        concurrency = max(1, min(MAX_BATCH_CONCURRENCY, concurrency))
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'error_type': type(e).__name__
+        }), 500
+
+    def lines():
+        totals = BatchTotals()
+        for result in generate_replies(records, system_prompt, concurrency):
+            totals.add(result)
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+        yield json.dumps({'summary': totals.as_dict()}, ensure_ascii=False) + '\n'
+
+    return streamed_response(lines(), 'application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/rate_limiter', methods=['GET'])
+def get_rate_limiter():
+    # État du limiteur de débit des appels à l'API Mistral (files, temps d'attente)
+    return jsonify({
+        'status': 'success',
+        'rate_limiter': SHARED_RATE_LIMITER.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Métriques au format texte Prometheus (latence et codes HTTP de l'API, tokens, requêtes en cours)
+    return app.response_class(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Génération en masse des réponses aux avis clients en ligne de commande
+
+Usage :
+    python batch_generate.py avis.csv reponses.jsonl --system-prompt-file prompt.txt --text-field avis
+    python batch_generate.py avis.txt reponses.jsonl --system-prompt "Tu es un agent..." --concurrency 8
+    python batch_generate.py avis.jsonl reponses.jsonl --system-prompt-file prompt.txt --resume
+
+- Entrée : un avis par ligne (.txt), CSV ou JSONL (champs --text-field et --id-field), lue en flux
+- Au plus --concurrency appels simultanés à l'API Mistral ; les 429/5xx sont retentés (--max-retries)
+  en respectant Retry-After, et le débit suit les en-têtes de limite de l'API
+  (MISTRAL_RATE_LIMIT_RPS pour fixer un plafond)
+- Résultats écrits au fur et à mesure en JSONL, dans l'ordre des avis ; --resume reprend un
+  fichier de sortie existant en ne régénérant que les avis absents ou en erreur
+- Totaux (avis, erreurs, tokens d'après usage) affichés régulièrement puis à la fin
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import app as generation_service
+
+
+def compact_output(output_path):
+    """
+    Prépare la reprise d'un fichier de sortie existant
+
+    Le fichier est réécrit (fichier temporaire puis remplacement) en ne gardant que les avis
+    générés avec succès : les lignes en erreur, qui vont être régénérées, et une éventuelle ligne
+    partiellement écrite lors d'un arrêt sont supprimées.
+
+    Returns:
+        set: Identifiants (JSON) des avis déjà générés avec succès
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    temporary_path = output_path + '.tmp'
+    with open(output_path, 'r', encoding='utf-8') as file, \
+            open(temporary_path, 'w', encoding='utf-8') as compacted:
+        for line in file:
+            if not line.endswith('\n'):
+                # Dernière ligne partiellement écrite lors d'un arrêt
+                continue
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            record_id = json.dumps(result.get('id'))
+            if result.get('status') == 'success' and record_id not in done:
+                done.add(record_id)
+                compacted.write(line)
+    os.replace(temporary_path, output_path)
+    return done
+
+
+def report(totals, skipped, final=False):
+    summary = totals.as_dict()
+    usage = summary['usage']
+    prefix = "Terminé" if final else "Progression"
+    print(
+        f"{prefix} : {summary['reviews']} avis traités ({summary['reviews_per_second']:.2f} avis/s, "
+        f"{skipped} déjà générés) - erreurs: {summary['failed']} - tokens: {usage['total_tokens']} "
+        f"(prompt {usage['prompt_tokens']}, completion {usage['completion_tokens']})",
+        file=sys.stderr
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génération en masse des réponses à des avis clients vers JSONL")
+    parser.add_argument('input', help="Fichier d'avis (.txt : un avis par ligne, .csv ou .jsonl)")
+    parser.add_argument('output', help="Fichier de résultats JSONL")
+    prompt = parser.add_mutually_exclusive_group(required=True)
+    prompt.add_argument('--system-prompt', help="Prompt système commun à tous les avis")
+    prompt.add_argument('--system-prompt-file', help="Fichier contenant le prompt système")
+    parser.add_argument('--format', choices=generation_service.REVIEW_FILE_FORMATS,
+                        help="Format d'entrée (déduit de l'extension par défaut)")
+    parser.add_argument('--text-field', default='review', help="Colonne/champ contenant l'avis (défaut : review)")
+    parser.add_argument('--id-field', default='id', help="Colonne/champ identifiant l'avis (défaut : id, sinon numéro de l'avis)")
+    parser.add_argument('--concurrency', type=int, default=generation_service.DEFAULT_BATCH_CONCURRENCY,
+                        help="Nombre maximum d'appels simultanés à l'API")
+    parser.add_argument('--max-retries', type=int,
+                        help="Nouvelles tentatives par avis sur 429/5xx et erreurs réseau (défaut : MISTRAL_MAX_RETRIES)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Compléter le fichier de sortie existant (avis absents ou en erreur uniquement)")
+    parser.add_argument('--report-every', type=float, default=10.0, help="Intervalle d'affichage des totaux (secondes)")
+    parser.add_argument('--verbose', action='store_true', help="Conserver les logs détaillés de l'API")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    if args.max_retries is not None:
+        generation_service.MISTRAL_CLIENT.max_retries = max(0, args.max_retries)
+
+    if args.system_prompt_file:
+        with open(args.system_prompt_file, 'r', encoding='utf-8') as file:
+            system_prompt = file.read().strip()
+    else:
+        system_prompt = args.system_prompt
+    if not system_prompt:
+        raise SystemExit("Le prompt système est vide")
+
+    input_format = args.format or os.path.splitext(args.input)[1].lstrip('.').lower()
+    if input_format not in generation_service.REVIEW_FILE_FORMATS:
+        input_format = 'txt'
+
+    done_ids = compact_output(args.output) if args.resume else set()
+    if done_ids:
+        print(f"Reprise : {len(done_ids)} avis déjà générés sont ignorés", file=sys.stderr)
+
+    totals = generation_service.BatchTotals()
+    skipped = 0
+
+    with open(args.input, 'r', encoding='utf-8-sig', newline='') as input_file, \
+            open(args.output, 'a' if args.resume else 'w', encoding='utf-8') as output:
+
+        def pending_records():
+            nonlocal skipped
+            records = generation_service.read_reviews(input_file, input_format, args.text_field, args.id_field)
+            for record_id, review in records:
+                if json.dumps(record_id) in done_ids:
+                    skipped += 1
+                    continue
+                yield record_id, review
+
+        last_report = time.monotonic()
+        results = generation_service.generate_replies(pending_records(), system_prompt, max(1, args.concurrency))
+        try:
+            for result in results:
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                output.flush()
+                totals.add(result)
+                if time.monotonic() - last_report >= args.report_every:
+                    report(totals, skipped)
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            print("Interrompu : relancer avec --resume pour compléter le fichier de sortie", file=sys.stderr)
+            results.close()
+            sys.exit(130)
+
+    report(totals, skipped, final=True)
+    throttled = generation_service.SHARED_RATE_LIMITER.stats()['throttled_responses']
+    if throttled:
+        print(f"Limite de débit de l'API atteinte {throttled} fois (réponses 429)", file=sys.stderr)
+    if totals.reviews > totals.succeeded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
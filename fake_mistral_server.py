@@ -0,0 +1,323 @@
+"""
+Faux serveur de l'API Mistral pour les tests de charge et de pannes, sans consommer de quota
+
+Usage :
+    python fake_mistral_server.py --port 8090 --latency-ms 120 --error-rate-429 0.05
+    MISTRAL_API_BASE_URL=http://localhost:8090/v1 python app.py
+
+Routes :
+- POST /v1/moderations : entrée unique ou multiple, scores par catégorie déterministes
+  (dérivés du texte, plus élevés en présence de mots grossiers)
+- POST /v1/chat/completions : réponse générée à partir de l'avis, avec "usage" ;
+  "stream": true renvoie les tokens en Server-Sent Events comme l'API Mistral
+- GET/POST /_fake/config : lecture ou modification des réglages pendant un test
+- GET /_fake/stats : nombre de requêtes par route et par code de réponse
+
+Pannes injectées (proportion des requêtes, entre 0 et 1) : erreurs 429 (avec Retry-After),
+erreurs 5xx, timeouts (réponse retardée de --timeout-seconds) ; latence fixe, uniforme
+ou log-normale ; limite de débit optionnelle (--rate-limit-rps) avec en-têtes x-ratelimit-*.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+# Catégories renvoyées par l'API de modération Mistral
+MODERATION_CATEGORIES = [
+    "sexual", "hate_and_discrimination", "violence_and_threats", "dangerous_and_criminal_content",
+    "selfharm", "health", "financial", "law", "pii"
+]
+
+# Mots faisant monter le score de certaines catégories
+CATEGORY_KEYWORDS = {
+    "sexual": ["sexe", "cul", "bite", "pute", "salope"],
+    "hate_and_discrimination": ["connard", "connasse", "enculé", "merde", "putain", "con"],
+    "violence_and_threats": ["tuer", "frapper", "menace", "crever"]
+}
+
+# Réglages modifiables au lancement (arguments) ou pendant un test (POST /_fake/config)
+FAKE_CONFIG = {
+    'latency_distribution': 'fixed',  # fixed, uniform ou lognormal
+    'latency_ms': 50.0,               # latence fixe, moyenne (uniform) ou médiane (lognormal)
+    'latency_spread': 0.5,            # uniform : ±spread × latency_ms ; lognormal : sigma
+    'error_rate_429': 0.0,
+    'retry_after_seconds': 1,
+    'error_rate_5xx': 0.0,
+    'error_status_codes': [500, 502, 503],
+    'timeout_rate': 0.0,
+    'timeout_seconds': 60.0,
+    'rate_limit_rps': 0.0,            # 0 : pas de limite
+    'token_delay_ms': 20.0            # délai entre deux tokens en streaming
+}
+
+STATS = Counter()
+STATS_LOCK = threading.Lock()
+RATE_LIMIT_LOCK = threading.Lock()
+RATE_LIMIT_STATE = {'tokens': 0.0, 'updated_at': time.monotonic()}
+
+
+def record(route, status_code):
+    with STATS_LOCK:
+        STATS[(route, status_code)] += 1
+
+
+def sample_latency():
+    """Latence simulée (secondes) selon la distribution configurée"""
+    latency_ms = FAKE_CONFIG['latency_ms']
+    spread = FAKE_CONFIG['latency_spread']
+    distribution = FAKE_CONFIG['latency_distribution']
+    if distribution == 'uniform':
+        latency_ms = random.uniform(latency_ms * (1 - spread), latency_ms * (1 + spread))
+    elif distribution == 'lognormal':
+        latency_ms = random.lognormvariate(math.log(max(latency_ms, 0.001)), spread)
+    return max(0.0, latency_ms) / 1000
+
+
+def rate_limit_headers(remaining):
+    rps = FAKE_CONFIG['rate_limit_rps']
+    return {
+        'x-ratelimit-limit-req-minute': str(int(rps * 60)),
+        'x-ratelimit-remaining-req-minute': str(int(remaining))
+    }
+
+
+def take_rate_limit_token():
+    """
+    Seau à jetons de la limite de débit simulée
+
+    Returns:
+        tuple: (accepté, en-têtes de limite de débit)
+    """
+    rps = FAKE_CONFIG['rate_limit_rps']
+    if rps <= 0:
+        return True, {}
+    with RATE_LIMIT_LOCK:
+        now = time.monotonic()
+        capacity = max(1.0, rps)
+        tokens = min(capacity, RATE_LIMIT_STATE['tokens'] + (now - RATE_LIMIT_STATE['updated_at']) * rps)
+        RATE_LIMIT_STATE['updated_at'] = now
+        accepted = tokens >= 1
+        if accepted:
+            tokens -= 1
+        RATE_LIMIT_STATE['tokens'] = tokens
+    return accepted, rate_limit_headers(tokens)
+
+
+def injected_failure(route):
+    """
+    Applique la latence et les pannes configurées
+
+    Returns:
+        tuple: (réponse d'erreur ou None, en-têtes à ajouter à la réponse normale)
+    """
+    draw = random.random()
+    if draw < FAKE_CONFIG['timeout_rate']:
+        # Le client doit abandonner avant la réponse (timeout de lecture)
+        time.sleep(FAKE_CONFIG['timeout_seconds'])
+        return error_response(route, 504, "Timeout simulé"), {}
+
+    time.sleep(sample_latency())
+
+    accepted, headers = take_rate_limit_token()
+    draw -= FAKE_CONFIG['timeout_rate']
+    if not accepted or draw < FAKE_CONFIG['error_rate_429']:
+        response = error_response(route, 429, "Requests rate limit exceeded")
+        response.headers['Retry-After'] = str(FAKE_CONFIG['retry_after_seconds'])
+        response.headers.update(headers or rate_limit_headers(0))
+        return response, {}
+
+    draw -= FAKE_CONFIG['error_rate_429']
+    if draw < FAKE_CONFIG['error_rate_5xx']:
+        return error_response(route, random.choice(FAKE_CONFIG['error_status_codes']), "Erreur serveur simulée"), {}
+    return None, headers
+
+
+def error_response(route, status_code, message):
+    record(route, status_code)
+    response = jsonify({'object': 'error', 'message': message, 'type': 'fake_error', 'code': status_code})
+    response.status_code = status_code
+    return response
+
+
+def moderation_scores(text):
+    """Scores déterministes : bruit dérivé de l'empreinte du texte + mots-clés de la catégorie"""
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=len(MODERATION_CATEGORIES)).digest()
+    words = set(text.lower().split())
+    scores = {}
+    for category, byte in zip(MODERATION_CATEGORIES, digest):
+        score = (byte / 255) ** 6 * 0.3
+        hits = len(words.intersection(CATEGORY_KEYWORDS.get(category, [])))
+        if hits:
+            score = min(1.0, 0.6 + 0.15 * hits)
+        scores[category] = round(score, 4)
+    return {
+        'categories': {category: score >= 0.5 for category, score in scores.items()},
+        'category_scores': scores
+    }
+
+
+def count_tokens(text):
+    return max(1, len(text.split()))
+
+
+@app.route('/v1/moderations', methods=['POST'])
+def moderations():
+    failure, headers = injected_failure('/v1/moderations')
+    if failure is not None:
+        return failure
+
+    data = request.json or {}
+    inputs = data.get('input', [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    record('/v1/moderations', 200)
+    response = jsonify({
+        'id': uuid.uuid4().hex,
+        'model': data.get('model', 'mistral-moderation-latest'),
+        'results': [moderation_scores(text) for text in inputs],
+        'usage': {'prompt_tokens': sum(count_tokens(text) for text in inputs), 'completion_tokens': 0,
+                  'total_tokens': sum(count_tokens(text) for text in inputs)}
+    })
+    response.headers.update(headers)
+    return response
+
+
+def generated_reply(messages):
+    """Réponse factice construite à partir du dernier message utilisateur"""
+    user_message = next((message.get('content', '') for message in reversed(messages)
+                         if message.get('role') == 'user'), '')
+    excerpt = ' '.join(user_message.split()[-12:])
+    return (
+        "Bonjour, nous vous remercions d'avoir pris le temps de partager votre expérience. "
+        f"Nous avons bien pris note de vos remarques : « {excerpt} ». "
+        "Votre retour sera transmis à l'équipe concernée. Nous restons à votre disposition. "
+        "Cordialement, la direction."
+    )
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    failure, headers = injected_failure('/v1/chat/completions')
+    if failure is not None:
+        return failure
+
+    data = request.json or {}
+    messages = data.get('messages', [])
+    model = data.get('model', 'mistral-small-latest')
+    reply = generated_reply(messages)
+    tokens = reply.split(' ')
+    max_tokens = data.get('max_tokens')
+    finish_reason = 'stop'
+    if max_tokens and len(tokens) > max_tokens:
+        tokens = tokens[:max_tokens]
+        finish_reason = 'length'
+
+    prompt_tokens = sum(count_tokens(message.get('content') or '') for message in messages)
+    usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+             'total_tokens': prompt_tokens + len(tokens)}
+    completion_id = uuid.uuid4().hex
+    created = int(time.time())
+    record('/v1/chat/completions', 200)
+
+    if data.get('stream'):
+        def events():
+            for index, token in enumerate(tokens):
+                chunk = {
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': token if index == 0 else ' ' + token},
+                                 'finish_reason': None}]
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                time.sleep(FAKE_CONFIG['token_delay_ms'] / 1000)
+            # Le dernier événement porte finish_reason et usage, comme l'API Mistral
+            final_chunk = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': {'content': ''}, 'finish_reason': finish_reason}],
+                'usage': usage
+            }
+            yield f"data: {json.dumps(final_chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return Response(events(), mimetype='text/event-stream', headers=headers)
+
+    response = jsonify({
+        'id': completion_id,
+        'object': 'chat.completion',
+        'created': created,
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ' '.join(tokens)},
+                     'finish_reason': finish_reason}],
+        'usage': usage
+    })
+    response.headers.update(headers)
+    return response
+
+
+@app.route('/_fake/config', methods=['GET', 'POST'])
+def fake_config():
+    """Lit ou modifie les réglages (ex: {"error_rate_5xx": 0.5} pour simuler un incident)"""
+    if request.method == 'POST':
+        updates = request.json or {}
+        unknown = [key for key in updates if key not in FAKE_CONFIG]
+        if unknown:
+            return jsonify({'status': 'error', 'message': f"Réglages inconnus: {', '.join(unknown)}"}), 400
+        FAKE_CONFIG.update(updates)
+    return jsonify({'status': 'success', 'config': FAKE_CONFIG})
+
+
+@app.route('/_fake/stats', methods=['GET'])
+def fake_stats():
+    with STATS_LOCK:
+        stats = {}
+        for (route, status_code), count in STATS.items():
+            stats.setdefault(route, {})[str(status_code)] = count
+    return jsonify({'status': 'success', 'requests': stats})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur de l'API Mistral (tests de charge et de pannes)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-distribution', choices=['fixed', 'uniform', 'lognormal'], default='fixed')
+    parser.add_argument('--latency-ms', type=float, default=50.0,
+                        help="Latence fixe, moyenne (uniform) ou médiane (lognormal) en millisecondes")
+    parser.add_argument('--latency-spread', type=float, default=0.5,
+                        help="uniform : ±spread × latence ; lognormal : écart-type du logarithme")
+    parser.add_argument('--error-rate-429', type=float, default=0.0, help="Proportion de réponses 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="En-tête Retry-After des réponses 429 (secondes)")
+    parser.add_argument('--error-rate-5xx', type=float, default=0.0, help="Proportion de réponses 500/502/503")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="Proportion de requêtes sans réponse à temps")
+    parser.add_argument('--timeout-seconds', type=float, default=60.0, help="Retard des requêtes en timeout")
+    parser.add_argument('--rate-limit-rps', type=float, default=0.0, help="Limite de débit simulée (0 : aucune)")
+    parser.add_argument('--token-delay-ms', type=float, default=20.0, help="Délai entre deux tokens en streaming")
+    args = parser.parse_args()
+
+    FAKE_CONFIG.update({
+        'latency_distribution': args.latency_distribution,
+        'latency_ms': args.latency_ms,
+        'latency_spread': args.latency_spread,
+        'error_rate_429': args.error_rate_429,
+        'retry_after_seconds': args.retry_after,
+        'error_rate_5xx': args.error_rate_5xx,
+        'timeout_rate': args.timeout_rate,
+        'timeout_seconds': args.timeout_seconds,
+        'rate_limit_rps': args.rate_limit_rps,
+        'token_delay_ms': args.token_delay_ms
+    })
+    RATE_LIMIT_STATE['tokens'] = max(1.0, args.rate_limit_rps)
+
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Générateur de charge : rejoue un corpus d'avis contre /moderate, /moderate_batch ou /generate
+
+Usage :
+    python load_test.py "2 - Moderation avis patient/moderation.log" --url http://localhost:5004 --qps 20 --duration 60
+    python load_test.py avis.jsonl --endpoint moderate_batch --batch-size 16 --qps 2
+    python load_test.py avis.jsonl --url http://localhost:5000 --endpoint generate --qps 1 --concurrency 10
+
+- Corpus : lignes JSON de moderation.log (champ review_text), anciens logs texte
+  ("Demande de modération pour le texte: ..."), ou tout fichier JSONL (--text-field)
+- Boucle ouverte : les requêtes partent au rythme demandé (--qps), que les précédentes aient
+  répondu ou non ; au-delà de --concurrency requêtes en cours, elles attendent leur tour et la
+  latence mesurée inclut cette attente (pas d'omission coordonnée)
+- Rapport toutes les --report-every secondes et à la fin : débit, taux d'erreurs, latences p50/p95/p99
+"""
+import argparse
+import gzip
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Anciennes lignes de moderation.log (avant les logs JSON)
+PLAIN_LOG_PATTERN = re.compile(r"Demande de modération pour le texte: (.*)$")
+
+DEFAULT_SYSTEM_PROMPT = (
+    "Tu es le service relations patients d'un établissement de santé. "
+    "Rédige une réponse courtoise et personnalisée à l'avis suivant."
+)
+
+
+def load_corpus(path, text_field):
+    """Textes d'avis extraits d'un fichier JSONL ou d'un fichier de log (éventuellement compressé .gz)"""
+    texts = []
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            text = None
+            if line.startswith('{'):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                text = record.get(text_field) or record.get('review_text')
+            else:
+                match = PLAIN_LOG_PATTERN.search(line)
+                if match:
+                    text = match.group(1)
+            if isinstance(text, str) and text.strip():
+                texts.append(text)
+    return texts
+
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche d'une liste triée"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadTest:
+    """Envoi des requêtes en boucle ouverte et collecte des latences"""
+
+    def __init__(self, url, endpoint, texts, batch_size=16, concurrency=50, timeout=30.0,
+                 system_prompt=DEFAULT_SYSTEM_PROMPT):
+        self.url = f"{url.rstrip('/')}/{endpoint}"
+        self.endpoint = endpoint
+        self.texts = texts
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.system_prompt = system_prompt
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._position = 0
+        # Résultats (latence, code) de l'intervalle en cours et de toute l'exécution
+        self.interval_results = []
+        self.all_results = []
+        self.in_flight = 0
+
+    def next_payload(self):
+        with self._lock:
+            start = self._position
+            count = self.batch_size if self.endpoint == 'moderate_batch' else 1
+            self._position += count
+        texts = [self.texts[(start + offset) % len(self.texts)] for offset in range(count)]
+        if self.endpoint == 'moderate_batch':
+            return {'texts': texts}
+        if self.endpoint == 'generate':
+            return {'review': texts[0], 'system_prompt': self.system_prompt}
+        return {'text': texts[0]}
+
+    def send(self, scheduled_at, payload):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            outcome = str(response.status_code)
+        except requests.Timeout:
+            outcome = 'timeout'
+        except requests.RequestException:
+            outcome = 'connection_error'
+        # Latence mesurée depuis l'heure d'envoi prévue (attente dans la file comprise)
+        latency = time.monotonic() - scheduled_at
+        with self._lock:
+            self.in_flight -= 1
+            self.interval_results.append((latency, outcome))
+            self.all_results.append((latency, outcome))
+
+    def take_interval(self):
+        with self._lock:
+            results, self.interval_results = self.interval_results, []
+            return results, self.in_flight
+
+    def run(self, qps, duration, arrival='constant', report_every=5.0, seed=None):
+        """Envoie des requêtes pendant duration secondes au rythme moyen qps"""
+        rng = random.Random(seed)
+        started = time.monotonic()
+        next_send = started
+        next_report = started + report_every
+        last_report = started
+        sent = 0
+        timeline = []
+
+        # Le dernier intervalle (jusqu'à la fin des requêtes en cours) fait l'objet du rapport final
+        while next_send < started + duration:
+            now = time.monotonic()
+            if now >= next_report and next_report < started + duration:
+                timeline.append(self.report(now - started, now - last_report))
+                last_report = now
+                next_report += report_every
+            if next_send > now:
+                time.sleep(min(next_send, next_report) - now)
+                continue
+            self.executor.submit(self.send, next_send, self.next_payload())
+            sent += 1
+            next_send += rng.expovariate(qps) if arrival == 'poisson' else 1 / qps
+
+        remaining = started + duration - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        self.executor.shutdown(wait=True)
+        finished = time.monotonic()
+        elapsed = finished - started
+        timeline.append(self.report(elapsed, finished - last_report))
+        return self.summary(sent, elapsed, timeline)
+
+    def report(self, elapsed, interval_seconds):
+        results, in_flight = self.take_interval()
+        stats = describe(results, interval_seconds)
+        stats.update({'elapsed_seconds': round(elapsed, 1), 'in_flight': in_flight})
+        print(
+            f"[{elapsed:7.1f}s] {stats['throughput']:7.1f} req/s | erreurs {stats['error_rate']:6.1%} | "
+            f"p50 {format_ms(stats['p50_ms'])} p95 {format_ms(stats['p95_ms'])} p99 {format_ms(stats['p99_ms'])} | "
+            f"en cours {in_flight}",
+            file=sys.stderr
+        )
+        return stats
+
+    def summary(self, sent, elapsed, timeline):
+        summary = describe(self.all_results, elapsed)
+        summary.update({
+            'url': self.url,
+            'sent': sent,
+            'duration_seconds': round(elapsed, 1),
+            'texts_per_request': self.batch_size if self.endpoint == 'moderate_batch' else 1,
+            'timeline': timeline
+        })
+        return summary
+
+
+def describe(results, seconds):
+    """Débit, taux d'erreurs, codes de réponse et percentiles de latence d'un ensemble de résultats"""
+    latencies = sorted(latency for latency, _ in results)
+    outcomes = Counter(outcome for _, outcome in results)
+    errors = sum(count for outcome, count in outcomes.items() if not outcome.startswith('2'))
+
+    def milliseconds(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        'completed': len(results),
+        'throughput': len(results) / seconds if seconds > 0 else 0.0,
+        'error_rate': errors / len(results) if results else 0.0,
+        'outcomes': dict(outcomes),
+        'p50_ms': milliseconds(percentile(latencies, 0.50)),
+        'p95_ms': milliseconds(percentile(latencies, 0.95)),
+        'p99_ms': milliseconds(percentile(latencies, 0.99)),
+        'max_ms': milliseconds(latencies[-1] if latencies else None)
+    }
+
+
+def format_ms(value):
+    return f"{value:7.1f} ms" if value is not None else "      - ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge en boucle ouverte à partir d'un corpus d'avis")
+    parser.add_argument('corpus', help="moderation.log (ou rotation .gz) ou fichier JSONL d'avis")
+    parser.add_argument('--url', default='http://localhost:5004', help="URL du service (défaut : modération, port 5004)")
+    parser.add_argument('--endpoint', choices=['moderate', 'moderate_batch', 'generate'], default='moderate')
+    parser.add_argument('--text-field', default='text', help="Champ contenant l'avis dans le JSONL (défaut : text)")
+    parser.add_argument('--qps', type=float, default=10.0, help="Requêtes par seconde visées")
+    parser.add_argument('--duration', type=float, default=60.0, help="Durée du test (secondes)")
+    parser.add_argument('--concurrency', type=int, default=50, help="Nombre maximum de requêtes en cours")
+    parser.add_argument('--arrival', choices=['constant', 'poisson'], default='constant',
+                        help="Arrivées régulières ou aléatoires (processus de Poisson)")
+    parser.add_argument('--batch-size', type=int, default=16, help="Avis par requête pour moderate_batch")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Timeout de chaque requête (secondes)")
+    parser.add_argument('--report-every', type=float, default=5.0, help="Intervalle des rapports (secondes)")
+    parser.add_argument('--shuffle', action='store_true', help="Mélanger le corpus avant le rejeu")
+    parser.add_argument('--seed', type=int, help="Graine du mélange et des arrivées de Poisson")
+    parser.add_argument('--output', help="Fichier JSON du résumé et de l'évolution dans le temps")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus, args.text_field)
+    if not texts:
+        print(f"Aucun avis trouvé dans {args.corpus}", file=sys.stderr)
+        sys.exit(1)
+    if args.shuffle:
+        random.Random(args.seed).shuffle(texts)
+    print(f"{len(texts)} avis chargés ; {args.qps} req/s pendant {args.duration:.0f}s vers /{args.endpoint}",
+          file=sys.stderr)
+
+    load_test = LoadTest(args.url, args.endpoint, texts, batch_size=args.batch_size,
+                         concurrency=args.concurrency, timeout=args.timeout)
+    summary = load_test.run(args.qps, args.duration, arrival=args.arrival,
+                            report_every=args.report_every, seed=args.seed)
+
+    print(
+        f"\nTotal : {summary['completed']}/{summary['sent']} requêtes en {summary['duration_seconds']}s, "
+        f"{summary['throughput']:.1f} req/s, erreurs {summary['error_rate']:.1%} {summary['outcomes']}\n"
+        f"Latence : p50 {format_ms(summary['p50_ms'])}, p95 {format_ms(summary['p95_ms'])}, "
+        f"p99 {format_ms(summary['p99_ms'])}, max {format_ms(summary['max_ms'])}"
+    )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Format texte d'exposition Prometheus
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Bornes (secondes) des histogrammes de latence : de 1 ms à 30 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Métrique avec étiquettes ; une série par combinaison de valeurs d'étiquettes"""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"Étiquettes attendues pour {self.name}: {self.labels}, reçues: {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    @contextmanager
+    def track_in_progress(self, **labels):
+        """Compte le bloc comme en cours pendant son exécution (ex: requêtes en vol)"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class FunctionGauge(Metric):
+    """Jauge dont les valeurs sont lues au moment de l'exposition (ex: compteurs du cache)"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, function, labels=()):
+        """
+        Args:
+            function (callable): Sans étiquette, retourne une valeur ; avec étiquettes,
+                retourne un dict {tuple de valeurs d'étiquettes: valeur}
+        """
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def render(self):
+        values = self.function()
+        with self._lock:
+            self._series = values if self.labels else {(): values}
+        return super().render()
+
+
+class FunctionCounter(FunctionGauge):
+    """Compteur dont les valeurs, croissantes, sont lues au moment de l'exposition (ex: recherches dans le cache)"""
+
+    type_name = 'counter'
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def totals(self):
+        """Nombre d'observations et somme par série : {valeurs d'étiquettes: (count, sum)}"""
+        with self._lock:
+            return {key: (value['count'], value['sum']) for key, value in self._series.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        """Mesure la durée du bloc (secondes)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            series = sorted((key, {'counts': list(value['counts']), 'sum': value['sum'], 'count': value['count']})
+                            for key, value in self._series.items())
+        for key, value in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, value['counts']):
+                cumulative += count
+                labels = _format_labels(self.labels, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(value["sum"])}')
+            lines.append(f'{self.name}_count{labels} {value["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Ensemble des métriques d'une application, exposées au format texte Prometheus
+
+    Les valeurs sont propres au processus : avec plusieurs workers, chacun expose ses
+    propres compteurs (à agréger côté Prometheus).
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def function_gauge(self, name, documentation, function, labels=()):
+        return self.register(FunctionGauge(name, documentation, function, labels))
+
+    def function_counter(self, name, documentation, function, labels=()):
+        return self.register(FunctionCounter(name, documentation, function, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        """Texte d'exposition de toutes les métriques"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
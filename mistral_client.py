@@ -0,0 +1,594 @@
+# mistral_client.py
+import asyncio
+import contextvars
+import email.utils
+import re
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # Nécessaire uniquement pour le client asynchrone
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# URL de base de l'API Mistral
+MISTRAL_API_URL = "https://api.mistral.ai/v1"
+
+# Codes HTTP pour lesquels une nouvelle tentative est effectuée
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Files de priorité du limiteur de débit : le trafic interactif passe avant les traitements en masse
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+# En-têtes de limite de débit (requêtes) reconnus : (limite, restant, réinitialisation, fenêtre en secondes)
+RATE_LIMIT_HEADERS = [
+    ('x-ratelimit-limit-req-minute', 'x-ratelimit-remaining-req-minute', None, 60.0),
+    ('x-ratelimit-limit-requests', 'x-ratelimit-remaining-requests', 'x-ratelimit-reset-requests', 60.0)
+]
+
+# Durée au format "1m30s", "250ms"...
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+
+# Priorité des appels émis dans le contexte courant (thread ou tâche asyncio)
+_request_priority = contextvars.ContextVar('mistral_request_priority', default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority):
+    """
+    Fixe la priorité des appels à l'API Mistral émis dans ce bloc
+
+    Exemple :
+        with request_priority(PRIORITY_BULK):
+            moderate_texts(texts)
+    """
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def current_priority():
+    """Priorité des appels émis dans le contexte courant"""
+    return _request_priority.get()
+
+
+def parse_retry_after(value):
+    """
+    Convertit un en-tête Retry-After (secondes ou date HTTP) en nombre de secondes
+
+    Returns:
+        float ou None si l'en-tête est absent ou invalide
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_date.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset_seconds(value):
+    """Convertit une durée de réinitialisation ("12", "1.5s", "250ms", "1m30s") en secondes"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    total = 0.0
+    for amount, unit in DURATION_PATTERN.findall(value):
+        total += float(amount) * {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}[unit]
+    return total or None
+
+
+class RateLimitTimeout(TimeoutError):
+    """Le budget de latence a expiré en attente du limiteur de débit (aucun appel n'a été envoyé)"""
+
+
+class RateLimiter:
+    """
+    Limiteur de débit côté client (seau à jetons) partagé par tous les appels à l'API Mistral d'un processus
+
+    - Débit et capacité initiaux configurables ; ajustés ensuite d'après les en-têtes de limite
+      renvoyés par l'API (limite, requêtes restantes, réinitialisation)
+    - Une réponse 429 suspend tous les appels pendant la durée Retry-After
+    - Files de priorité : un appel n'obtient un jeton que si aucun appel plus prioritaire
+      (ou de même priorité, arrivé avant) n'attend
+    - Sans débit configuré ni en-tête reçu, seules les suspensions après 429 s'appliquent
+    """
+
+    def __init__(self, rate_per_second=None, burst=None):
+        """
+        Args:
+            rate_per_second (float): Débit autorisé (None : illimité jusqu'à réception d'en-têtes de limite)
+            burst (float): Capacité du seau (défaut : une seconde de débit, au moins 1)
+        """
+        self.rate = rate_per_second
+        self.burst = burst
+        self.capacity = self._capacity_for(rate_per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._condition = threading.Condition()
+        self._waiters = []  # tas de (priorité, numéro d'arrivée)
+        self._sequence = itertools.count()
+        self.throttled = 0
+        self._lane_stats = {
+            priority: {'queue_depth': 0, 'acquired': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+            for priority in PRIORITY_NAMES
+        }
+
+    def _capacity_for(self, rate):
+        if self.burst:
+            return float(self.burst)
+        return max(1.0, rate) if rate else 1.0
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _try_acquire(self, ticket):
+        """
+        Tente de prendre un jeton pour ce ticket (verrou détenu)
+
+        Returns:
+            float ou None: 0 si le jeton est obtenu, sinon le délai estimé avant la prochaine tentative
+                           (None si le ticket n'est pas en tête de file)
+        """
+        now = time.monotonic()
+        if self._waiters[0] != ticket:
+            return None
+        if now < self.paused_until:
+            return self.paused_until - now
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def _take(self, ticket, waited):
+        heapq.heappop(self._waiters)
+        if self.rate:
+            self.tokens -= 1
+        lane = self._lane_stats[ticket[0]]
+        lane['queue_depth'] -= 1
+        lane['acquired'] += 1
+        lane['total_wait'] += waited
+        lane['max_wait'] = max(lane['max_wait'], waited)
+
+    def _enqueue(self, priority):
+        ticket = (priority, next(self._sequence))
+        heapq.heappush(self._waiters, ticket)
+        self._lane_stats[priority]['queue_depth'] += 1
+        return ticket
+
+    def _abandon(self, ticket):
+        """Retire un ticket de la file (délai dépassé ou attente annulée) et réveille les suivants"""
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        self._lane_stats[ticket[0]]['queue_depth'] -= 1
+        self._condition.notify_all()
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """
+        Attend un jeton (appel bloquant)
+
+        Args:
+            priority (int): PRIORITY_INTERACTIVE ou PRIORITY_BULK
+            deadline (float): Date limite (time.monotonic()) de l'attente
+
+        Returns:
+            float: Temps d'attente en secondes
+
+        Raises:
+            RateLimitTimeout: Si la date limite est atteinte avant l'obtention d'un jeton
+        """
+        started = time.monotonic()
+        with self._condition:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    delay = self._try_acquire(ticket)
+                    if delay == 0.0:
+                        waited = time.monotonic() - started
+                        self._take(ticket, waited)
+                        self._condition.notify_all()
+                        return waited
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise RateLimitTimeout("Budget de latence épuisé en attente du limiteur de débit")
+                        delay = remaining if delay is None else min(delay, remaining)
+                    self._condition.wait(delay)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+    async def acquire_async(self, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """Équivalent non bloquant de acquire, pour le client asynchrone"""
+        started = time.monotonic()
+        with self._condition:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    delay = self._try_acquire(ticket)
+                    if delay == 0.0:
+                        waited = time.monotonic() - started
+                        self._take(ticket, waited)
+                        self._condition.notify_all()
+                        return waited
+                if deadline is not None and deadline <= time.monotonic():
+                    raise RateLimitTimeout("Budget de latence épuisé en attente du limiteur de débit")
+                # Hors tête de file : courte attente avant de réessayer
+                await asyncio.sleep(min(delay if delay is not None else 0.01, 0.05))
+        except BaseException:
+            with self._condition:
+                self._abandon(ticket)
+            raise
+
+    def update_from_headers(self, headers):
+        """Ajuste le débit et les jetons restants d'après les en-têtes de limite de l'API"""
+        for limit_header, remaining_header, reset_header, window in RATE_LIMIT_HEADERS:
+            limit = headers.get(limit_header)
+            remaining = headers.get(remaining_header)
+            if limit is None and remaining is None:
+                continue
+            with self._condition:
+                now = time.monotonic()
+                self._refill(now)
+                try:
+                    if limit is not None and float(limit) > 0:
+                        self.rate = float(limit) / window
+                        self.capacity = self._capacity_for(self.rate)
+                        self.tokens = min(self.tokens, self.capacity)
+                    if remaining is not None:
+                        self.tokens = min(self.tokens, float(remaining))
+                        if float(remaining) <= 0:
+                            reset = parse_reset_seconds(headers.get(reset_header)) if reset_header else None
+                            self.paused_until = max(self.paused_until, now + (reset or window / max(1.0, float(limit or 1))))
+                except ValueError:
+                    logger.warning(f"En-têtes de limite de débit invalides: {limit_header}={limit}, {remaining_header}={remaining}")
+                self._condition.notify_all()
+            return
+
+    def pause(self, seconds):
+        """Suspend tous les appels pendant la durée indiquée (réponse 429)"""
+        with self._condition:
+            self.throttled += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def stats(self):
+        """Débit courant, profondeur des files et temps d'attente par priorité"""
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'rate_per_second': self.rate,
+                'capacity': self.capacity,
+                'tokens': round(self.tokens, 3),
+                'paused_for_seconds': round(max(0.0, self.paused_until - now), 3),
+                'throttled_responses': self.throttled,
+                'lanes': {
+                    PRIORITY_NAMES[priority]: {
+                        'queue_depth': lane['queue_depth'],
+                        'acquired': lane['acquired'],
+                        'average_wait_seconds': lane['total_wait'] / lane['acquired'] if lane['acquired'] else 0.0,
+                        'max_wait_seconds': lane['max_wait']
+                    }
+                    for priority, lane in self._lane_stats.items()
+                }
+            }
+
+    def register_metrics(self, metrics, prefix):
+        """
+        Expose l'état du limiteur dans un MetricsRegistry (valeurs lues à chaque exposition)
+
+        Args:
+            metrics (MetricsRegistry): Registre de l'application
+            prefix (str): Préfixe des noms de métriques (ex: "moderation")
+        """
+        def lanes(field):
+            return lambda: {(lane,): values[field] for lane, values in self.stats()['lanes'].items()}
+
+        metrics.function_gauge(
+            f'{prefix}_rate_limiter_queue_depth', "Appels en attente d'un jeton du limiteur de débit, par file",
+            lanes('queue_depth'), ['lane']
+        )
+        metrics.function_gauge(
+            f'{prefix}_rate_limiter_wait_seconds_average', "Attente moyenne d'un jeton du limiteur de débit, par file",
+            lanes('average_wait_seconds'), ['lane']
+        )
+        metrics.function_gauge(
+            f'{prefix}_rate_limiter_wait_seconds_max', "Attente maximale d'un jeton du limiteur de débit, par file",
+            lanes('max_wait_seconds'), ['lane']
+        )
+        metrics.function_counter(
+            f'{prefix}_rate_limiter_acquired_total', "Jetons obtenus du limiteur de débit, par file",
+            lanes('acquired'), ['lane']
+        )
+        metrics.function_counter(
+            f'{prefix}_rate_limiter_throttled_responses_total', "Réponses 429 de l'API Mistral (suspension des appels)",
+            lambda: self.stats()['throttled_responses']
+        )
+        metrics.function_gauge(
+            f'{prefix}_rate_limiter_paused_seconds', "Durée restante de suspension des appels après une réponse 429",
+            lambda: self.stats()['paused_for_seconds']
+        )
+
+
+class RetryPolicy:
+    """
+    Politique commune aux clients synchrone et asynchrone
+
+    Nouvelles tentatives sur erreurs réseau et codes 429/5xx, avec backoff exponentiel
+    aléatoire ("full jitter") et respect de l'en-tête Retry-After
+    """
+
+    def __init__(self, api_key, base_url=MISTRAL_API_URL, pool_size=10, connect_timeout=3.05,
+                 read_timeout=10, max_retries=3, backoff_factor=0.5, backoff_max=8.0,
+                 retry_after_max=30.0, rate_limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.rate_limiter = rate_limiter
+
+    @property
+    def default_headers(self):
+        return {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Authorization': f'Bearer {self.api_key}'
+        }
+
+    def url(self, path):
+        """URL complète d'un chemin de l'API (ex: "/moderations")"""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def backoff_delay(self, attempt, response=None):
+        """
+        Délai avant la tentative suivante
+
+        Retry-After est prioritaire s'il est fourni ; sinon backoff exponentiel avec jitter complet.
+        Retourne None si le serveur demande d'attendre plus que retry_after_max.
+        """
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return retry_after if retry_after <= self.retry_after_max else None
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    def observe_response(self, response):
+        """Transmet au limiteur de débit les en-têtes de limite et les réponses 429"""
+        if self.rate_limiter is None:
+            return
+        self.rate_limiter.update_from_headers(response.headers)
+        if response.status_code == 429:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.rate_limiter.pause(retry_after if retry_after is not None else self.backoff_factor)
+
+    def retry_delay_for_response(self, response, attempt, deadline=None):
+        """Délai avant nouvelle tentative pour une réponse, ou None si elle doit être retournée"""
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+            return None
+        return self.fit_delay(self.backoff_delay(attempt, response), deadline)
+
+    def fit_delay(self, delay, deadline):
+        """Retourne None si la tentative suivante ne peut plus commencer avant la date limite"""
+        if delay is None or (deadline is not None and time.monotonic() + delay >= deadline):
+            return None
+        return delay
+
+    def attempt_timeouts(self, deadline=None):
+        """
+        Timeouts (connexion, lecture) d'une tentative, bornés par le temps restant avant deadline
+
+        Raises:
+            TimeoutError: Si le budget de latence est déjà épuisé
+        """
+        if deadline is None:
+            return self.connect_timeout, self.read_timeout
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Budget de latence épuisé avant l'appel")
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+
+class MistralClient(RetryPolicy):
+    """
+    Client HTTP partagé pour les appels à l'API Mistral
+
+    - Session unique avec pool de connexions keep-alive (pas de nouvelle poignée de main TCP/TLS par appel)
+    - Timeouts de connexion et de lecture séparés
+    - Nouvelles tentatives sur erreurs réseau et codes 429/5xx, avec backoff exponentiel
+      aléatoire ("full jitter") et respect de l'en-tête Retry-After
+    """
+
+    def __init__(self, api_key, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.timeout = (self.connect_timeout, self.read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self.default_headers)
+
+    def post(self, path, json=None, timeout=None, deadline=None, priority=None, **kwargs):
+        """
+        Envoie une requête POST avec nouvelles tentatives
+
+        Args:
+            path (str): Chemin de l'API (ex: "/chat/completions")
+            json (dict): Corps de la requête
+            timeout (float|tuple): Timeout spécifique à cet appel (par défaut celui du client)
+            deadline (float): Date limite (time.monotonic()) de l'appel, nouvelles tentatives comprises :
+                              budget de latence qui borne les timeouts et le nombre de tentatives
+            priority (int): File du limiteur de débit (défaut : priorité du contexte courant)
+
+        Returns:
+            requests.Response: Dernière réponse obtenue (éventuellement en erreur 429/5xx)
+
+        Raises:
+            requests.RequestException: Si toutes les tentatives ont échoué sur une erreur réseau
+            TimeoutError: Si le budget de latence est épuisé
+        """
+        url = self.url(path)
+        priority = current_priority() if priority is None else priority
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(priority, deadline)
+            try:
+                attempt_timeout = self.attempt_timeouts(deadline) if deadline is not None else timeout or self.timeout
+                response = self.session.post(url, json=json, timeout=attempt_timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self.fit_delay(self.backoff_delay(attempt), deadline) if attempt < self.max_retries else None
+                if delay is None:
+                    raise
+                logger.warning(f"Erreur réseau vers {url} ({type(e).__name__}), nouvelle tentative dans {delay:.2f}s")
+            else:
+                self.observe_response(response)
+                delay = self.retry_delay_for_response(response, attempt, deadline)
+                if delay is None:
+                    return response
+                logger.warning(f"Réponse {response.status_code} de {url}, nouvelle tentative dans {delay:.2f}s")
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+
+class AsyncMistralClient(RetryPolicy):
+    """
+    Équivalent non bloquant de MistralClient (httpx.AsyncClient), pour le mode ASGI
+
+    Même politique de timeouts et de nouvelles tentatives ; les attentes utilisent asyncio.sleep.
+    """
+
+    def __init__(self, api_key, **kwargs):
+        if httpx is None:
+            raise ImportError("Le client asynchrone nécessite le paquet httpx (pip install httpx)")
+        super().__init__(api_key, **kwargs)
+        self.timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        self.client = httpx.AsyncClient(
+            headers=self.default_headers,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        )
+
+    async def post(self, path, json=None, timeout=None, deadline=None, priority=None, **kwargs):
+        """
+        Envoie une requête POST avec nouvelles tentatives (voir MistralClient.post)
+
+        Returns:
+            httpx.Response: Dernière réponse obtenue (éventuellement en erreur 429/5xx)
+
+        Raises:
+            httpx.TransportError: Si toutes les tentatives ont échoué sur une erreur réseau
+            TimeoutError: Si le budget de latence est épuisé
+        """
+        url = self.url(path)
+        priority = current_priority() if priority is None else priority
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async(priority, deadline)
+            try:
+                if deadline is not None:
+                    connect_timeout, read_timeout = self.attempt_timeouts(deadline)
+                    attempt_timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+                else:
+                    attempt_timeout = timeout or self.timeout
+                response = await self.client.post(url, json=json, timeout=attempt_timeout, **kwargs)
+            except httpx.TransportError as e:
+                delay = self.fit_delay(self.backoff_delay(attempt), deadline) if attempt < self.max_retries else None
+                if delay is None:
+                    raise
+                logger.warning(f"Erreur réseau vers {url} ({type(e).__name__}), nouvelle tentative dans {delay:.2f}s")
+            else:
+                self.observe_response(response)
+                delay = self.retry_delay_for_response(response, attempt, deadline)
+                if delay is None:
+                    return response
+                logger.warning(f"Réponse {response.status_code} de {url}, nouvelle tentative dans {delay:.2f}s")
+                await response.aclose()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def create_rate_limiter_from_env():
+    """
+    Construit le limiteur de débit à partir des variables d'environnement
+
+    MISTRAL_RATE_LIMIT_RPS (défaut : aucun, seuls les en-têtes de l'API et les 429 s'appliquent),
+    MISTRAL_RATE_LIMIT_BURST (défaut : une seconde de débit)
+    """
+    rate = os.getenv('MISTRAL_RATE_LIMIT_RPS')
+    burst = os.getenv('MISTRAL_RATE_LIMIT_BURST')
+    return RateLimiter(
+        rate_per_second=float(rate) if rate else None,
+        burst=float(burst) if burst else None
+    )
+
+
+# Limiteur partagé par tous les clients du processus (modération, génération, mode ASGI)
+SHARED_RATE_LIMITER = create_rate_limiter_from_env()
+
+
+def create_client_from_env(api_key, read_timeout=10, pool_size=10, client_class=MistralClient):
+    """
+    Construit un client à partir des variables d'environnement
+
+    MISTRAL_POOL_SIZE (défaut : valeur passée en paramètre), MISTRAL_CONNECT_TIMEOUT (défaut 3.05 s),
+    MISTRAL_READ_TIMEOUT (défaut : valeur passée en paramètre), MISTRAL_MAX_RETRIES (défaut 3),
+    MISTRAL_BACKOFF_FACTOR (défaut 0.5 s), MISTRAL_BACKOFF_MAX (défaut 8 s),
+    MISTRAL_API_BASE_URL (défaut https://api.mistral.ai/v1 ; ex: http://localhost:8090/v1 pour
+    le faux serveur fake_mistral_server.py)
+
+    Tous les clients partagent le limiteur de débit SHARED_RATE_LIMITER.
+    """
+    return client_class(
+        api_key,
+        base_url=os.getenv('MISTRAL_API_BASE_URL', MISTRAL_API_URL),
+        pool_size=int(os.getenv('MISTRAL_POOL_SIZE', str(pool_size))),
+        connect_timeout=float(os.getenv('MISTRAL_CONNECT_TIMEOUT', '3.05')),
+        read_timeout=float(os.getenv('MISTRAL_READ_TIMEOUT', str(read_timeout))),
+        max_retries=int(os.getenv('MISTRAL_MAX_RETRIES', '3')),
+        backoff_factor=float(os.getenv('MISTRAL_BACKOFF_FACTOR', '0.5')),
+        backoff_max=float(os.getenv('MISTRAL_BACKOFF_MAX', '8')),
+        rate_limiter=SHARED_RATE_LIMITER
+    )